@@ -12,6 +12,7 @@ from django.urls import reverse_lazy
 
 from .forms import PatientRegistrationForm, DoctorRegistrationForm, UserLoginForm
 from .decorators import patient_required, doctor_required
+from hospitals.models import Pincode
 def dashboard(request):
 
     if request.user.is_authenticated:
@@ -84,8 +85,16 @@ def location_page(request):
         return redirect('accounts:login')
 
     if request.method == "POST":
-        pincode = request.POST.get("pincode")
+        if request.POST.get("clear"):
+            request.session.pop('pincode', None)
+            return redirect('doctors:doctor_list')
+
+        pincode = (request.POST.get("pincode") or '').strip()
+        if not Pincode.objects.filter(code=pincode).exists():
+            messages.error(request, f'We do not have locations for pincode "{pincode}" yet.')
+            return render(request, "accounts/location.html")
+
         request.session['pincode'] = pincode
-        return redirect('doctors:doctors_list')
+        return redirect('doctors:doctor_list')
 
-    return render(request, "location.html")
+    return render(request, "accounts/location.html")
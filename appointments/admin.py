@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Appointment
+from hospital_management.exports import export_action
+from .exports import APPOINTMENT_EXPORT
+from .models import Appointment, ArchivedAppointment
 
 
 @admin.register(Appointment)
@@ -17,3 +19,18 @@ class AppointmentAdmin(admin.ModelAdmin):
     list_filter = ('status', 'date')
     search_fields = ('patient__username', 'doctor__user__username')
     ordering = ('-date', '-time')
+    actions = [export_action(APPOINTMENT_EXPORT)]
+
+
+@admin.register(ArchivedAppointment)
+class ArchivedAppointmentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'patient', 'doctor', 'date', 'time', 'status', 'archived_at')
+    list_filter = ('status', 'date')
+    search_fields = ('patient__username', 'doctor__name')
+    ordering = ('-date', '-time')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
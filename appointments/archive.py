@@ -0,0 +1,94 @@
+"""
+Hospital Management - Appointments App Archive
+
+Finished appointments (COMPLETED or CANCELLED) older than a horizon are
+moved from the live Appointment table to ArchivedAppointment by the
+archive_appointments command, so booking, slot and dashboard queries only
+ever scan recent rows.
+
+A patient's past visits span both tables; PastAppointments pages through
+them as one list ordered newest first, reading only the page it needs.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Value
+from django.utils import timezone
+
+from .models import Appointment, ArchivedAppointment
+
+ARCHIVED_STATUSES = ('COMPLETED', 'CANCELLED')
+
+# Default age, in days, after which finished appointments are archived.
+ARCHIVE_AFTER_DAYS = 365
+
+ARCHIVE_BATCH_SIZE = 1000
+
+COPIED_FIELDS = (
+    'id', 'patient_id', 'doctor_id', 'date', 'time', 'status', 'notes',
+    'created_at', 'updated_at', 'reminder_sent_at',
+)
+
+
+def archive_cutoff(days=ARCHIVE_AFTER_DAYS):
+    return timezone.localdate() - timedelta(days=days)
+
+
+def archivable(cutoff):
+    return Appointment.objects.filter(date__lt=cutoff, status__in=ARCHIVED_STATUSES)
+
+
+def archive_batch(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move up to `batch_size` archivable rows, oldest id first; return how many moved.
+
+    Each batch is its own transaction, so an interrupted run loses nothing
+    and the next run carries on where it stopped.
+    """
+    with transaction.atomic():
+        rows = list(archivable(cutoff).order_by('id').values(*COPIED_FIELDS)[:batch_size])
+        if not rows:
+            return 0
+        ArchivedAppointment.objects.bulk_create([ArchivedAppointment(**row) for row in rows])
+        # Finished rows hold no slot, so the slot signals have nothing to do here.
+        Appointment.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+    return len(rows)
+
+
+class PastAppointments:
+    """A patient's appointments before `today` from both tables, newest first.
+
+    Behaves as a sequence for Paginator: len() comes from `count` and each
+    slice is one UNION query over (date, time, id) keys followed by one
+    select_related fetch per table that appears on the page.
+    """
+
+    def __init__(self, patient, today, count):
+        self.patient = patient
+        self.today = today
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def _keys(self):
+        # order_by() drops Meta.ordering, which SQLite rejects inside a UNION.
+        hot = Appointment.objects.filter(patient=self.patient, date__lt=self.today).order_by().values_list(
+            'date', 'time', 'id', Value(False)
+        )
+        cold = ArchivedAppointment.objects.filter(patient=self.patient).order_by().values_list(
+            'date', 'time', 'id', Value(True)
+        )
+        return hot.union(cold, all=True).order_by('-date', '-time', '-id')
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+
+        keys = list(self._keys()[index])
+        fetched = {}
+        for archived, model in ((False, Appointment), (True, ArchivedAppointment)):
+            ids = [pk for _, _, pk, is_archived in keys if is_archived == archived]
+            if ids:
+                rows = model.objects.filter(pk__in=ids).select_related('doctor', 'doctor__clinic')
+                fetched.update({(archived, row.pk): row for row in rows})
+        return [fetched[archived, pk] for _, _, pk, archived in keys if (archived, pk) in fetched]
@@ -0,0 +1,61 @@
+"""
+Hospital Management - Appointments App Expiry
+
+Appointments whose slot has passed are closed out by the
+complete_past_appointments command: APPROVED ones become COMPLETED and
+PENDING ones, which the doctor never confirmed, become CANCELLED. This
+keeps the PENDING/APPROVED sets that slot lookups and dashboards filter
+on down to appointments that can still happen.
+
+Work is done in small batches, each a short transaction of one indexed
+SELECT and one UPDATE, so SQLite's write lock is never held for long and
+bookings can interleave between batches.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import slots
+from .models import Appointment
+
+# Past status -> status it is closed out to.
+EXPIRY_TRANSITIONS = {
+    'APPROVED': 'COMPLETED',
+    'PENDING': 'CANCELLED',
+}
+
+EXPIRY_BATCH_SIZE = 500
+
+
+def past_filter(now=None):
+    """Appointments whose half-hour slot has ended by `now`."""
+    ended = timezone.localtime(now or timezone.now()) - timedelta(minutes=slots.SLOT_MINUTES)
+    return Q(date__lt=ended.date()) | Q(date=ended.date(), time__lte=ended.time())
+
+
+def expire_batch(status, now=None, batch_size=EXPIRY_BATCH_SIZE):
+    """Close out up to `batch_size` past appointments in `status`; return how many changed."""
+    target = EXPIRY_TRANSITIONS[status]
+    with transaction.atomic():
+        rows = list(
+            Appointment.objects.filter(past_filter(now), status=status)
+            .order_by('date', 'id')
+            .values_list('id', 'doctor_id', 'date')[:batch_size]
+        )
+        if not rows:
+            return 0
+        # The status guard makes a rerun, or a concurrent edit, a no-op.
+        changed = Appointment.objects.filter(pk__in=[pk for pk, _, _ in rows], status=status).update(
+            status=target, updated_at=timezone.now()
+        )
+        days = {(doctor_id, day) for _, doctor_id, day in rows}
+        transaction.on_commit(lambda: _refresh(days), robust=True)
+    return changed
+
+
+def _refresh(days):
+    # UPDATE skips the slot signals; drop the touched doctor-days instead.
+    for doctor_id, day in days:
+        slots.refresh_day(doctor_id, day)
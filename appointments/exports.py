@@ -0,0 +1,39 @@
+"""
+Hospital Management - Appointments App Export
+
+Live appointments with their patient, doctor and clinic joined in, as a
+streaming export; see hospital_management.exports. Archived appointments are not
+included.
+"""
+from hospital_management.exports import Export
+
+from .models import Appointment
+
+APPOINTMENT_EXPORT = Export(
+    'appointments',
+    lambda: Appointment.objects.all(),
+    (
+        ('id', 'id'),
+        ('date', 'date'),
+        ('time', 'time'),
+        ('status', 'status'),
+        ('notes', 'notes'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+        ('patient_id', 'patient_id'),
+        ('patient_username', 'patient__username'),
+        ('patient_first_name', 'patient__first_name'),
+        ('patient_last_name', 'patient__last_name'),
+        ('patient_email', 'patient__email'),
+        ('doctor_id', 'doctor_id'),
+        ('doctor', 'doctor__name'),
+        ('specialization', 'doctor__specialization'),
+        ('clinic_id', 'doctor__clinic_id'),
+        ('clinic', 'doctor__clinic__name'),
+        ('city', 'doctor__city__name'),
+    ),
+    date_field='date',
+    status_field='status',
+    statuses=[status for status, _ in Appointment.STATUS_CHOICES],
+    city_field='doctor__city',
+)
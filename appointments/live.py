@@ -0,0 +1,76 @@
+"""
+Hospital Management - Appointments App Live Slots
+
+The booking page keeps a Server-Sent Events stream open for the doctor-day
+it shows. The stream sends the day's slots once, then again whenever they
+change, so a patient sees a slot go as soon as someone else books or holds
+it instead of finding out when their own POST fails.
+
+Changes are detected from the counters the slot engine bumps on every
+write path (appointments.slots.change_keys). The stream checks them every
+POLL_SECONDS, one cache round trip, and only rebuilds the slot list when
+they move. Because the counters live in the cache, a shared cache backend
+lets a booking in one worker reach streams held open by another. A hold
+expiring moves no counter, so the stream also rebuilds once the first hold
+it has shown lapses.
+
+Streams end after STREAM_SECONDS and the browser reconnects by itself,
+so a closed tab never holds a connection for long. Under WSGI a request
+thread cannot be parked on a stream, so the endpoint sends one snapshot
+and asks the browser to reconnect after FALLBACK_RETRY_MS. That is
+ordinary polling, at the same cost as a get_available_slots call.
+"""
+import asyncio
+import json
+import time
+
+from .slots import aget_live_day, aget_many, change_keys, get_day_slots
+
+# How often an open stream checks the change counters.
+POLL_SECONDS = 1
+
+# Comment lines sent while nothing changes, so proxies keep the connection.
+HEARTBEAT_SECONDS = 15
+
+# Lifetime of one stream before the browser reconnects.
+STREAM_SECONDS = 5 * 60
+
+RETRY_MS = 1000
+FALLBACK_RETRY_MS = 10000
+
+
+def slots_event(slots, retry=None):
+    prefix = f'retry: {retry}\n' if retry else ''
+    return f'{prefix}event: slots\ndata: {json.dumps({"slots": slots})}\n\n'
+
+
+def snapshot(doctor_id, day, user_id=None):
+    """A single slots event, for clients that cannot hold a stream open."""
+    return slots_event(get_day_slots(doctor_id, day, user_id), retry=FALLBACK_RETRY_MS)
+
+
+async def slot_events(doctor_id, day, user_id=None):
+    """Yield SSE messages for a doctor-day: its slots now, then each time they change."""
+    keys = change_keys(doctor_id, day)
+    started = last_sent = time.monotonic()
+
+    seen = await aget_many(keys)
+    sent, lapses_at = await aget_live_day(doctor_id, day, user_id)
+    yield slots_event(sent, retry=RETRY_MS)
+
+    while time.monotonic() - started < STREAM_SECONDS:
+        await asyncio.sleep(POLL_SECONDS)
+        current = await aget_many(keys)
+        # Wall clock, as hold expiry times are shared across workers.
+        if current != seen or (lapses_at is not None and time.time() >= lapses_at):
+            seen = current
+            slots, lapses_at = await aget_live_day(doctor_id, day, user_id)
+            # A counter can move without this patient's view changing, e.g. their own hold.
+            if slots != sent:
+                sent = slots
+                last_sent = time.monotonic()
+                yield slots_event(slots)
+                continue
+        if time.monotonic() - last_sent >= HEARTBEAT_SECONDS:
+            last_sent = time.monotonic()
+            yield ': keepalive\n\n'
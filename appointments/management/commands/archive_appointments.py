@@ -0,0 +1,35 @@
+"""
+Management command to move finished appointments to the archive table.
+Usage: python manage.py archive_appointments [--days 365] [--batch-size 1000] [--max-batches N]
+
+COMPLETED and CANCELLED appointments dated more than --days ago are
+copied to ArchivedAppointment and deleted from the live table, one batch
+per transaction. It is safe to stop at any point and run again; run it
+nightly from cron.
+"""
+from django.core.management.base import BaseCommand
+from appointments.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, archive_batch, archive_cutoff
+
+
+class Command(BaseCommand):
+    help = "Archive COMPLETED/CANCELLED appointments older than a horizon"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                            help=f'Archive appointments dated more than this many days ago (default {ARCHIVE_AFTER_DAYS})')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE,
+                            help=f'Rows moved per transaction (default {ARCHIVE_BATCH_SIZE})')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches; the next run resumes')
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['days'])
+        moved = batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            count = archive_batch(cutoff, options['batch_size'])
+            if not count:
+                break
+            moved += count
+            batches += 1
+            self.stdout.write(f'  batch {batches}: {count} appointments')
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} appointments dated before {cutoff}'))
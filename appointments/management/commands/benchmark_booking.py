@@ -0,0 +1,113 @@
+"""
+Management command to measure booking throughput when many patients race for one slot.
+Usage: python manage.py benchmark_booking [--threads 16] [--rounds 20] [--doctor ID]
+
+Each round starts --threads threads on a barrier, and every thread calls
+book_slot for the same slot on its own database connection. Exactly one
+must win and the rest must get a clean conflict; anything else fails the
+command. It reports attempts/s and p50/p95 round time.
+
+Rounds use the doctor's first free slot a year ahead, so real bookings
+are not in the way, and the winning appointments are deleted afterwards.
+Run it against a development database.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from appointments.models import Appointment
+from appointments.services import SlotUnavailable, book_slot
+from appointments.slots import find_next_free
+from doctors.models import Doctor
+
+# How far ahead the contended slot is taken from.
+LEAD_DAYS = 365
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent booking of one slot (attempts/sec)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Patients racing per round (default 16)')
+        parser.add_argument('--rounds', type=int, default=20, help='Rounds to run (default 20)')
+        parser.add_argument('--doctor', type=int, help='Doctor id (default: first doctor with a free slot)')
+
+    def handle(self, *args, **options):
+        threads, rounds = options['threads'], options['rounds']
+        if threads < 2 or rounds < 1:
+            raise CommandError('Use at least 2 threads and 1 round.')
+
+        doctors = Doctor.objects.order_by('pk')
+        if options['doctor']:
+            doctors = doctors.filter(pk=options['doctor'])
+        after = timezone.now() + timedelta(days=LEAD_DAYS)
+        doctor = slot = None
+        for candidate in doctors.iterator():
+            slot = find_next_free(candidate.pk, after=after)
+            if slot:
+                doctor = candidate
+                break
+        if doctor is None:
+            raise CommandError('No doctor with a free slot to book; load sample data first.')
+        patients = list(User.objects.order_by('pk')[:threads])
+        if not patients:
+            raise CommandError('No users to book as.')
+
+        slot = timezone.localtime(slot)
+        self.stdout.write(
+            f'{threads} threads x {rounds} rounds on {connections["default"].vendor}, '
+            f'Dr. {doctor.name} at {slot:%Y-%m-%d %H:%M}'
+        )
+        durations = []
+        try:
+            for _ in range(rounds):
+                durations.append(self.round(doctor, patients, threads, slot.date(), slot.time()))
+        finally:
+            Appointment.objects.filter(doctor=doctor, date=slot.date(), time=slot.time()).delete()
+
+        elapsed = sum(durations)
+        durations.sort()
+        self.stdout.write(
+            f'{threads * rounds / elapsed:.0f} attempts/s, '
+            f'round p50 {durations[len(durations) // 2] * 1000:.1f} ms, '
+            f'p95 {durations[int(len(durations) * 0.95)] * 1000:.1f} ms'
+        )
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def round(self, doctor, patients, threads, day, slot_time):
+        barrier = threading.Barrier(threads + 1)
+        results = []
+
+        def attempt(patient):
+            try:
+                barrier.wait()
+                book_slot(doctor, patient, day, slot_time)
+                results.append('booked')
+            except SlotUnavailable:
+                results.append('conflict')
+            except Exception as e:
+                results.append(repr(e))
+            finally:
+                connections.close_all()
+
+        workers = [
+            threading.Thread(target=attempt, args=(patients[i % len(patients)],))
+            for i in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        if results.count('booked') != 1 or results.count('conflict') != threads - 1:
+            raise CommandError(f'Expected one winner per round, got {sorted(results)}')
+        Appointment.objects.filter(doctor=doctor, date=day, time=slot_time).delete()
+        return elapsed
@@ -0,0 +1,117 @@
+"""
+Management command to compare the sync and async JSON endpoints under concurrent load.
+Usage: python manage.py benchmark_json_views [--requests 2000] [--concurrency 50] [--cold]
+
+Each endpoint is driven the way an ASGI server runs it, on one event
+loop. Async views are awaited directly. Sync views go through
+sync_to_async, as Django's ASGI handler runs them. Up to --concurrency
+requests are in flight at once against the current database and cache.
+Each variant reports requests/sec and p50/p95 latency. With --cold the
+cache is swapped for Django's dummy backend, so every request reaches the
+database. URL routing and middleware are left out; both variants would
+pay for them equally.
+"""
+import asyncio
+import time
+from contextlib import nullcontext
+from datetime import timedelta
+from itertools import cycle
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncRequestFactory, override_settings
+from django.utils import timezone
+
+from appointments import views as appointment_views
+from doctors import views as doctor_views
+from doctors.models import Doctor
+from hospitals import views as hospital_views
+from hospitals.models import City
+
+ENDPOINTS = (
+    ('get_available_slots', appointment_views.get_available_slots, appointment_views.aget_available_slots),
+    ('get_clinics_by_city', hospital_views.get_clinics_by_city, hospital_views.aget_clinics_by_city),
+    ('get_doctors_by_city', doctor_views.get_doctors_by_city, doctor_views.aget_doctors_by_city),
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the sync and async JSON endpoints (requests/sec) under concurrent load"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per variant (default 2000)')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight (default 50)')
+        parser.add_argument('--cold', action='store_true', help='Run without a cache, so every request queries the database')
+
+    def handle(self, *args, **options):
+        doctor_ids = list(Doctor.objects.values_list('pk', flat=True)[:50])
+        city_ids = list(City.objects.values_list('pk', flat=True)[:20])
+        if not doctor_ids or not city_ids:
+            raise CommandError('No doctors or cities to query; load sample data first.')
+
+        today = timezone.localdate()
+        days = [today + timedelta(days=i) for i in range(1, 8)]
+        params = {
+            'get_available_slots': [{'doctor_id': d, 'date': day.isoformat()} for d in doctor_ids for day in days],
+            'get_clinics_by_city': [{'city_id': c} for c in city_ids],
+            'get_doctors_by_city': [{'city': c} for c in city_ids],
+        }
+
+        self.stdout.write(
+            f'{options["requests"]} requests per variant, {options["concurrency"]} concurrent, '
+            f'{"cold" if options["cold"] else "warm"} cache'
+        )
+        self.stdout.write(f'{"endpoint":<22} {"view":<6} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8}')
+        no_cache = override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+        with no_cache if options['cold'] else nullcontext():
+            for name, sync_view, async_view in ENDPOINTS:
+                for label, view in (('sync', sync_to_async(sync_view)), ('async', async_view)):
+                    rate, p50, p95 = asyncio.run(
+                        self.load(view, params[name], options['requests'], options['concurrency'])
+                    )
+                    self.stdout.write(f'{name:<22} {label:<6} {rate:>9.0f} {p50:>8.2f} {p95:>8.2f}')
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    async def load(self, view, params, total, concurrency):
+        factory = AsyncRequestFactory()
+        queries = cycle(params)
+        latencies = []
+
+        def build():
+            request = factory.get('/', next(queries))
+            request.user = AnonymousUser()
+
+            async def auser():
+                return request.user
+            request.auser = auser
+            return request
+
+        async def one(timed=True):
+            request = build()
+            started = time.perf_counter()
+            response = await view(request)
+            if response.status_code != 200:
+                raise CommandError(f'{view} answered {response.status_code}')
+            if timed:
+                latencies.append(time.perf_counter() - started)
+
+        async def worker(count):
+            for _ in range(count):
+                await one()
+
+        # Warm up the database connection and, unless --cold, the cache.
+        for _ in range(min(len(params), 200)):
+            await one(timed=False)
+
+        started = time.perf_counter()
+        share, extra = divmod(total, concurrency)
+        await asyncio.gather(*(worker(share + (i < extra)) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return (
+            len(latencies) / elapsed,
+            latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * 0.95)] * 1000,
+        )
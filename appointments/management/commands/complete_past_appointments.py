@@ -0,0 +1,39 @@
+"""
+Management command to close out appointments whose slot has passed.
+Usage: python manage.py complete_past_appointments [--batch-size 500] [--max-batches N] [--pause 0.05]
+
+APPROVED appointments become COMPLETED and PENDING ones CANCELLED. Each
+batch is one short transaction, with an optional pause between batches
+so bookings are not starved of SQLite's write lock. Already-closed rows
+are never touched, so it is safe to run every few minutes from cron.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from appointments.expiry import EXPIRY_BATCH_SIZE, EXPIRY_TRANSITIONS, expire_batch
+
+
+class Command(BaseCommand):
+    help = "Mark past APPROVED appointments COMPLETED and past PENDING ones CANCELLED"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=EXPIRY_BATCH_SIZE,
+                            help=f'Rows updated per transaction (default {EXPIRY_BATCH_SIZE})')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches; the next run resumes')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches (default 0.05)')
+
+    def handle(self, *args, **options):
+        batches = 0
+        for status, target in EXPIRY_TRANSITIONS.items():
+            changed = 0
+            while options['max_batches'] is None or batches < options['max_batches']:
+                count = expire_batch(status, batch_size=options['batch_size'])
+                if not count:
+                    break
+                changed += count
+                batches += 1
+                time.sleep(options['pause'])
+            self.stdout.write(f'{status} -> {target}: {changed} appointments')
+        self.stdout.write(self.style.SUCCESS(f'Done in {batches} batches'))
@@ -0,0 +1,14 @@
+"""
+Management command to export appointments as CSV or JSON Lines.
+Usage: python manage.py export_appointments [--format csv|jsonl] [--output FILE] [--date-from YYYY-MM-DD] [--date-to YYYY-MM-DD] [--status PENDING,APPROVED] [--city ID|NAME]
+
+Rows are read in batches (--chunk-size), so memory stays flat and
+bookings keep committing however large the export is.
+"""
+from appointments.exports import APPOINTMENT_EXPORT
+from hospital_management.exports import ExportCommand
+
+
+class Command(ExportCommand):
+    help = "Export appointments with patient, doctor and clinic details"
+    export = APPOINTMENT_EXPORT
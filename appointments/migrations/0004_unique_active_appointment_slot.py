@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def cancel_duplicate_bookings(apps, schema_editor):
+    """Keep the earliest live booking per doctor slot so the constraint can be added."""
+    Appointment = apps.get_model('appointments', 'Appointment')
+    seen = set()
+    duplicates = []
+    rows = Appointment.objects.filter(status__in=['PENDING', 'APPROVED']).order_by('id')
+    for pk, *slot in rows.values_list('id', 'doctor_id', 'date', 'time'):
+        slot = tuple(slot)
+        if slot in seen:
+            duplicates.append(pk)
+        seen.add(slot)
+    Appointment.objects.filter(pk__in=duplicates).update(status='CANCELLED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_alter_appointment_id'),
+        ('doctors', '0004_doctor_next_available_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['PENDING', 'APPROVED'])), fields=('doctor', 'date', 'time'), name='unique_active_appointment_slot'),
+        ),
+    ]
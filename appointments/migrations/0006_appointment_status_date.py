@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_archived_appointment'),
+        ('doctors', '0006_doctor_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['status', 'date'], name='appointment_status_date'),
+        ),
+    ]
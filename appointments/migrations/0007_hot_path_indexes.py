@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0006_appointment_status_date'),
+        ('doctors', '0007_doctor_specialization_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='archivedappointment',
+            name='archived_appt_patient_date',
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'date', 'status'], name='appointment_doctor_date_status'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'date', 'time'], name='appointment_doctor_date_time'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'date', 'time'], name='appointment_patient_date_time'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedappointment',
+            index=models.Index(fields=['patient', 'date', 'time'], name='archived_patient_date_time'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0007_hot_path_indexes'),
+        ('doctors', '0007_doctor_specialization_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        # Existing rows have not changed since they were booked, as far as we know.
+        migrations.RunSQL(
+            'UPDATE appointments_appointment SET updated_at = created_at',
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'updated_at'], name='appointment_doctor_updated'),
+        ),
+    ]
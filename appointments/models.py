@@ -1,9 +1,11 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
 from doctors.models import Doctor
 
 
-class Appointment(models.Model):
+class AppointmentRecord(models.Model):
+    """Columns shared by live appointments and their archived copies."""
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
         ('APPROVED', 'Approved'),
@@ -11,6 +13,26 @@ class Appointment(models.Model):
         ('CANCELLED', 'Cancelled'),
     ]
 
+    date = models.DateField()
+    time = models.TimeField()
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='PENDING'
+    )
+
+    notes = models.TextField(blank=True, null=True)
+
+    class Meta:
+        abstract = True
+        ordering = ['-date', '-time']
+
+    def __str__(self):
+        return f"{self.patient.username} → Dr. {self.doctor.name} ({self.date} {self.time})"
+
+
+class Appointment(AppointmentRecord):
     patient = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -23,20 +45,60 @@ class Appointment(models.Model):
         related_name='doctor_appointments'
     )
 
-    date = models.DateField()
-    time = models.TimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Queryset .update() calls must set this themselves; the calendar feed's Last-Modified reads it.
+    updated_at = models.DateTimeField(auto_now=True)
+    # Set once the patient's reminder email has gone out; see appointments.reminders.
+    reminder_sent_at = models.DateTimeField(null=True, blank=True, editable=False)
 
-    status = models.CharField(
-        max_length=20,
-        choices=STATUS_CHOICES,
-        default='PENDING'
+    class Meta(AppointmentRecord.Meta):
+        constraints = [
+            # One live booking per doctor slot; cancelled/completed rows don't count.
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'time'],
+                condition=Q(status__in=['PENDING', 'APPROVED']),
+                name='unique_active_appointment_slot',
+            ),
+        ]
+        indexes = [
+            # Past PENDING/APPROVED rows, oldest first, for complete_past_appointments.
+            models.Index(fields=['status', 'date'], name='appointment_status_date'),
+            # Slot bitmaps and the doctor dashboard's counts: doctor + date range + status.
+            models.Index(fields=['doctor', 'date', 'status'], name='appointment_doctor_date_status'),
+            # Doctor agenda, already in (date, time) order.
+            models.Index(fields=['doctor', 'date', 'time'], name='appointment_doctor_date_time'),
+            # Patient dashboard and history, read forwards or backwards.
+            models.Index(fields=['patient', 'date', 'time'], name='appointment_patient_date_time'),
+            # Latest change to a doctor's appointments, for the calendar feed.
+            models.Index(fields=['doctor', 'updated_at'], name='appointment_doctor_updated'),
+        ]
+
+
+class ArchivedAppointment(AppointmentRecord):
+    """A finished appointment moved out of the live table by archive_appointments.
+
+    Rows keep their original id and timestamps, so links and exports stay stable.
+    """
+    id = models.BigIntegerField(primary_key=True)
+
+    patient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_appointments'
     )
 
-    notes = models.TextField(blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.CASCADE,
+        related_name='archived_appointments'
+    )
 
-    class Meta:
-        ordering = ['-date', '-time']
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    reminder_sent_at = models.DateTimeField(null=True, blank=True, editable=False)
+    archived_at = models.DateTimeField(auto_now_add=True)
 
-    def __str__(self):
-        return f"{self.patient.username} → Dr. {self.doctor.user.username} ({self.date} {self.time})"
+    class Meta(AppointmentRecord.Meta):
+        indexes = [
+            models.Index(fields=['patient', 'date', 'time'], name='archived_patient_date_time'),
+        ]
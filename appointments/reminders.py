@@ -0,0 +1,87 @@
+"""
+Hospital Management - Appointments App Reminders
+
+Patients are emailed before each APPROVED appointment by the
+send_reminders command, run every few minutes from cron. One query on the
+(status, date) index selects every appointment starting within the next
+REMINDER_HOURS that has not been reminded yet. Messages are rendered from
+one compiled template and sent REMINDER_BATCH_SIZE at a time, each batch
+over a single email backend connection.
+
+Appointment.reminder_sent_at is set for a batch as soon as it has been
+sent, so reruns skip those patients. Patients without an email address
+are marked too, so they are not picked up again. If the process dies
+between sending a batch and marking it, that one batch is sent again on
+the next run. An appointment is never marked without being sent.
+"""
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import Appointment
+
+# How far ahead of the appointment the reminder goes out.
+REMINDER_HOURS = 24
+
+# Messages sent over one backend connection.
+REMINDER_BATCH_SIZE = 100
+
+REMINDER_TEMPLATE = 'appointments/email/reminder.txt'
+
+
+def window_filter(start, end):
+    """Appointments whose slot starts in [start, end)."""
+    start, end = timezone.localtime(start), timezone.localtime(end)
+    if start.date() == end.date():
+        return Q(date=start.date(), time__gte=start.time(), time__lt=end.time())
+    return (
+        Q(date=start.date(), time__gte=start.time())
+        | Q(date__gt=start.date(), date__lt=end.date())
+        | Q(date=end.date(), time__lt=end.time())
+    )
+
+
+def due_reminders(now=None, hours=REMINDER_HOURS):
+    """APPROVED appointments starting within `hours` of `now` that have had no reminder."""
+    now = now or timezone.now()
+    return (
+        Appointment.objects.filter(
+            window_filter(now, now + timedelta(hours=hours)), status='APPROVED', reminder_sent_at__isnull=True
+        )
+        .select_related('patient', 'doctor__clinic', 'doctor__city')
+        .order_by('date', 'time', 'id')
+    )
+
+
+def render_reminders(appointments):
+    """One EmailMessage per appointment whose patient has an email address."""
+    template = get_template(REMINDER_TEMPLATE)
+    messages = []
+    for appointment in appointments:
+        patient = appointment.patient
+        if not patient.email:
+            continue
+        body = template.render({
+            'appointment': appointment,
+            'patient_name': patient.get_full_name() or patient.username,
+        })
+        subject = (
+            f'Reminder: Dr. {appointment.doctor.name} on '
+            f'{appointment.date:%a %d %b} at {appointment.time:%I:%M %p}'
+        )
+        messages.append(EmailMessage(subject, body, to=[patient.email]))
+    return messages
+
+
+def send_batch(appointments, now=None):
+    """Send and mark one batch over a single connection; return (sent, skipped)."""
+    messages = render_reminders(appointments)
+    sent = 0
+    if messages:
+        with get_connection() as connection:
+            sent = connection.send_messages(messages) or 0
+    Appointment.objects.filter(pk__in=[a.pk for a in appointments]).update(reminder_sent_at=now or timezone.now())
+    return sent, len(appointments) - len(messages)
@@ -0,0 +1,128 @@
+"""
+Hospital Management - Appointments App Booking Service
+
+The partial unique constraint on Appointment (doctor, date, time) for
+PENDING/APPROVED rows is the source of truth for double booking: the
+insert either wins the slot or fails with IntegrityError, so no lock is
+held between checking and inserting.
+"""
+import random
+import time
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+
+from . import slots
+from .models import Appointment
+from .slots import UnknownDoctor, as_date, as_time, get_open_masks, release_hold, slot_holder, time_to_cell
+
+# SQLite serialises writers; a locked read or insert is retried briefly.
+# Every contender reaches the INSERT (the constraint decides), so the waits
+# are jittered to keep them from colliding again in lockstep.
+LOCK_RETRIES = 10
+LOCK_BACKOFF = 0.02
+
+
+# Target status -> statuses a doctor may move an appointment from.
+STATUS_TRANSITIONS = {
+    'APPROVED': ('PENDING',),
+    'CANCELLED': ('PENDING', 'APPROVED'),
+}
+
+# Per-appointment outcomes reported by update_statuses.
+UPDATED, UNCHANGED, NOT_ALLOWED, NOT_FOUND = 'updated', 'unchanged', 'not_allowed', 'not_found'
+
+
+class SlotUnavailable(Exception):
+    """The requested slot is not offered or has already been taken."""
+
+
+def _check_offered(doctor, patient, day, slot_time):
+    # Only the schedule is checked from the cache. Whether the slot is taken
+    # is left to the constraint: a cached booked bit may lag a cancellation,
+    # and every booking drops the day, so its booked mask is not rebuilt here.
+    cell = time_to_cell(slot_time)
+    try:
+        open_mask = get_open_masks(doctor.id)[day.weekday()]
+    except UnknownDoctor:
+        open_mask = 0
+    if cell is None or not open_mask >> cell & 1:
+        raise SlotUnavailable('This time slot is not offered by the doctor.')
+    if slot_holder(doctor.id, day, slot_time) not in (None, patient.id):
+        raise SlotUnavailable('Another patient is booking this slot right now. Please select another slot.')
+
+
+def book_slot(doctor, patient, date_val, time_val, notes=None):
+    """Create a PENDING appointment for the slot or raise SlotUnavailable."""
+    try:
+        day, slot_time = as_date(date_val), as_time(time_val)
+    except (TypeError, ValueError):
+        day = slot_time = None
+    if not day or not slot_time:
+        raise SlotUnavailable('Please select a valid date and time slot.')
+    if day < timezone.localdate():
+        raise SlotUnavailable('Appointment date cannot be in the past.')
+
+    for attempt in range(LOCK_RETRIES):
+        try:
+            _check_offered(doctor, patient, day, slot_time)
+            with transaction.atomic():
+                appointment = Appointment.objects.create(
+                    doctor=doctor,
+                    patient=patient,
+                    date=day,
+                    time=slot_time,
+                    status='PENDING',
+                    notes=notes,
+                )
+            release_hold(doctor.id, day, slot_time, patient.id)
+            return appointment
+        except IntegrityError:
+            raise SlotUnavailable('This time slot is already booked. Please select another slot.')
+        except OperationalError as e:
+            if 'locked' not in str(e) or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(LOCK_BACKOFF * (attempt + 1) * random.uniform(0.5, 1.5))
+
+
+def _refresh_days(doctor_id, days):
+    for day in days:
+        slots.refresh_day(doctor_id, day)
+    slots.refresh_next_available(doctor_id)
+
+
+def update_statuses(doctor, ids, status):
+    """Move the doctor's appointments `ids` to `status`; return {id: outcome}.
+
+    Ownership and current statuses are read in one query and the change is
+    one UPDATE, which bypasses the per-row Appointment signals; the slot
+    cache is refreshed once per doctor-day whose booked cells changed.
+    """
+    allowed_from = STATUS_TRANSITIONS.get(status)
+    if allowed_from is None:
+        raise ValueError(f'Unsupported status {status!r}.')
+
+    results = dict.fromkeys(ids, NOT_FOUND)
+    with transaction.atomic():
+        rows = Appointment.objects.filter(pk__in=results, doctor=doctor).values_list('pk', 'status', 'date')
+        eligible, freed_days = [], set()
+        for pk, current, day in rows:
+            if current == status:
+                results[pk] = UNCHANGED
+            elif current not in allowed_from:
+                results[pk] = NOT_ALLOWED
+            else:
+                results[pk] = UPDATED
+                eligible.append(pk)
+                if status not in slots.ACTIVE_STATUSES:
+                    freed_days.add(day)
+
+        if eligible:
+            # The status guard keeps a concurrent change from being overwritten.
+            Appointment.objects.filter(pk__in=eligible, status__in=allowed_from).update(
+                status=status, updated_at=timezone.now()
+            )
+            if freed_days:
+                # Not a functools.partial: Django logs a failed robust callback by __qualname__.
+                transaction.on_commit(lambda: _refresh_days(doctor.id, sorted(freed_days)), robust=True)
+    return results
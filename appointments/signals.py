@@ -0,0 +1,84 @@
+"""
+Hospital Management - Keep the slot engine in step with appointment writes.
+
+Cache invalidations run on commit, so a rolled-back booking never shows as taken
+and the booking transaction itself stays as short as the INSERT. They are
+registered as robust: a failed cache or next-slot refresh is logged rather
+than reported as a failed booking. Django names the callback in that log
+line, so callbacks are plain functions, not functools.partial objects.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from doctors.models import Doctor, DoctorAvailability
+from . import slots
+from .models import Appointment
+
+
+def _slot_state(instance):
+    """(doctor_id, date, time, status) as last seen, without touching deferred fields."""
+    fields = instance.__dict__
+    if any(name not in fields for name in ('doctor_id', 'date', 'time', 'status')):
+        return None
+    return (fields['doctor_id'], fields['date'], fields['time'], fields['status'])
+
+
+def _apply_slot_change(old, new, known):
+    # With deferred fields the statuses are unknown, so every known day is rebuilt.
+    days = {
+        (state[0], state[1]) for state in (old, new)
+        if state and (not known or state[3] in slots.ACTIVE_STATUSES)
+    }
+    for doctor_id, day in days:
+        slots.refresh_day(doctor_id, day)
+
+    for doctor_id in {state[0] for state in (old, new) if state}:
+        slots.refresh_next_available(doctor_id)
+
+
+@receiver(post_init, sender=Appointment)
+def remember_slot(sender, instance, **kwargs):
+    instance._slot_state = _slot_state(instance)
+
+
+@receiver(post_save, sender=Appointment)
+def update_slot_on_save(sender, instance, created, **kwargs):
+    """Drop the cached doctor-day(s) when an appointment is booked, moved, approved or cancelled."""
+    old = None if created else instance._slot_state
+    new = _slot_state(instance)
+    if old is not None and old == new:
+        return
+
+    known = new is not None and (created or old is not None)
+    instance._slot_state = new
+
+    def apply():
+        _apply_slot_change(old, new, known)
+    transaction.on_commit(apply, robust=True)
+
+
+@receiver(post_delete, sender=Appointment)
+def free_slot_on_delete(sender, instance, **kwargs):
+    state = instance._slot_state
+    if state and state[3] in slots.ACTIVE_STATUSES:
+        def apply():
+            _apply_slot_change(state, None, True)
+        transaction.on_commit(apply, robust=True)
+
+
+@receiver(post_delete, sender=Appointment)
+def touch_calendar_on_delete(sender, instance, **kwargs):
+    """Move the doctor's calendar feed validators: a deleted row has no updated_at to read."""
+    state = instance._slot_state
+    if state is None or state[3] in slots.ACTIVE_STATUSES:
+        # update(), so none of the Doctor signals (directory, profile caches) fire.
+        Doctor.objects.filter(pk=instance.doctor_id).update(calendar_changed_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=DoctorAvailability)
+def reset_open_slots(sender, instance, **kwargs):
+    def apply():
+        slots.invalidate_availability(instance.doctor_id)
+        slots.refresh_next_available(instance.doctor_id)
+    transaction.on_commit(apply, robust=True)
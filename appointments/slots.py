@@ -0,0 +1,512 @@
+"""
+Hospital Management - Appointments App Slot Engine
+
+Each doctor-day is held as two bitmaps over 48 half-hour cells
+(bit 0 = 00:00, bit 47 = 23:30):
+
+open:   cells inside the doctor's availability for that weekday,
+        minus the 12:00 - 1:00 PM lunch break
+booked: cells holding a PENDING or APPROVED appointment
+
+Open masks are cached per doctor (one entry for all seven weekdays) and
+booked masks per doctor-day, each under a data version: the doctor's
+availability version and the doctor-day's booking version. A
+DoctorAvailability change bumps the first, and the Appointment signals
+bump the second whenever a row on that day changes. A mask built from a
+read that raced such a change is stored under the version it was read
+at, which nobody reads any more, so it can never overwrite the fresh
+state. A slot lookup is two cache round trips once the day is warm and
+one range query after a change. Masks are never patched in place: a
+read-modify-write on a shared cache would let two workers lose each
+other's changes. The cached booked bits only decide
+what is shown; the booking itself is decided by the database constraint
+(see appointments.services). The
+read path has async twins (aget_day_masks, aget_day_slots) for the ASGI
+views; both build masks from the same row helpers.
+
+While a patient fills in the booking form the chosen slot is held for
+HOLD_SECONDS under its own cache key. Holds are claimed with cache.add, so
+only one patient can win a cell, and expire with the key; other patients
+see held cells as unavailable. A hold stores its expiry time next to the
+holder, because expiry bumps no counter: live streams use it to know when
+a hold they show has lapsed.
+
+Every write that changes what a doctor-day offers (booking, cancellation,
+hold, bulk refresh) also bumps a change counter for that day, and
+availability edits bump one for the doctor. Open booking pages watch
+these counters through the live slot stream in appointments.live.
+"""
+import time as _time
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.utils import timezone
+
+SLOT_MINUTES = 30
+CELLS_PER_DAY = 24 * 60 // SLOT_MINUTES
+ACTIVE_STATUSES = ('PENDING', 'APPROVED')
+
+# Lunch break (12:00 PM - 1:00 PM) is never offered.
+LUNCH_MASK = (1 << 24) | (1 << 25)
+
+# Masks only need to outlive the day they describe; masks of an old
+# version are never read again and expire on their own.
+CACHE_TIMEOUT = 60 * 60 * 24 * 2
+
+# Longest window the range endpoint will compute in one call.
+MAX_RANGE_DAYS = 31
+
+# How long a patient's chosen slot is reserved while they fill in the form.
+HOLD_SECONDS = 5 * 60
+
+# How far ahead Doctor.next_available_at looks for a free slot.
+NEXT_FREE_HORIZON_DAYS = 30
+
+
+def cell_to_time(cell):
+    return time(cell // 2, (cell % 2) * SLOT_MINUTES)
+
+
+# (value, label) per cell, e.g. ('09:30', '09:30 AM')
+CELLS = tuple(
+    (
+        cell_to_time(i).strftime('%H:%M'),
+        cell_to_time(i).strftime('%I:%M %p'),
+    )
+    for i in range(CELLS_PER_DAY)
+)
+
+
+def as_date(value):
+    """Accept a date or an ISO 'YYYY-MM-DD' string (raw POST values)."""
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    return value
+
+
+def as_time(value):
+    """Accept a time or an 'HH:MM[:SS]' string (raw POST values)."""
+    if isinstance(value, str):
+        return time.fromisoformat(value)
+    return value
+
+
+def time_to_cell(value):
+    """Cell index for a slot start time, or None if it is off the grid."""
+    t = as_time(value)
+    if t.minute % SLOT_MINUTES or t.second or t.microsecond:
+        return None
+    return t.hour * 2 + t.minute // SLOT_MINUTES
+
+
+def span_mask(start, end):
+    """Cells whose slot starts at or after `start` and before `end`."""
+    first = -(-(start.hour * 60 + start.minute) // SLOT_MINUTES)
+    last = -(-(end.hour * 60 + end.minute) // SLOT_MINUTES)
+    if last <= first:
+        return 0
+    return ((1 << last) - 1) ^ ((1 << first) - 1)
+
+
+def _open_version_key(doctor_id):
+    return f'slots:open-version:{doctor_id}'
+
+
+def _booked_version_key(doctor_id, day):
+    return f'slots:booked-version:{doctor_id}:{day.isoformat()}'
+
+
+def _open_key(doctor_id, version):
+    return f'slots:open:{doctor_id}:{version}'
+
+
+def _booked_key(doctor_id, day, version):
+    return f'slots:booked:{doctor_id}:{day.isoformat()}:{version}'
+
+
+def _hold_key(doctor_id, day, cell):
+    return f'slots:hold:{doctor_id}:{day.isoformat()}:{cell}'
+
+
+def _user_hold_key(user_id):
+    return f'slots:hold-user:{user_id}'
+
+
+def _day_changes_key(doctor_id, day):
+    return f'slots:changes:{doctor_id}:{day.isoformat()}'
+
+
+def _doctor_changes_key(doctor_id):
+    return f'slots:changes:{doctor_id}'
+
+
+def change_keys(doctor_id, day):
+    """Cache keys whose values move whenever the doctor-day's slots change."""
+    return [_day_changes_key(doctor_id, day), _doctor_changes_key(doctor_id)]
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Start from the clock so a counter lost to eviction is never reused.
+        cache.add(key, _time.time_ns(), CACHE_TIMEOUT)
+
+
+def notify_day(doctor_id, day):
+    _bump(_day_changes_key(doctor_id, as_date(day)))
+
+
+def current_versions(version_keys):
+    """{key: version} for mask version keys, starting a version for keys without one.
+
+    Read before the database, so a mask built from that read is stored
+    under the version it reflects.
+    """
+    versions = cache.get_many(version_keys)
+    for key in version_keys:
+        if key not in versions:
+            # Start from the clock so a version lost to eviction is never reused.
+            cache.add(key, _time.time_ns(), CACHE_TIMEOUT)
+            versions[key] = cache.get(key)
+    return versions
+
+
+async def aget_many(keys):
+    """cache.get_many from async code in one worker-thread hop.
+
+    Django's BaseCache.aget_many awaits aget() once per key, and each of
+    those is a hop of its own, which made a 16-key hold lookup cost more
+    than the whole sync view.
+    """
+    return await sync_to_async(cache.get_many)(keys)
+
+
+async def acurrent_versions(version_keys):
+    versions = await aget_many(version_keys)
+    missing = [key for key in version_keys if key not in versions]
+    if missing:
+        # Rare (first read of a doctor or day); one thread hop for all of them.
+        versions.update(await sync_to_async(current_versions)(missing))
+    return versions
+
+
+def iter_cells(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class UnknownDoctor(LookupError):
+    """No doctor has the given id."""
+
+
+def _availability_rows(doctor_id):
+    from doctors.models import Doctor
+
+    # Read through the doctor so an unknown id (no rows) is told apart from a
+    # doctor without availability (one row of NULLs), still in one query.
+    return Doctor.objects.filter(pk=doctor_id).values_list(
+        'availabilities__day_of_week', 'availabilities__start_time', 'availabilities__end_time'
+    )
+
+
+def _open_masks_from_rows(rows):
+    rows = list(rows)
+    if not rows:
+        raise UnknownDoctor
+    masks = [0] * 7
+    for day_of_week, start, end in rows:
+        if day_of_week is not None:
+            masks[day_of_week] = span_mask(start, end) & ~LUNCH_MASK
+    return masks
+
+
+def _booking_rows(doctor_id, start, end):
+    from .models import Appointment
+
+    return Appointment.objects.filter(
+        doctor_id=doctor_id, date__range=(start, end), status__in=ACTIVE_STATUSES
+    ).values_list('date', 'time')
+
+
+def _booked_masks_from_rows(rows):
+    masks = {}
+    for day, t in rows:
+        cell = time_to_cell(t)
+        if cell is not None:
+            masks[day] = masks.get(day, 0) | (1 << cell)
+    return masks
+
+
+def build_open_masks(doctor_id):
+    """Seven open masks (Monday first) from the doctor's availability rows; raises UnknownDoctor."""
+    return _open_masks_from_rows(_availability_rows(doctor_id))
+
+
+def build_booked_masks(doctor_id, start, end):
+    """Booked masks keyed by date for start..end, from one range query."""
+    return _booked_masks_from_rows(_booking_rows(doctor_id, start, end))
+
+
+def build_booked_mask(doctor_id, day):
+    return build_booked_masks(doctor_id, day, day).get(day, 0)
+
+
+def get_open_masks(doctor_id):
+    """Seven open masks (Monday first), filling the cache on a miss; raises UnknownDoctor.
+
+    Touches neither the booked masks nor the appointment table, so the
+    booking path can check the schedule without rebuilding a dropped day.
+    """
+    version_key = _open_version_key(doctor_id)
+    open_key = _open_key(doctor_id, current_versions([version_key])[version_key])
+    open_masks = cache.get(open_key)
+    if open_masks is None:
+        open_masks = build_open_masks(doctor_id)
+        cache.set(open_key, open_masks, CACHE_TIMEOUT)
+    return open_masks
+
+
+def get_day_masks(doctor_id, day):
+    """Return (open_mask, booked_mask) for a doctor-day, filling the cache on a miss.
+
+    An unknown doctor has nothing open or booked.
+    """
+    open_version_key, booked_version_key = _open_version_key(doctor_id), _booked_version_key(doctor_id, day)
+    versions = current_versions([open_version_key, booked_version_key])
+    open_key = _open_key(doctor_id, versions[open_version_key])
+    booked_key = _booked_key(doctor_id, day, versions[booked_version_key])
+    found = cache.get_many([open_key, booked_key])
+
+    open_masks = found.get(open_key)
+    if open_masks is None:
+        try:
+            open_masks = build_open_masks(doctor_id)
+        except UnknownDoctor:
+            return 0, 0
+        cache.set(open_key, open_masks, CACHE_TIMEOUT)
+    booked = found.get(booked_key)
+    if booked is None:
+        booked = build_booked_mask(doctor_id, day)
+        cache.set(booked_key, booked, CACHE_TIMEOUT)
+
+    return open_masks[day.weekday()], booked
+
+
+async def aget_day_masks(doctor_id, day):
+    """get_day_masks for async views: async cache calls and async ORM iteration."""
+    open_version_key, booked_version_key = _open_version_key(doctor_id), _booked_version_key(doctor_id, day)
+    versions = await acurrent_versions([open_version_key, booked_version_key])
+    open_key = _open_key(doctor_id, versions[open_version_key])
+    booked_key = _booked_key(doctor_id, day, versions[booked_version_key])
+    found = await aget_many([open_key, booked_key])
+
+    open_masks = found.get(open_key)
+    if open_masks is None:
+        try:
+            open_masks = _open_masks_from_rows([row async for row in _availability_rows(doctor_id)])
+        except UnknownDoctor:
+            return 0, 0
+        await cache.aset(open_key, open_masks, CACHE_TIMEOUT)
+    booked = found.get(booked_key)
+    if booked is None:
+        rows = [row async for row in _booking_rows(doctor_id, day, day)]
+        booked = _booked_masks_from_rows(rows).get(day, 0)
+        await cache.aset(booked_key, booked, CACHE_TIMEOUT)
+
+    return open_masks[day.weekday()], booked
+
+
+def get_range_masks(doctor_id, start, days):
+    """[(date, open_mask, booked_mask), ...] for `days` consecutive days from `start`.
+
+    Warm days come from two cache get_many calls (versions, then masks);
+    cold days are filled from one availability query and one appointment
+    range query. Raises UnknownDoctor.
+    """
+    dates = [start + timedelta(days=i) for i in range(days)]
+    open_version_key = _open_version_key(doctor_id)
+    version_keys = {_booked_version_key(doctor_id, day): day for day in dates}
+    versions = current_versions([open_version_key, *version_keys])
+
+    open_key = _open_key(doctor_id, versions[open_version_key])
+    booked_keys = {
+        _booked_key(doctor_id, day, versions[version_key]): day
+        for version_key, day in version_keys.items()
+    }
+    found = cache.get_many([open_key, *booked_keys])
+
+    open_masks = found.get(open_key)
+    if open_masks is None:
+        open_masks = build_open_masks(doctor_id)
+        cache.set(open_key, open_masks, CACHE_TIMEOUT)
+
+    cold = [day for key, day in booked_keys.items() if key not in found]
+    if cold:
+        built = build_booked_masks(doctor_id, cold[0], cold[-1])
+        fresh = {key: built.get(day, 0) for key, day in booked_keys.items() if key not in found}
+        cache.set_many(fresh, CACHE_TIMEOUT)
+        found.update(fresh)
+
+    return [
+        (day, open_masks[day.weekday()], found[key])
+        for key, day in booked_keys.items()
+    ]
+
+
+def _free_cell_keys(doctor_id, day_masks):
+    keys = {}
+    for day, open_mask, booked in day_masks:
+        for cell in iter_cells(open_mask & ~booked):
+            keys[_hold_key(doctor_id, day, cell)] = (day, cell)
+    return keys
+
+
+def _holder(hold):
+    """User id from a cached (user_id, expires_at) hold, or None."""
+    return hold[0] if hold else None
+
+
+def _held_from_holders(keys, holders, user_id):
+    held = {}
+    for key, hold in holders.items():
+        if _holder(hold) != user_id:
+            day, cell = keys[key]
+            held[day] = held.get(day, 0) | (1 << cell)
+    return held
+
+
+def held_masks(doctor_id, day_masks, user_id=None):
+    """Cells held by other patients, keyed by date, for [(date, open, booked), ...]."""
+    keys = _free_cell_keys(doctor_id, day_masks)
+    if not keys:
+        return {}
+    return _held_from_holders(keys, cache.get_many(keys), user_id)
+
+
+def slots_from_masks(open_mask, booked, held=0):
+    """Slots for the booking page: [{'value', 'label', 'is_booked', 'is_held'}, ...]."""
+    taken = booked | held
+    return [
+        {
+            'value': value,
+            'label': label,
+            'is_booked': bool(taken >> i & 1),
+            'is_held': bool(held >> i & 1),
+        }
+        for i, (value, label) in enumerate(CELLS)
+        if open_mask >> i & 1
+    ]
+
+
+def get_day_slots(doctor_id, day, user_id=None):
+    """Slots for one doctor-day; cells held by anyone but `user_id` show as taken."""
+    open_mask, booked = get_day_masks(doctor_id, day)
+    held = held_masks(doctor_id, [(day, open_mask, booked)], user_id).get(day, 0)
+    return slots_from_masks(open_mask, booked, held)
+
+
+async def aget_day_slots(doctor_id, day, user_id=None):
+    return (await aget_live_day(doctor_id, day, user_id))[0]
+
+
+async def aget_live_day(doctor_id, day, user_id=None):
+    """(slots, lapses_at): aget_day_slots plus when the first hold shown in them expires.
+
+    lapses_at is a time.time() value, or None when no other patient holds a cell.
+    """
+    open_mask, booked = await aget_day_masks(doctor_id, day)
+    keys = _free_cell_keys(doctor_id, [(day, open_mask, booked)])
+    holders = await aget_many(keys) if keys else {}
+    held = _held_from_holders(keys, holders, user_id).get(day, 0)
+    lapses_at = min((hold[1] for hold in holders.values() if _holder(hold) != user_id), default=None)
+    return slots_from_masks(open_mask, booked, held), lapses_at
+
+
+def place_hold(doctor_id, day, value, user_id):
+    """Reserve a free slot for `user_id` for HOLD_SECONDS; False if it is taken or held."""
+    day, cell = as_date(day), time_to_cell(value)
+    if cell is None:
+        return False
+    open_mask, booked = get_day_masks(doctor_id, day)
+    if not (open_mask & ~booked) >> cell & 1:
+        return False
+
+    key = _hold_key(doctor_id, day, cell)
+    hold = (user_id, _time.time() + HOLD_SECONDS)
+    if not cache.add(key, hold, HOLD_SECONDS):
+        if _holder(cache.get(key)) != user_id:
+            return False
+        cache.set(key, hold, HOLD_SECONDS)
+
+    # One hold per patient: picking another slot releases the previous one.
+    # The patient's entry names the held doctor-day too, so its streams hear of the release.
+    user_key = _user_hold_key(user_id)
+    previous = cache.get(user_key)
+    if previous and previous[0] != key and _holder(cache.get(previous[0])) == user_id:
+        cache.delete(previous[0])
+        if previous[1:] != (doctor_id, day):
+            notify_day(*previous[1:])
+    cache.set(user_key, (key, doctor_id, day), HOLD_SECONDS)
+    notify_day(doctor_id, day)
+    return True
+
+
+def slot_holder(doctor_id, day, value):
+    """User id currently holding the slot, or None."""
+    cell = time_to_cell(value)
+    if cell is None:
+        return None
+    return _holder(cache.get(_hold_key(doctor_id, as_date(day), cell)))
+
+
+def release_hold(doctor_id, day, value, user_id):
+    cell = time_to_cell(value)
+    if cell is None:
+        return
+    key = _hold_key(doctor_id, as_date(day), cell)
+    if _holder(cache.get(key)) == user_id:
+        cache.delete_many([key, _user_hold_key(user_id)])
+        notify_day(doctor_id, day)
+
+
+def find_next_free(doctor_id, after=None, horizon=NEXT_FREE_HORIZON_DAYS):
+    """Aware datetime of the doctor's earliest free slot from `after` (default now), or None."""
+    after = timezone.localtime(after or timezone.now())
+    today = after.date()
+    # Slots already started today are not offered.
+    started = (1 << -(-(after.hour * 60 + after.minute) // SLOT_MINUTES)) - 1
+
+    try:
+        day_masks = get_range_masks(doctor_id, today, horizon)
+    except UnknownDoctor:
+        return None
+    for day, open_mask, booked in day_masks:
+        free = open_mask & ~booked
+        if day == today:
+            free &= ~started
+        if free:
+            cell = (free & -free).bit_length() - 1
+            return timezone.make_aware(datetime.combine(day, cell_to_time(cell)))
+    return None
+
+
+def refresh_next_available(doctor_id):
+    """Recompute Doctor.next_available_at without firing Doctor signals."""
+    from doctors.models import Doctor
+
+    Doctor.objects.filter(pk=doctor_id).update(next_available_at=find_next_free(doctor_id))
+
+
+def refresh_day(doctor_id, day):
+    """Move a doctor-day to a new version so it is rebuilt from the database on the next read."""
+    _bump(_booked_version_key(doctor_id, as_date(day)))
+    notify_day(doctor_id, day)
+
+
+def invalidate_availability(doctor_id):
+    _bump(_open_version_key(doctor_id))
+    _bump(_doctor_changes_key(doctor_id))
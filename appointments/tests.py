@@ -1,3 +1,1001 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import re
+import shutil
+import tempfile
+import threading
+from datetime import date, datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from unittest import skipUnless
+
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+
+from accounts.models import UserProfile
+from doctors import views as doctor_views
+from doctors.facets import get_facet_table
+from doctors.models import Doctor, DoctorAvailability
+from hospitals import views as hospital_views
+from hospitals.models import City, Clinic
+from .models import Appointment, ArchivedAppointment
+from .services import NOT_ALLOWED, NOT_FOUND, UNCHANGED, UPDATED, SlotUnavailable, book_slot
+from .slots import get_day_masks, get_day_slots, place_hold, time_to_cell
+from . import slots, views
+from .expiry import expire_batch
+from . import live
+from . import reminders
+from .views import HISTORY_PAGE_SIZE
+
+# Pages render doctor avatars, which are written to MEDIA_ROOT on first use.
+TEST_MEDIA = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(TEST_MEDIA, ignore_errors=True)
+
+
+def next_monday():
+    today = date.today()
+    return today + timedelta(days=7 - today.weekday())
+
+
+def create_doctor(name='Rajesh Kumar'):
+    city = City.objects.create(name='Mumbai')
+    clinic = Clinic.objects.create(name='City Hospital', city=city, address='Andheri West')
+    doctor = Doctor.objects.create(
+        user=User.objects.create_user(username=name.split()[0].lower()),
+        name=name,
+        specialization='Cardiologist',
+        city=city,
+        clinic=clinic,
+        experience=10,
+        consultation_fee=1000,
+    )
+    DoctorAvailability.objects.create(
+        doctor=doctor, day_of_week=0, start_time=time(9, 0), end_time=time(17, 0)
+    )
+    return doctor
+
+
+class SlotEngineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.day = next_monday()
+        self.patient = User.objects.create_user(username='alice')
+
+    def booked(self, value):
+        return bool(get_day_masks(self.doctor.id, self.day)[1] >> time_to_cell(value) & 1)
+
+    def test_span_mask_boundaries(self):
+        self.assertEqual(slots.span_mask(time(9, 0), time(10, 0)), 0b11 << 18)
+        # A slot must start at or after `start`, and before `end`.
+        self.assertEqual(slots.span_mask(time(9, 15), time(10, 15)), 0b11 << 19)
+        self.assertEqual(slots.span_mask(time(9, 0), time(9, 0)), 0)
+        self.assertEqual(slots.span_mask(time(17, 0), time(9, 0)), 0)
+        self.assertEqual(slots.span_mask(time(0, 0), time(23, 59)), (1 << slots.CELLS_PER_DAY) - 1)
+
+    def test_lunch_break_is_never_open(self):
+        self.assertEqual(slots.LUNCH_MASK, slots.span_mask(time(12, 0), time(13, 0)))
+        values = [slot['value'] for slot in get_day_slots(self.doctor.id, self.day)]
+        self.assertEqual(values[4:8], ['11:00', '11:30', '13:00', '13:30'])
+        self.assertEqual((values[0], values[-1], len(values)), ('09:00', '16:30', 14))
+
+    def test_signals_drop_the_cached_day_on_each_change(self):
+        self.assertFalse(self.booked(time(10, 0)))
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = book_slot(self.doctor, self.patient, self.day, time(10, 0))
+        self.assertTrue(self.booked(time(10, 0)))
+
+        appointment.status = 'APPROVED'
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+        self.assertTrue(self.booked(time(10, 0)))
+
+        appointment.status = 'CANCELLED'
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+        self.assertFalse(self.booked(time(10, 0)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = book_slot(self.doctor, self.patient, self.day, time(10, 0))
+        self.assertTrue(self.booked(time(10, 0)))
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.delete()
+        self.assertFalse(self.booked(time(10, 0)))
+
+    def test_rolled_back_booking_leaves_the_cache_alone(self):
+        self.assertFalse(self.booked(time(10, 0)))
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            book_slot(self.doctor, self.patient, self.day, time(10, 0))
+        self.assertTrue(callbacks)
+        self.assertFalse(self.booked(time(10, 0)))
+
+    def test_rebuild_racing_a_cancellation_is_not_cached(self):
+        appointment = book_slot(self.doctor, self.patient, self.day, time(10, 0))
+        # The booking's own drop, without the next-slot refresh that would rebuild the day.
+        slots.refresh_day(self.doctor.id, self.day)
+        read_rows = slots._booking_rows
+
+        def cancel_after_read(*args):
+            rows = list(read_rows(*args))
+            if appointment.status != 'CANCELLED':
+                appointment.status = 'CANCELLED'
+                with self.captureOnCommitCallbacks(execute=True):
+                    appointment.save()
+            return rows
+
+        with mock.patch.object(slots, '_booking_rows', cancel_after_read):
+            self.assertTrue(self.booked(time(10, 0)))
+        self.assertFalse(self.booked(time(10, 0)))
+
+    def test_rebuild_racing_an_availability_edit_is_not_cached(self):
+        read_rows = slots._availability_rows
+
+        def add_hours_after_read(doctor_id):
+            rows = list(read_rows(doctor_id))
+            if not self.doctor.availabilities.filter(day_of_week=1).exists():
+                with self.captureOnCommitCallbacks(execute=True):
+                    DoctorAvailability.objects.create(
+                        doctor=self.doctor, day_of_week=1, start_time=time(9, 0), end_time=time(10, 0)
+                    )
+            return rows
+
+        tuesday = self.day + timedelta(days=1)
+        with mock.patch.object(slots, '_availability_rows', add_hours_after_read):
+            self.assertEqual(get_day_slots(self.doctor.id, tuesday), [])
+        self.assertEqual(len(get_day_slots(self.doctor.id, tuesday)), 2)
+        book_slot(self.doctor, self.patient, tuesday, time(9, 0))
+
+    def test_warm_day_is_served_without_queries(self):
+        request = RequestFactory().get(
+            reverse('appointments:get_available_slots'),
+            {'doctor_id': self.doctor.id, 'date': self.day.isoformat()},
+        )
+        request.user = AnonymousUser()
+        views.get_available_slots(request)
+        with self.assertNumQueries(0):
+            response = views.get_available_slots(request)
+        self.assertEqual(len(json.loads(response.content)['slots']), 14)
+
+
+class SlotRangeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.day = next_monday()
+        self.url = reverse('appointments:get_slots_range')
+        self.patient = User.objects.create_user(username='alice')
+
+    def fetch(self, headers=None, **params):
+        params = {'doctor_id': self.doctor.id, 'start': self.day.isoformat(), **params}
+        return self.client.get(self.url, params, headers=headers)
+
+    def test_cold_range_takes_two_queries_and_warm_one_none(self):
+        with self.assertNumQueries(2):
+            response = self.fetch(days=14)
+        days = response.json()['days']
+        self.assertEqual([d['date'] for d in days][:2], [self.day.isoformat(), (self.day + timedelta(days=1)).isoformat()])
+        self.assertEqual([len(d['slots']) for d in days], [14, 0, 0, 0, 0, 0, 0] * 2)
+        with self.assertNumQueries(0):
+            self.fetch(days=14)
+
+    def test_matching_etag_gets_304(self):
+        etag = self.fetch()['ETag']
+        self.assertEqual(self.fetch(headers={'If-None-Match': etag}).status_code, 304)
+
+    def test_booking_or_hold_changes_the_etag(self):
+        first = self.fetch()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            book_slot(self.doctor, self.patient, self.day, time(9, 0))
+        booked = self.fetch()['ETag']
+        self.assertNotEqual(booked, first)
+        place_hold(self.doctor.id, self.day, time(10, 0), self.patient.id)
+        self.assertNotEqual(self.fetch()['ETag'], booked)
+
+    def test_days_are_clamped(self):
+        self.assertEqual(len(self.fetch(days=365).json()['days']), slots.MAX_RANGE_DAYS)
+        self.assertEqual(len(self.fetch(days=0).json()['days']), 1)
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ({'doctor_id': 'x'}, {'start': '2024-13-01'}, {'days': 'week'}):
+            self.assertEqual(self.fetch(**params).status_code, 400, params)
+
+    def test_unknown_doctor_is_404(self):
+        self.assertEqual(self.fetch(doctor_id=self.doctor.id + 1000).status_code, 404)
+        # A doctor with no availability is still a 200.
+        self.doctor.availabilities.all().delete()
+        cache.clear()
+        self.assertEqual(self.fetch().json()['days'][0]['slots'], [])
+
+
+class NextAvailableTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.monday = next_monday()
+        self.patient = User.objects.create_user(username='alice')
+
+    def at(self, day, hour, minute=0):
+        return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+    def test_started_slots_and_lunch_are_skipped(self):
+        def next_free(hour, minute):
+            return slots.find_next_free(self.doctor.id, after=self.at(self.monday, hour, minute))
+
+        self.assertEqual(next_free(10, 10), self.at(self.monday, 10, 30))
+        self.assertEqual(next_free(11, 40), self.at(self.monday, 13))
+        self.assertEqual(next_free(16, 45), self.at(self.monday + timedelta(days=7), 9))
+
+    def test_nothing_free_within_horizon(self):
+        tuesday = self.monday + timedelta(days=1)
+        self.assertIsNone(slots.find_next_free(self.doctor.id, after=self.at(tuesday, 9), horizon=6))
+        self.assertIsNone(slots.find_next_free(self.doctor.id + 1000))
+
+    def next_available(self):
+        self.doctor.refresh_from_db()
+        return self.doctor.next_available_at
+
+    def test_signals_keep_it_current(self):
+        # Open only on a day after tomorrow, so the answer never depends on the time of day.
+        day = timezone.localdate() + timedelta(days=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.availabilities.all().delete()
+            availability = DoctorAvailability.objects.create(
+                doctor=self.doctor, day_of_week=day.weekday(), start_time=time(9), end_time=time(11)
+            )
+        self.assertEqual(self.next_available(), self.at(day, 9))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = book_slot(self.doctor, self.patient, day, time(9))
+        self.assertEqual(self.next_available(), self.at(day, 9, 30))
+
+        appointment.status = 'CANCELLED'
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+        self.assertEqual(self.next_available(), self.at(day, 9))
+
+        availability.start_time = time(10)
+        with self.captureOnCommitCallbacks(execute=True):
+            availability.save()
+        self.assertEqual(self.next_available(), self.at(day, 10))
+
+    def test_command_recomputes_stale_values(self):
+        expected = slots.find_next_free(self.doctor.id)
+        other = create_doctor('Sunil Rao')
+        Doctor.objects.filter(pk=self.doctor.pk).update(next_available_at=timezone.now() - timedelta(hours=1))
+        Doctor.objects.filter(pk=other.pk).update(next_available_at=timezone.now() + timedelta(days=400))
+
+        out = io.StringIO()
+        call_command('refresh_next_available', stdout=out)
+        self.assertIn('for 1 doctors', out.getvalue())
+        self.assertEqual(self.next_available(), expected)
+        other.refresh_from_db()
+        self.assertGreater(other.next_available_at, timezone.now() + timedelta(days=300))
+
+        call_command('refresh_next_available', '--all', stdout=out)
+        other.refresh_from_db()
+        self.assertEqual(other.next_available_at, slots.find_next_free(other.id))
+
+
+class BookingServiceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.day = next_monday()
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.bob = User.objects.create_user(username='bob', password='pw')
+
+    def test_second_booking_of_slot_conflicts(self):
+        book_slot(self.doctor, self.alice, self.day, time(9, 30))
+        with self.assertRaises(SlotUnavailable):
+            book_slot(self.doctor, self.bob, self.day, time(9, 30))
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 1)
+
+    def test_cancelled_slot_can_be_rebooked(self):
+        first = book_slot(self.doctor, self.alice, self.day, time(9, 30))
+        first.status = 'CANCELLED'
+        first.save()
+        second = book_slot(self.doctor, self.bob, self.day, time(9, 30))
+        self.assertEqual(second.status, 'PENDING')
+
+    def test_stale_cached_booked_bit_does_not_block_booking(self):
+        # Another worker's cache can still mark a cancelled slot as booked.
+        get_day_masks(self.doctor.id, self.day)
+        version = cache.get(slots._booked_version_key(self.doctor.id, self.day))
+        cache.set(slots._booked_key(self.doctor.id, self.day, version), 1 << time_to_cell(time(9, 30)))
+        appointment = book_slot(self.doctor, self.alice, self.day, time(9, 30))
+        self.assertEqual(appointment.status, 'PENDING')
+
+    def test_slot_outside_schedule_is_rejected(self):
+        for slot in (time(8, 0), time(12, 0), time(9, 15)):
+            with self.assertRaises(SlotUnavailable):
+                book_slot(self.doctor, self.alice, self.day, slot)
+        with self.assertRaises(SlotUnavailable):
+            book_slot(self.doctor, self.alice, self.day + timedelta(days=1), time(9, 0))
+
+    def test_booking_page_minimum_is_the_local_date(self):
+        # The service rejects dates before timezone.localdate(), which can differ from the server's date.today().
+        self.client.login(username='alice', password='pw')
+        local_today = date.today() + timedelta(days=1)
+        with mock.patch.object(timezone, 'localdate', return_value=local_today):
+            response = self.client.get(reverse('appointments:create', args=[self.doctor.id]))
+        self.assertContains(response, f'min="{local_today.isoformat()}"')
+
+    def test_booking_view_returns_conflict(self):
+        book_slot(self.doctor, self.alice, self.day, time(10, 0))
+        self.client.login(username='bob', password='pw')
+        response = self.client.post(
+            reverse('appointments:create', args=[self.doctor.id]),
+            {'date': self.day.isoformat(), 'time': '10:00'},
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Appointment.objects.filter(patient=self.bob).exists())
+
+
+class SlotHoldTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.day = next_monday()
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.bob = User.objects.create_user(username='bob', password='pw')
+
+    def slot(self, value, user=None):
+        slots = get_day_slots(self.doctor.id, self.day, user_id=user and user.id)
+        return next(s for s in slots if s['value'] == value)
+
+    def test_held_slot_is_taken_for_everyone_else(self):
+        self.assertTrue(place_hold(self.doctor.id, self.day, time(9, 0), self.alice.id))
+        self.assertFalse(place_hold(self.doctor.id, self.day, time(9, 0), self.bob.id))
+        self.assertTrue(self.slot('09:00', self.bob)['is_held'])
+        self.assertFalse(self.slot('09:00', self.alice)['is_booked'])
+
+        with self.assertRaises(SlotUnavailable):
+            book_slot(self.doctor, self.bob, self.day, time(9, 0))
+        book_slot(self.doctor, self.alice, self.day, time(9, 0))
+
+    def test_new_hold_releases_previous_one(self):
+        place_hold(self.doctor.id, self.day, time(9, 0), self.alice.id)
+        place_hold(self.doctor.id, self.day, time(10, 0), self.alice.id)
+        self.assertTrue(place_hold(self.doctor.id, self.day, time(9, 0), self.bob.id))
+
+    def test_releasing_a_hold_on_another_day_moves_that_day(self):
+        other_day = self.day + timedelta(days=7)
+        place_hold(self.doctor.id, self.day, time(9, 0), self.alice.id)
+        before = cache.get_many(slots.change_keys(self.doctor.id, self.day))
+        place_hold(self.doctor.id, other_day, time(9, 0), self.alice.id)
+        self.assertNotEqual(cache.get_many(slots.change_keys(self.doctor.id, self.day)), before)
+        self.assertFalse(self.slot('09:00', self.bob)['is_held'])
+
+    def test_hold_endpoint_reports_conflict(self):
+        self.client.login(username='bob', password='pw')
+        url = reverse('appointments:hold_slot')
+        data = {'doctor_id': self.doctor.id, 'date': self.day.isoformat(), 'time': '11:00'}
+        self.assertEqual(self.client.post(url, data).status_code, 200)
+
+        self.client.login(username='alice', password='pw')
+        self.assertEqual(self.client.post(url, data).status_code, 409)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA)
+class PatientPagesQueryBudgetTests(TestCase):
+    # session + user + profile (patient_required) + the page's own queries;
+    # past history also counts the archive and fetches from both tables.
+    DASHBOARD_BUDGET = 6
+    HISTORY_BUDGET = 8
+
+    def setUp(self):
+        cache.clear()
+        self.patient = User.objects.create_user(username='alice', password='pw')
+        self.client.login(username='alice', password='pw')
+        self.today = date.today()
+
+    def visit(self, count):
+        """`count` appointments split between past and upcoming, each with its own doctor."""
+        for i in range(count):
+            doctor = create_doctor(f'Doctor{i} Kumar')
+            Appointment.objects.create(
+                patient=self.patient, doctor=doctor, time=time(10, 0),
+                date=self.today + timedelta(days=(i % 2 and -1 or 1) * (i + 1)),
+                status='COMPLETED' if i % 2 else 'APPROVED',
+            )
+
+    def render(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_pages_stay_within_budget(self):
+        self.visit(2 * HISTORY_PAGE_SIZE + 6)
+        _, queries = self.render(reverse('appointments:patient_dashboard'))
+        self.assertLessEqual(queries, self.DASHBOARD_BUDGET)
+
+        for view in ('upcoming', 'past'):
+            response, queries = self.render(reverse('appointments:appointment_history') + f'?view={view}&page=2')
+            self.assertLessEqual(queries, self.HISTORY_BUDGET)
+            self.assertEqual(response.context['counts'], {'upcoming': HISTORY_PAGE_SIZE + 3, 'past': HISTORY_PAGE_SIZE + 3})
+            self.assertEqual(len(response.context['appointments']), 3)
+
+    def test_history_splits_on_today(self):
+        self.visit(4)
+        past = self.render(reverse('appointments:appointment_history') + '?view=past')[0].context['appointments']
+        upcoming = self.render(reverse('appointments:appointment_history'))[0].context['appointments']
+        self.assertTrue(all(a.date < self.today for a in past))
+        self.assertTrue(all(a.date >= self.today for a in upcoming))
+        self.assertEqual([a.date for a in past], sorted((a.date for a in past), reverse=True))
+        self.assertEqual([a.date for a in upcoming], sorted(a.date for a in upcoming))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA)
+class BulkStatusUpdateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.doctor.user.set_password('pw')
+        self.doctor.user.save()
+        self.doctor.user.profile.role = 'DOCTOR'
+        self.doctor.user.profile.save()
+        self.other = create_doctor('Meera Shah')
+        self.day = next_monday()
+        self.patient = User.objects.create_user(username='alice')
+        self.mine = [book_slot(self.doctor, self.patient, self.day, time(hour, 0)) for hour in (9, 10, 11, 14)]
+        self.theirs = Appointment.objects.create(
+            doctor=self.other, patient=self.patient, date=self.day, time=time(9, 0)
+        )
+        self.client.login(username=self.doctor.user.username, password='pw')
+        self.url = reverse('appointments:bulk_update_status')
+
+    def post_json(self, ids, status):
+        return self.client.post(self.url, {'ids': ids, 'status': status}, content_type='application/json')
+
+    def test_one_select_and_one_update(self):
+        ids = [a.pk for a in self.mine]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post_json(ids + [self.theirs.pk], 'APPROVED')
+        writes = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "appointments_appointment"')]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(response.json()['updated'], 4)
+        self.assertEqual(response.json()['results'][str(self.theirs.pk)], NOT_FOUND)
+        self.assertEqual(Appointment.objects.get(pk=self.theirs.pk).status, 'PENDING')
+
+    def test_outcomes_per_item(self):
+        first, second = self.mine[:2]
+        self.post_json([first.pk], 'CANCELLED')
+        results = self.post_json([first.pk, second.pk, 999999], 'APPROVED').json()['results']
+        self.assertEqual(results, {str(first.pk): NOT_ALLOWED, str(second.pk): UPDATED, '999999': NOT_FOUND})
+        self.assertEqual(self.post_json([second.pk], 'APPROVED').json()['results'], {str(second.pk): UNCHANGED})
+        self.assertEqual(self.post_json([second.pk], 'COMPLETED').status_code, 400)
+
+    def test_cancellation_frees_cached_slots(self):
+        get_day_masks(self.doctor.id, self.day)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'ids': [a.pk for a in self.mine[:2]], 'status': 'CANCELLED'})
+        self.assertRedirects(response, reverse('doctors:dashboard'), fetch_redirect_response=False)
+
+        _, booked = get_day_masks(self.doctor.id, self.day)
+        self.assertFalse(booked >> time_to_cell(time(9, 0)) & 1)
+        self.assertTrue(booked >> time_to_cell(time(11, 0)) & 1)
+        book_slot(self.doctor, User.objects.create_user(username='bob'), self.day, time(9, 0))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA)
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.patient = User.objects.create_user(username='alice', password='pw')
+        self.today = date.today()
+        self.old = [
+            Appointment.objects.create(
+                doctor=self.doctor, patient=self.patient, status=status, time=time(10, 0),
+                date=self.today - timedelta(days=400 + i),
+            )
+            for i, status in enumerate(['COMPLETED', 'CANCELLED', 'COMPLETED', 'APPROVED', 'COMPLETED'])
+        ]
+        self.recent = Appointment.objects.create(
+            doctor=self.doctor, patient=self.patient, status='COMPLETED', time=time(10, 0),
+            date=self.today - timedelta(days=3),
+        )
+
+    def archive(self, *args):
+        call_command('archive_appointments', '--batch-size', '2', *args, stdout=io.StringIO())
+
+    def test_command_moves_old_finished_rows_and_resumes(self):
+        sent = timezone.now() - timedelta(days=390)
+        Appointment.objects.filter(pk=self.old[0].pk).update(reminder_sent_at=sent)
+        self.old[0].refresh_from_db()
+        self.archive('--max-batches', '1')
+        self.assertEqual(ArchivedAppointment.objects.count(), 2)
+        self.archive()
+
+        archived = ArchivedAppointment.objects.order_by('id')
+        self.assertEqual([a.pk for a in archived], [a.pk for a in self.old if a.status != 'APPROVED'])
+        self.assertEqual(
+            (archived[0].created_at, archived[0].updated_at, archived[0].reminder_sent_at),
+            (self.old[0].created_at, self.old[0].updated_at, sent),
+        )
+        self.assertCountEqual(
+            Appointment.objects.values_list('pk', flat=True), [self.old[3].pk, self.recent.pk]
+        )
+
+    def test_history_reads_both_tables_in_date_order(self):
+        self.archive()
+        self.client.login(username='alice', password='pw')
+        url = reverse('appointments:appointment_history') + '?view=past'
+        with mock.patch.object(views, 'HISTORY_PAGE_SIZE', 4):
+            first = self.client.get(url)
+            second = self.client.get(url + '&page=2')
+
+        self.assertEqual(first.context['counts']['past'], 6)
+        rows = [*first.context['appointments'], *second.context['appointments']]
+        self.assertEqual([a.date for a in rows], sorted((a.date for a in rows), reverse=True))
+        self.assertEqual(
+            [type(a).__name__ for a in rows],
+            ['Appointment', 'ArchivedAppointment', 'ArchivedAppointment', 'ArchivedAppointment',
+             'Appointment', 'ArchivedAppointment'],
+        )
+
+
+class ExpiryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.patient = User.objects.create_user(username='alice')
+
+    def create(self, day, status, at=time(10, 0)):
+        return Appointment.objects.create(doctor=self.doctor, patient=self.patient, date=day, time=at, status=status)
+
+    def test_command_closes_past_rows_in_batches_and_is_idempotent(self):
+        past = date.today() - timedelta(days=2)
+        approved = [self.create(past - timedelta(days=i), 'APPROVED') for i in range(3)]
+        pending = self.create(past, 'PENDING', time(11, 0))
+        future = self.create(date.today() + timedelta(days=2), 'APPROVED')
+
+        out = io.StringIO()
+        call_command('complete_past_appointments', '--batch-size', '2', '--pause', '0', stdout=out)
+        self.assertIn('APPROVED -> COMPLETED: 3', out.getvalue())
+        self.assertIn('PENDING -> CANCELLED: 1', out.getvalue())
+        statuses = dict(Appointment.objects.values_list('pk', 'status'))
+        self.assertEqual({statuses[a.pk] for a in approved}, {'COMPLETED'})
+        self.assertEqual(statuses[pending.pk], 'CANCELLED')
+        self.assertEqual(statuses[future.pk], 'APPROVED')
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('complete_past_appointments', '--pause', '0', stdout=io.StringIO())
+        self.assertFalse(any(q['sql'].startswith('UPDATE') for q in queries))
+
+    def test_only_ended_slots_today(self):
+        today = date.today()
+        ended = self.create(today, 'APPROVED', time(9, 0))
+        running = self.create(today, 'APPROVED', time(9, 30))
+        now = timezone.make_aware(datetime.combine(today, time(9, 45)))
+
+        self.assertEqual(expire_batch('APPROVED', now=now), 1)
+        self.assertEqual(Appointment.objects.get(pk=ended.pk).status, 'COMPLETED')
+        self.assertEqual(Appointment.objects.get(pk=running.pk).status, 'APPROVED')
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.doctor = create_doctor()
+        self.other = Doctor.objects.create(
+            user=User.objects.create_user(username='meera'), name='Meera Shah', specialization='Dermatologist',
+            city=City.objects.create(name='Pune'), clinic=self.doctor.clinic, experience=4, consultation_fee=600,
+        )
+        self.patient = User.objects.create_user(username='alice', first_name='Alice', last_name='Fernandes')
+        self.staff = User.objects.create_user(username='ops', password='pw', is_staff=True)
+        self.doctor.user.set_password('pw')
+        self.doctor.user.save()
+        start = date.today() + timedelta(days=1)
+        for i, status in enumerate(['PENDING', 'APPROVED', 'CANCELLED', 'APPROVED', 'PENDING']):
+            Appointment.objects.create(
+                doctor=self.doctor, patient=self.patient, date=start + timedelta(days=i), time=time(10), status=status,
+                notes='Follow-up, "urgent"' if i == 0 else '',
+            )
+        Appointment.objects.create(doctor=self.other, patient=self.patient, date=start, time=time(10), status='PENDING')
+
+    def export(self, username, **params):
+        self.client.login(username=username, password='pw')
+        return self.client.get(reverse('appointments:export_appointments'), params)
+
+    def csv_rows(self, response):
+        return list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_staff_export_joins_and_filters(self):
+        response = self.export('ops', status='approved,pending', city='mumbai')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = self.csv_rows(response)
+        self.assertEqual([row['status'] for row in rows], ['PENDING', 'APPROVED', 'APPROVED', 'PENDING'])
+        self.assertEqual(rows[0]['notes'], 'Follow-up, "urgent"')
+        self.assertEqual((rows[0]['patient_first_name'], rows[0]['doctor'], rows[0]['clinic']),
+                         ('Alice', 'Rajesh Kumar', 'City Hospital'))
+
+        day = (date.today() + timedelta(days=2)).isoformat()
+        rows = self.csv_rows(self.export('ops', date_from=day, date_to=day))
+        self.assertEqual([row['date'] for row in rows], [day])
+
+    def test_csv_defuses_spreadsheet_formulas(self):
+        formula = '=HYPERLINK("http://evil.example","x")'
+        Appointment.objects.filter(notes='').update(notes=formula)
+        rows = self.csv_rows(self.export('ops', status='cancelled'))
+        self.assertEqual(rows[0]['notes'], "'" + formula)
+        lines = b''.join(self.export('ops', format='jsonl', status='cancelled').streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(lines[0])['notes'], formula)
+
+    def test_doctor_gets_only_their_own_appointments_as_jsonl(self):
+        response = self.export('rajesh', format='jsonl')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual({json.loads(line)['doctor_id'] for line in lines}, {self.doctor.pk})
+        self.assertEqual(len(lines), 5)
+
+    def test_patients_and_bad_filters_are_refused(self):
+        self.patient.set_password('pw')
+        self.patient.save()
+        self.assertEqual(self.export('alice').status_code, 403)
+        self.assertEqual(self.export('ops', status='LOST').status_code, 400)
+        self.assertEqual(self.export('ops', date_from='tomorrow').status_code, 400)
+        self.assertEqual(self.export('ops', format='xlsx').status_code, 400)
+
+    def test_command_reads_in_keyset_batches(self):
+        out = io.StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('export_appointments', '--chunk-size', '2', stdout=out, stderr=io.StringIO())
+        rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(len({row['id'] for row in rows}), 6)
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT')]
+        # Three full batches, then an empty one that ends the export.
+        self.assertEqual(len(selects), 4)
+        self.assertTrue(all('LIMIT 2' in sql for sql in selects))
+
+        with self.assertRaises(CommandError):
+            call_command('export_appointments', '--status', 'LOST', stdout=io.StringIO(), stderr=io.StringIO())
+
+
+class ReminderTests(TestCase):
+    def setUp(self):
+        self.doctor = create_doctor()
+        self.today = timezone.localdate()
+
+    def book(self, days, hour, status='APPROVED', email=True):
+        patient = User.objects.create_user(
+            username=f'patient{days}-{hour}-{status}', first_name='Asha',
+            email=f'patient{days}-{hour}@example.com' if email else '',
+        )
+        return Appointment.objects.create(
+            doctor=self.doctor, patient=patient, date=self.today + timedelta(days=days), time=time(hour), status=status,
+        )
+
+    def test_window_selects_approved_unreminded_appointments_in_one_query(self):
+        now = timezone.make_aware(datetime.combine(self.today, time(10)))
+        due = [self.book(0, 11), self.book(0, 16), self.book(1, 9)]
+        self.book(0, 9)                       # already started
+        self.book(1, 10)                      # exactly 24 hours away: next run
+        self.book(0, 14, status='PENDING')    # not confirmed
+        Appointment.objects.filter(pk=self.book(0, 15).pk).update(reminder_sent_at=now)
+
+        with CaptureQueriesContext(connection) as queries:
+            selected = list(reminders.due_reminders(now, hours=24))
+            [a.doctor.clinic.name for a in selected]
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([a.pk for a in selected], [a.pk for a in due])
+
+    def test_command_sends_in_batched_connections_and_is_idempotent(self):
+        for days in (1, 2):
+            for hour in (9, 10, 11):
+                self.book(days, hour)
+        no_email = self.book(2, 14, email=False)
+        self.book(5, 9)
+
+        out = io.StringIO()
+        with mock.patch.object(reminders, 'get_connection', wraps=reminders.get_connection) as get_connection:
+            call_command('send_reminders', '--hours', '72', '--batch-size', '3', stdout=out)
+        self.assertEqual(len(mail.outbox), 6)
+        # Three batches; the last holds only the patient without email, so it opens no connection.
+        self.assertEqual(get_connection.call_count, 2)
+        self.assertIn('batch 3: 0 sent, 1 without email', out.getvalue())
+        self.assertIn('Sent 6 reminders (1 patients without email)', out.getvalue())
+        self.assertIn('messages/s', out.getvalue())
+        self.assertIn('Dr. Rajesh Kumar', mail.outbox[0].body)
+        self.assertEqual(mail.outbox[0].to, ['patient1-9@example.com'])
+        self.assertIsNotNone(Appointment.objects.get(pk=no_email.pk).reminder_sent_at)
+
+        call_command('send_reminders', '--hours', '72', stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 6)
+
+
+class LiveSlotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.day = next_monday()
+        self.url = reverse('appointments:slot_stream') + f'?doctor_id={self.doctor.pk}&date={self.day}'
+
+    def book(self, hour):
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(
+                doctor=self.doctor, patient=User.objects.create_user(username=f'p{hour}'),
+                date=self.day, time=time(hour), status='PENDING',
+            )
+
+    @staticmethod
+    def parse(message):
+        data = next(line for line in message.splitlines() if line.startswith('data: '))
+        return {slot['value']: slot for slot in json.loads(data[6:])['slots']}
+
+    def test_wsgi_gets_one_snapshot_and_a_retry_hint(self):
+        self.book(9)
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.count('event: slots'), 1)
+        self.assertIn(f'retry: {live.FALLBACK_RETRY_MS}', body)
+        self.assertTrue(self.parse(body)['09:00']['is_booked'])
+
+    @mock.patch.object(live, 'POLL_SECONDS', 0.01)
+    async def test_asgi_stream_pushes_bookings_and_holds(self):
+        response = await AsyncClient().get(self.url)
+        stream = aiter(response.streaming_content)
+        try:
+            first = self.parse((await anext(stream)).decode())
+            self.assertFalse(first['10:00']['is_booked'])
+
+            await sync_to_async(self.book)(10)
+            update = self.parse((await asyncio.wait_for(anext(stream), 2)).decode())
+            self.assertTrue(update['10:00']['is_booked'])
+
+            await sync_to_async(place_hold)(self.doctor.pk, self.day, '11:00', user_id=999)
+            update = self.parse((await asyncio.wait_for(anext(stream), 2)).decode())
+            self.assertTrue(update['11:00']['is_held'])
+        finally:
+            await stream.aclose()
+
+    @mock.patch.object(live, 'POLL_SECONDS', 0.01)
+    async def test_asgi_stream_pushes_hold_moved_to_another_day(self):
+        await sync_to_async(place_hold)(self.doctor.pk, self.day, '11:00', user_id=999)
+        response = await AsyncClient().get(self.url)
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertTrue(self.parse((await anext(stream)).decode())['11:00']['is_held'])
+            await sync_to_async(place_hold)(self.doctor.pk, self.day + timedelta(days=7), '11:00', user_id=999)
+            update = self.parse((await asyncio.wait_for(anext(stream), 2)).decode())
+            self.assertFalse(update['11:00']['is_held'])
+        finally:
+            await stream.aclose()
+
+    @mock.patch.object(live, 'POLL_SECONDS', 0.01)
+    @mock.patch.object(slots, 'HOLD_SECONDS', 0.2)
+    async def test_asgi_stream_pushes_hold_expiry(self):
+        await sync_to_async(place_hold)(self.doctor.pk, self.day, '11:00', user_id=999)
+        response = await AsyncClient().get(self.url)
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertTrue(self.parse((await anext(stream)).decode())['11:00']['is_held'])
+            update = self.parse((await asyncio.wait_for(anext(stream), 2)).decode())
+            self.assertFalse(update['11:00']['is_held'])
+        finally:
+            await stream.aclose()
+
+    def test_bad_parameters_are_rejected(self):
+        self.assertEqual(self.client.get(reverse('appointments:slot_stream') + '?doctor_id=x').status_code, 400)
+
+
+class AsyncJsonViewTests(TestCase):
+    """The async JSON views must answer exactly like their sync twins."""
+
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.day = next_monday()
+        Appointment.objects.create(
+            doctor=self.doctor, patient=User.objects.create_user(username='alice'),
+            date=self.day, time=time(10), status='APPROVED',
+        )
+
+    async def assert_same(self, sync_view, async_view, params, cold=True):
+        request = RequestFactory().get('/', params)
+        request.user = AnonymousUser()
+        async_request = AsyncRequestFactory().get('/', params)
+        async_request.user = AnonymousUser()
+
+        async def auser():
+            return async_request.user
+        async_request.auser = auser
+
+        if cold:
+            await sync_to_async(cache.clear)()
+        expected = await sync_to_async(sync_view)(request)
+        if cold:
+            await sync_to_async(cache.clear)()
+        actual = await async_view(async_request)
+        self.assertEqual(actual.status_code, expected.status_code)
+        self.assertEqual(json.loads(actual.content), json.loads(expected.content))
+        return json.loads(actual.content)
+
+    async def test_available_slots(self):
+        params = {'doctor_id': self.doctor.pk, 'date': self.day.isoformat()}
+        await self.assert_same(views.get_available_slots, views.aget_available_slots, params)
+        # Holds live only in the cache, so compare warm once one is placed.
+        await sync_to_async(place_hold)(self.doctor.pk, self.day, '11:00', user_id=999)
+        data = await self.assert_same(views.get_available_slots, views.aget_available_slots, params, cold=False)
+        slots = {slot['value']: slot for slot in data['slots']}
+        self.assertTrue(slots['10:00']['is_booked'])
+        self.assertTrue(slots['11:00']['is_held'])
+        await self.assert_same(views.get_available_slots, views.aget_available_slots, {'doctor_id': 'x', 'date': 'y'})
+
+    async def test_clinics_and_doctors_by_city(self):
+        city_id = self.doctor.city_id
+        data = await self.assert_same(
+            hospital_views.get_clinics_by_city, hospital_views.aget_clinics_by_city, {'city_id': city_id}
+        )
+        self.assertEqual([clinic['name'] for clinic in data['clinics']], ['City Hospital'])
+        for cold in (True, False):
+            data = await self.assert_same(
+                doctor_views.get_doctors_by_city, doctor_views.aget_doctors_by_city, {'city': city_id}, cold
+            )
+        self.assertEqual([doctor['name'] for doctor in data['cities'][0]['doctors']], ['Rajesh Kumar'])
+
+
+# A plan step that reads a whole table: "SCAN t" or "SCAN t AS alias", with no index.
+FULL_SCAN = re.compile(r'^SCAN (\S+)(?: AS \S+)?$')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite-specific')
+@override_settings(MEDIA_ROOT=TEST_MEDIA)
+class QueryPlanTests(TestCase):
+    """Every SELECT behind the hot pages must be answered from an index.
+
+    The only table scans allowed are unfiltered ones walked in index order
+    with a LIMIT, such as the first page of doctors by -id, which stop early.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        cities = City.objects.bulk_create([City(name=f'City {i}') for i in range(20)])
+        clinics = Clinic.objects.bulk_create(
+            [Clinic(name=f'Clinic {i}', city=cities[i % 20], address='-') for i in range(100)]
+        )
+        users = User.objects.bulk_create([User(username=f'user{i}') for i in range(600)])
+        doctors = Doctor.objects.bulk_create([
+            Doctor(
+                user=users[i], name=f'Doctor {i}', specialization=f'Speciality {i % 15}',
+                city=cities[i % 20], clinic=clinics[i % 100], experience=5, consultation_fee=500,
+            )
+            for i in range(300)
+        ])
+        patients = users[300:]
+        Appointment.objects.bulk_create([
+            Appointment(
+                doctor=doctors[i % 300], patient=patients[i % 300], status=('PENDING', 'APPROVED', 'COMPLETED')[i % 3],
+                date=today + timedelta(days=i // 300 - 10), time=time(9 + i // 6000, 0),
+            )
+            for i in range(12000)
+        ])
+        ArchivedAppointment.objects.bulk_create([
+            ArchivedAppointment(
+                id=100000 + i, doctor=doctors[i % 300], patient=patients[i % 300], status='COMPLETED',
+                date=today - timedelta(days=400 + i // 300), time=time(10, 0), created_at=timezone.now(),
+                updated_at=timezone.now(),
+            )
+            for i in range(3000)
+        ])
+        DoctorAvailability.objects.bulk_create([
+            DoctorAvailability(doctor=doctor, day_of_week=day, start_time=time(9), end_time=time(17))
+            for doctor in doctors for day in range(5)
+        ])
+        cls.doctor, cls.patient, cls.city = doctors[0], patients[0], cities[3]
+        for user, role in ((cls.doctor.user, 'DOCTOR'), (cls.patient, 'PATIENT')):
+            UserProfile.objects.create(user=user, role=role)
+            user.set_password('pw')
+            user.save()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = [row[-1] for row in cursor.fetchall()]
+        unfiltered = ' WHERE ' not in sql
+        if unfiltered and ' LIMIT ' in sql and not any('TEMP B-TREE FOR ORDER BY' in step for step in plan):
+            return []
+        return [step for step in plan if FULL_SCAN.match(step)]
+
+    def assert_indexed(self, who, url, data=None):
+        self.client.logout()
+        if who:
+            self.client.login(username=who.username, password='pw')
+        cache.clear()
+        # The facet table is a deliberate whole-directory GROUP BY, cached between requests.
+        get_facet_table()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data) if data else self.client.get(url)
+        self.assertLess(response.status_code, 400, url)
+        for query in queries:
+            if query['sql'].startswith('SELECT'):
+                with self.subTest(url=url, sql=query['sql'][:200]):
+                    self.assertEqual(self.full_scans(query['sql']), [])
+
+    def test_directory_pages(self):
+        self.assert_indexed(None, reverse('doctors:doctor_list'))
+        self.assert_indexed(None, reverse('doctors:search_doctors') + '?specialization=Speciality 3')
+        self.assert_indexed(None, reverse('doctors:search_doctors') + f'?city={self.city.name}&specialization=Speciality 3')
+        self.assert_indexed(None, reverse('doctors:search_doctors') + '?clinic=Clinic 3&sort=next_available')
+        self.assert_indexed(None, reverse('doctors:search_doctors') + '?q=doctor&available=week')
+        self.assert_indexed(None, reverse('doctors:doctor_detail', args=[self.doctor.pk]))
+        self.assert_indexed(None, reverse('doctors:get_doctors_by_city') + f'?city={self.city.pk}')
+
+    def test_booking_paths(self):
+        day = next_monday()
+        self.assert_indexed(
+            None, reverse('appointments:get_slots_range') + f'?doctor_id={self.doctor.pk}&start={day}&days=14'
+        )
+        self.assert_indexed(
+            self.patient, reverse('appointments:create', args=[self.doctor.pk]), {'date': day, 'time': '09:30'}
+        )
+
+    def test_dashboards_and_history(self):
+        self.assert_indexed(self.doctor.user, reverse('doctors:dashboard'))
+        self.assert_indexed(self.patient, reverse('appointments:patient_dashboard'))
+        self.assert_indexed(self.patient, reverse('appointments:appointment_history'))
+        self.assert_indexed(self.patient, reverse('appointments:appointment_history') + '?view=past&page=3')
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    THREADS = 16
+
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.day = next_monday()
+        self.patients = [
+            User.objects.create_user(username=f'patient{i}') for i in range(self.THREADS)
+        ]
+
+    def test_exactly_one_winner_per_slot(self):
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+
+        def attempt(patient):
+            try:
+                barrier.wait()
+                book_slot(self.doctor, patient, self.day, time(11, 0))
+                results.append('booked')
+            except SlotUnavailable:
+                results.append('conflict')
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=attempt, args=(p,)) for p in self.patients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count('booked'), 1)
+        self.assertEqual(results.count('conflict'), self.THREADS - 1)
+        self.assertEqual(
+            Appointment.objects.filter(doctor=self.doctor, date=self.day, time=time(11, 0)).count(), 1
+        )
+
+    def test_benchmark_command_reports_throughput(self):
+        out = io.StringIO()
+        call_command('benchmark_booking', threads=8, rounds=2, doctor=self.doctor.id, stdout=out)
+        self.assertRegex(out.getvalue(), r'\d+ attempts/s')
+        self.assertFalse(Appointment.objects.filter(doctor=self.doctor).exists())
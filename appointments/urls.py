@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -12,6 +13,15 @@ urlpatterns = [
     path('create/<int:doctor_id>/', views.book_appointment, name='create'),
 
     path('cancel/<int:pk>/', views.cancel_appointment, name='cancel_appointment'),
+    path('status/bulk/', views.bulk_update_status, name='bulk_update_status'),
     path('status/<int:pk>/<str:status>/', views.update_appointment_status, name='update_appointment_status'),         
-    path('ajax/slots/', views.get_available_slots, name='get_available_slots'),
+    path('export/', views.export_appointments, name='export_appointments'),
+    path(
+        'ajax/slots/',
+        views.aget_available_slots if settings.ASYNC_VIEWS else views.get_available_slots,
+        name='get_available_slots',
+    ),
+    path('ajax/slots/stream/', views.slot_stream, name='slot_stream'),
+    path('ajax/slots/range/', views.get_slots_range, name='get_slots_range'),
+    path('ajax/slots/hold/', views.hold_slot, name='hold_slot'),
 ]
@@ -1,30 +1,95 @@
-from datetime import date, datetime, timedelta
+import hashlib
+import json
+from datetime import datetime
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from .models import Appointment
-from doctors.models import Doctor, DoctorAvailability
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db.models import Count, Q
+from django.template.defaultfilters import pluralize
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_GET, require_POST
+from .archive import PastAppointments
+from .exports import APPOINTMENT_EXPORT
+from .live import slot_events, snapshot
+from .models import Appointment, ArchivedAppointment
+from .services import (
+    NOT_ALLOWED, NOT_FOUND, STATUS_TRANSITIONS, UPDATED, SlotUnavailable, book_slot, update_statuses,
+)
+from .slots import (
+    ACTIVE_STATUSES, HOLD_SECONDS, MAX_RANGE_DAYS, UnknownDoctor, aget_day_slots, get_day_slots, get_range_masks,
+    held_masks, place_hold, slots_from_masks,
+)
+from doctors.models import Doctor
 from accounts.decorators import patient_required
+from hospital_management.exports import export_response
+
+# Rows per table on the patient dashboard.
+DASHBOARD_ROWS = 5
+
+# Appointments per page in the patient's history.
+HISTORY_PAGE_SIZE = 20
+
+# Most appointments one bulk status update may touch.
+MAX_BULK_IDS = 200
+
+
+def _patient_appointments(user):
+    """The patient's appointments with the doctor and clinic the pages render, joined in."""
+    return Appointment.objects.filter(patient=user).select_related('doctor', 'doctor__clinic')
 
 
 @patient_required
 def patient_dashboard(request):
-    appointments = request.user.patient_appointments.all()
-    latest_doctors = Doctor.objects.select_related('user').order_by('-id')[:3]
+    today = timezone.localdate()
+    appointments = _patient_appointments(request.user)
+    upcoming = appointments.filter(date__gte=today, status__in=ACTIVE_STATUSES).order_by('date', 'time')
+    recent = appointments.filter(date__lt=today).order_by('-date', '-time')
+    latest_doctors = Doctor.objects.order_by('-id')[:3]
 
     return render(request, 'appointments/patient_dashboard.html', {
-        'appointments': appointments,
+        'appointments': upcoming[:DASHBOARD_ROWS],
+        'recent_appointments': recent[:DASHBOARD_ROWS],
         'doctors': latest_doctors
     })
 
 
 @patient_required
 def appointment_history(request):
-    appointments = request.user.patient_appointments.all()
+    """Upcoming or past appointments (?view=past), HISTORY_PAGE_SIZE per page.
+
+    Past visits include those moved to the archive table. The tab sizes
+    come from one conditional aggregate plus an archive count, which also
+    seed the paginator, so a page costs a fixed handful of queries however
+    many visits the patient has.
+    """
+    today = timezone.localdate()
+    view = 'past' if request.GET.get('view') == 'past' else 'upcoming'
+    appointments = _patient_appointments(request.user)
+    counts = appointments.aggregate(
+        upcoming=Count('id', filter=Q(date__gte=today)),
+        past=Count('id', filter=Q(date__lt=today)),
+    )
+    counts['past'] += ArchivedAppointment.objects.filter(patient=request.user).count()
+
+    if view == 'past':
+        appointments = PastAppointments(request.user, today, counts['past'])
+    else:
+        appointments = appointments.filter(date__gte=today).order_by('date', 'time', 'id')
+    paginator = Paginator(appointments, HISTORY_PAGE_SIZE)
+    paginator.count = counts[view]
+    page = paginator.get_page(request.GET.get('page'))
 
     return render(request, 'appointments/appointment_history.html', {
-        'appointments': appointments
+        'appointments': page.object_list,
+        'page_obj': page,
+        'counts': counts,
+        'view': view,
     })
 
 
@@ -33,25 +98,27 @@ def book_appointment(request, doctor_id):
     doctor = get_object_or_404(Doctor, id=doctor_id)
 
     if request.method == 'POST':
-        date_val = request.POST.get('date')
-        time_val = request.POST.get('time')
-        notes = request.POST.get('notes')
-
-        Appointment.objects.create(
-            doctor=doctor,
-            patient=request.user,
-            date=date_val,
-            time=time_val,
-            status='PENDING',
-            notes=notes
-        )
+        try:
+            book_slot(
+                doctor,
+                request.user,
+                request.POST.get('date'),
+                request.POST.get('time'),
+                notes=request.POST.get('notes'),
+            )
+        except SlotUnavailable as e:
+            messages.error(request, str(e))
+            return render(request, 'appointments/book_appointment.html', {
+                'doctor': doctor,
+                'today': timezone.localdate()
+            }, status=409)
 
         messages.success(request, "Appointment booked successfully!")
         return redirect('appointments:patient_dashboard')
 
     return render(request, 'appointments/book_appointment.html', {
         'doctor': doctor,
-        'today': date.today()
+        'today': timezone.localdate()
     })
 
 
@@ -70,91 +137,201 @@ def cancel_appointment(request, pk):
     return redirect('doctors:doctor_list')
 
 
-def get_available_slots(request):
+def _slot_request(request):
+    """(doctor_id, date) from the query string, None if either is missing; raises ValueError."""
     doctor_id = request.GET.get('doctor_id')
     date_str = request.GET.get('date')
-
     if not doctor_id or not date_str:
+        return None
+    return int(doctor_id), datetime.strptime(date_str, '%Y-%m-%d').date()
+
+
+def get_available_slots(request):
+    try:
+        wanted = _slot_request(request)
+    except ValueError:
+        return JsonResponse({'slots': [], 'error': 'Invalid doctor or date.'})
+    if wanted is None:
         return JsonResponse({'slots': []})
 
+    # Served from the cached doctor-day bitmaps (see appointments/slots.py)
+    slots = get_day_slots(*wanted, user_id=request.user.id)
+    return JsonResponse({'slots': slots})
+
+
+async def aget_available_slots(request):
+    """get_available_slots for ASGI: async cache reads, async ORM on a cold day."""
+    try:
+        wanted = _slot_request(request)
+    except ValueError:
+        return JsonResponse({'slots': [], 'error': 'Invalid doctor or date.'})
+    if wanted is None:
+        return JsonResponse({'slots': []})
+
+    user = await request.auser()
+    slots = await aget_day_slots(*wanted, user_id=user.id)
+    return JsonResponse({'slots': slots})
+
+
+@require_GET
+async def slot_stream(request):
+    """Server-Sent Events with a doctor-day's slots, resent whenever they change.
+
+    ?doctor_id=&date=YYYY-MM-DD. Under ASGI the stream stays open (see
+    appointments.live); under WSGI it is a single event with a retry hint.
+    """
+    try:
+        doctor_id = int(request.GET.get('doctor_id', ''))
+        day = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'error': 'Invalid doctor or date.'}, status=400)
+
+    user = await request.auser()
+    if isinstance(request, ASGIRequest):
+        events = slot_events(doctor_id, day, user.id)
+    else:
+        events = [await sync_to_async(snapshot)(doctor_id, day, user.id)]
+
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_GET
+def get_slots_range(request):
+    """Free/booked slots for a doctor over `days` consecutive days from `start`.
+
+    The ETag is derived from the underlying bitmaps, so a client re-polling
+    an unchanged range gets a 304 without the slot lists being rebuilt.
+    """
+    try:
+        doctor_id = int(request.GET.get('doctor_id', ''))
+        start = datetime.strptime(request.GET.get('start', ''), '%Y-%m-%d').date()
+        days = int(request.GET.get('days', 7))
+    except ValueError:
+        return JsonResponse({'days': [], 'error': 'Invalid doctor, start or days.'}, status=400)
+    days = max(1, min(days, MAX_RANGE_DAYS))
+
+    try:
+        masks = get_range_masks(doctor_id, start, days)
+    except UnknownDoctor:
+        raise Http404('No Doctor matches the given query.')
+    held = held_masks(doctor_id, masks, user_id=request.user.id)
+    digest = hashlib.md5(repr((doctor_id, masks, sorted(held.items()))).encode()).hexdigest()
+    etag = f'"{digest}"'
+
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    response = JsonResponse({
+        'days': [
+            {
+                'date': day.isoformat(),
+                'slots': slots_from_masks(open_mask, booked, held.get(day, 0)),
+            }
+            for day, open_mask, booked in masks
+        ]
+    })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@require_POST
+@patient_required
+def hold_slot(request):
+    """Reserve the slot a patient just picked while they finish the booking form."""
     try:
-        print(f"DEBUG: Fetching slots for Doctor ID: {doctor_id}, Date: {date_str}")
-        doctor = Doctor.objects.get(id=doctor_id)
-        selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        day_of_week = selected_date.weekday()
-        print(f"DEBUG: Day of week: {day_of_week}")
-
-        availability = DoctorAvailability.objects.filter(
-            doctor=doctor,
-            day_of_week=day_of_week
-        ).first()
-
-        if not availability:
-            print(f"DEBUG: No availability found for Doctor {doctor.name} on day {day_of_week}")
-            return JsonResponse({'slots': []})
-        
-        print(f"DEBUG: Found availability: {availability.start_time} - {availability.end_time}")
-
-        # Generate slots
-        slots = []
-        current_time = datetime.combine(selected_date, availability.start_time)
-        end_time = datetime.combine(selected_date, availability.end_time)
-
-        # Get existing appointments
-        existing_appointments = Appointment.objects.filter(
-            doctor=doctor,
-            date=selected_date,
-            status__in=['PENDING', 'APPROVED']
-        ).values_list('time', flat=True)
-        
-        print(f"DEBUG: Existing appointments at: {list(existing_appointments)}")
-
-        while current_time < end_time:
-            time_val = current_time.time()
-            
-            # Check if slot is booked
-            is_booked = time_val in existing_appointments
-            
-            slots.append({
-                'value': time_val.strftime('%H:%M'),
-                'label': current_time.strftime('%I:%M %p'),
-                'is_booked': is_booked
-            })
-
-            current_time += timedelta(minutes=30)  # 30 min intervals
-
-        # Filter out Lunch Break (12:00 PM - 1:00 PM)
-        # We need to filter the *generated* slots list or avoid adding them.
-        # Let's rewrite the loop slightly or filter 'slots' list
-        final_slots = []
-        for slot in slots:
-            # slot['value'] is "HH:MM" e.g. "12:00", "12:30"
-            t_str = slot['value']
-            h = int(t_str.split(':')[0])
-            # Remove 12:00 and 12:30
-            if h == 12:
-                continue
-            final_slots.append(slot)
-            
-        print(f"DEBUG: Returning {len(final_slots)} slots")
-        return JsonResponse({'slots': final_slots})
-
-    except Exception as e:
-        import traceback
-        print(f"DEBUG: Error: {e}")
-        traceback.print_exc()
-        return JsonResponse({'slots': [], 'error': str(e)})
+        doctor_id = int(request.POST.get('doctor_id', ''))
+        selected_date = datetime.strptime(request.POST.get('date', ''), '%Y-%m-%d').date()
+        selected_time = datetime.strptime(request.POST.get('time', ''), '%H:%M').time()
+    except ValueError:
+        return JsonResponse({'held': False, 'error': 'Invalid doctor, date or time.'}, status=400)
+
+    if not place_hold(doctor_id, selected_date, selected_time, request.user.id):
+        return JsonResponse(
+            {'held': False, 'error': 'This slot was just taken. Please pick another one.'},
+            status=409,
+        )
+    return JsonResponse({'held': True, 'expires_in': HOLD_SECONDS})
 
 
 from accounts.decorators import doctor_required
 
 @doctor_required
 def update_appointment_status(request, pk, status):
-    appointment = get_object_or_404(Appointment, pk=pk, doctor=request.user.doctor_profile)
-    
-    if status in ['APPROVED', 'CANCELLED']:
-        appointment.status = status
-        appointment.save()
-        messages.success(request, f"Appointment marked as {status}.")
-    
+    doctor = get_object_or_404(Doctor, user=request.user)
+
+    if status in STATUS_TRANSITIONS:
+        outcome = update_statuses(doctor, [pk], status)[pk]
+        if outcome == NOT_FOUND:
+            raise Http404('No Appointment matches the given query.')
+        if outcome == NOT_ALLOWED:
+            messages.error(request, f"This appointment can no longer be marked as {status}.")
+        else:
+            messages.success(request, f"Appointment marked as {status}.")
+
     return redirect('doctors:dashboard')
+
+
+@require_POST
+@doctor_required
+def bulk_update_status(request):
+    """Approve or cancel many of the doctor's appointments at once.
+
+    Accepts a form post (ids=1&ids=2&status=APPROVED) from the dashboard,
+    which redirects back with a summary, or a JSON body
+    {"ids": [1, 2], "status": "APPROVED"}, which gets per-id outcomes.
+    """
+    as_json = request.content_type == 'application/json'
+    try:
+        if as_json:
+            payload = json.loads(request.body)
+            raw_ids, status = payload.get('ids', []), payload.get('status')
+        else:
+            raw_ids, status = request.POST.getlist('ids'), request.POST.get('status')
+        ids = list(dict.fromkeys(int(pk) for pk in raw_ids))
+    except (TypeError, ValueError, AttributeError):
+        ids, status = None, None
+
+    if not ids or len(ids) > MAX_BULK_IDS or status not in STATUS_TRANSITIONS:
+        error = f'Send 1-{MAX_BULK_IDS} appointment ids and a status of APPROVED or CANCELLED.'
+        if as_json:
+            return JsonResponse({'error': error}, status=400)
+        messages.error(request, error)
+        return redirect('doctors:dashboard')
+
+    doctor = get_object_or_404(Doctor, user=request.user)
+    results = update_statuses(doctor, ids, status)
+    updated = sum(outcome == UPDATED for outcome in results.values())
+
+    if as_json:
+        return JsonResponse({'status': status, 'updated': updated, 'results': results})
+    skipped = len(ids) - updated
+    message = f"{updated} appointment{pluralize(updated)} marked as {status}."
+    if skipped:
+        message += f" {skipped} skipped (already {status.lower()}, closed, or not yours)."
+    messages.success(request, message)
+    return redirect('doctors:dashboard')
+
+
+@require_GET
+@login_required
+def export_appointments(request):
+    """Stream appointments as ?format=csv|jsonl with patient, doctor and clinic joined.
+
+    Staff get every appointment; a doctor gets their own. Filters:
+    ?date_from=&date_to= (YYYY-MM-DD), ?status=PENDING,APPROVED and
+    ?city= (id or name).
+    """
+    if request.user.is_staff:
+        appointments = None
+    else:
+        doctor = Doctor.objects.filter(user=request.user).only('id').first()
+        if doctor is None:
+            raise PermissionDenied
+        appointments = Appointment.objects.filter(doctor=doctor)
+    return export_response(APPOINTMENT_EXPORT, request, appointments)
@@ -1,4 +1,6 @@
 from django.contrib import admin
+from hospital_management.exports import export_action
+from .exports import DOCTOR_EXPORT
 from .models import Doctor, DoctorAvailability
 
 
@@ -13,6 +15,7 @@ class DoctorAdmin(admin.ModelAdmin):
     list_filter = ['city', 'specialization']
     search_fields = ['name', 'specialization']
     inlines = [DoctorAvailabilityInline]
+    actions = [export_action(DOCTOR_EXPORT)]
 
 
 @admin.register(DoctorAvailability)
@@ -0,0 +1,69 @@
+"""
+Hospital Management - Doctors App Default Avatars
+
+Doctors without a profile photo get an initials avatar: a small SVG with
+a background colour picked from a hash of the name. It is written once
+to media/doctors/avatars/ and served like any other upload, so the card
+grids never wait on a third-party avatar service. It is keyed by name
+alone, so building the URL never needs the doctor's user row.
+"""
+import hashlib
+import re
+import threading
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils.html import escape
+
+AVATAR_DIR = 'doctors/avatars'
+
+# Backgrounds dark enough for white initials.
+PALETTE = (
+    '#1abc9c', '#16a085', '#2e86c1', '#1f618d', '#8e44ad', '#6c3483',
+    '#d35400', '#c0392b', '#b7950b', '#2c3e50', '#117864', '#a93226',
+)
+
+SVG_TEMPLATE = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="256" height="256" viewBox="0 0 256 256">'
+    '<rect width="256" height="256" fill="{color}"/>'
+    '<text x="50%" y="50%" dy=".35em" text-anchor="middle" fill="#fff" '
+    'font-family="Segoe UI, Helvetica, Arial, sans-serif" font-size="104" font-weight="600">{initials}</text>'
+    '</svg>'
+)
+
+# Avatars this process has already seen on disk, so each one is stat'ed once.
+_written = set()
+_written_lock = threading.Lock()
+
+
+def initials(name):
+    words = [w for w in re.split(r'[\s.]+', name or '') if w and w.lower() != 'dr']
+    if not words:
+        return '?'
+    letters = words[0][0] + (words[-1][0] if len(words) > 1 else '')
+    return letters.upper()
+
+
+def _digest(name):
+    return hashlib.md5((name or '').strip().lower().encode()).hexdigest()
+
+
+def render_svg(name):
+    color = PALETTE[int(_digest(name), 16) % len(PALETTE)]
+    return SVG_TEMPLATE.format(color=color, initials=escape(initials(name)))
+
+
+def avatar_path(name):
+    return f'{AVATAR_DIR}/{_digest(name)[:16]}.svg'
+
+
+def default_avatar_url(name, storage=default_storage):
+    """URL of the initials avatar for `name`, writing the file on first use."""
+    path = avatar_path(name)
+    if path not in _written:
+        with _written_lock:
+            if path not in _written:
+                if not storage.exists(path):
+                    storage.save(path, ContentFile(render_svg(name).encode()))
+                _written.add(path)
+    return storage.url(path)
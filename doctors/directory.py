@@ -0,0 +1,152 @@
+"""
+Hospital Management - Doctors App City Directory
+
+Per-city payloads for the cascading dropdowns: the city's clinics and
+doctors, read with values() so no model instances or user rows are built.
+
+Each city has a data version in the cache. Payloads are cached under
+(city, version), and the Doctor/City/Clinic signals bump the version of
+every city a change touches, so stale payloads are simply never read
+again and expire on their own. Versions start from the clock rather than
+1, so a version lost to eviction never repeats one a client already holds
+an ETag for.
+
+The a-prefixed functions are the same lookups for async views, using the
+async cache API and async ORM iteration.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from appointments.slots import aget_many
+
+# Old payloads are unreachable once their city's version moves on.
+PAYLOAD_TIMEOUT = 60 * 60 * 24
+
+# Most cities one request may ask for.
+MAX_CITIES = 20
+
+
+def _version_key(city_id):
+    return f'doctors:city-version:{city_id}'
+
+
+def _payload_key(city_id, version):
+    return f'doctors:by-city:{city_id}:{version}'
+
+
+def city_versions(city_ids):
+    """{city_id: version} for `city_ids`, starting a version for cities without one."""
+    keys = {_version_key(city_id): city_id for city_id in city_ids}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    for key, city_id in keys.items():
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            versions[city_id] = cache.get(key)
+    return versions
+
+
+async def acity_versions(city_ids):
+    keys = {_version_key(city_id): city_id for city_id in city_ids}
+    found = await aget_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    missing = [city_id for key, city_id in keys.items() if key not in found]
+    if missing:
+        # Rare (first request for a city); one thread hop rather than two per city.
+        versions.update(await sync_to_async(city_versions)(missing))
+    return versions
+
+
+def bump_city(*city_ids):
+    for city_id in {city_id for city_id in city_ids if city_id is not None}:
+        key = _version_key(city_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+
+
+def _city_rows(city_ids):
+    from hospitals.models import City
+
+    return City.objects.filter(pk__in=city_ids).values('id', 'name')
+
+
+def _clinic_rows(city_ids):
+    from hospitals.models import Clinic
+
+    return Clinic.objects.filter(city_id__in=city_ids).order_by('name').values('id', 'name', 'city_id')
+
+
+def _doctor_rows(city_ids):
+    from .models import Doctor
+
+    return (
+        Doctor.objects.filter(city_id__in=city_ids)
+        .order_by('name')
+        .values('id', 'name', 'specialization', 'clinic_id', 'city_id')
+    )
+
+
+def _empty_payloads(cities):
+    return {city['id']: {**city, 'clinics': [], 'doctors': []} for city in cities}
+
+
+def _add_rows(payloads, section, rows):
+    for row in rows:
+        payloads[row.pop('city_id')][section].append(row)
+
+
+def build_payloads(city_ids):
+    """{city_id: {'id', 'name', 'clinics', 'doctors'}} for existing cities, in three queries."""
+    payloads = _empty_payloads(_city_rows(city_ids))
+    if payloads:
+        _add_rows(payloads, 'clinics', _clinic_rows(list(payloads)))
+        _add_rows(payloads, 'doctors', _doctor_rows(list(payloads)))
+    return payloads
+
+
+async def abuild_payloads(city_ids):
+    payloads = _empty_payloads([city async for city in _city_rows(city_ids)])
+    if payloads:
+        _add_rows(payloads, 'clinics', [row async for row in _clinic_rows(list(payloads))])
+        _add_rows(payloads, 'doctors', [row async for row in _doctor_rows(list(payloads))])
+    return payloads
+
+
+def get_city_payloads(city_ids, versions=None):
+    """Return ({city_id: payload}, {city_id: version}); warm cities cost no queries."""
+    if versions is None:
+        versions = city_versions(city_ids)
+    keys = {_payload_key(city_id, version): city_id for city_id, version in versions.items()}
+    payloads = {keys[key]: payload for key, payload in cache.get_many(keys).items()}
+
+    cold = [city_id for city_id in city_ids if city_id not in payloads]
+    if cold:
+        built = build_payloads(cold)
+        cache.set_many(
+            {_payload_key(city_id, versions[city_id]): payload for city_id, payload in built.items()},
+            PAYLOAD_TIMEOUT,
+        )
+        payloads.update(built)
+    return payloads, versions
+
+
+async def aget_city_payloads(city_ids, versions=None):
+    if versions is None:
+        versions = await acity_versions(city_ids)
+    keys = {_payload_key(city_id, version): city_id for city_id, version in versions.items()}
+    payloads = {keys[key]: payload for key, payload in (await aget_many(keys)).items()}
+
+    cold = [city_id for city_id in city_ids if city_id not in payloads]
+    if cold:
+        built = await abuild_payloads(cold)
+        # BaseCache.aset_many would await aset() once per city; see slots.aget_many.
+        await sync_to_async(cache.set_many)(
+            {_payload_key(city_id, versions[city_id]): payload for city_id, payload in built.items()},
+            PAYLOAD_TIMEOUT,
+        )
+        payloads.update(built)
+    return payloads, versions
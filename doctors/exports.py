@@ -0,0 +1,27 @@
+"""
+Hospital Management - Doctors App Export
+
+The doctor directory as a streaming export; see hospital_management.exports.
+"""
+from hospital_management.exports import Export
+
+from .models import Doctor
+
+DOCTOR_EXPORT = Export(
+    'doctors',
+    lambda: Doctor.objects.all(),
+    (
+        ('id', 'id'),
+        ('name', 'name'),
+        ('specialization', 'specialization'),
+        ('city_id', 'city_id'),
+        ('city', 'city__name'),
+        ('clinic_id', 'clinic_id'),
+        ('clinic', 'clinic__name'),
+        ('experience', 'experience'),
+        ('consultation_fee', 'consultation_fee'),
+        ('next_available_at', 'next_available_at'),
+        ('username', 'user__username'),
+    ),
+    city_field='city',
+)
@@ -0,0 +1,86 @@
+"""
+Hospital Management - Doctors App Search Facets
+
+The search dropdowns are built from one cached table of
+(city, specialization, clinic) -> doctor count, read with a single
+GROUP BY query. The table is cached under a version that the
+Doctor/City/Clinic signals bump once their transaction commits, so a
+rebuild that read the rows before the commit lands on a version nobody
+reads any more. Each
+dropdown's counts are conditional on the other selected filters, which is
+cheap to compute from the table since it has one row per distinct
+combination rather than per doctor.
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models import Count
+
+VERSION_KEY = 'doctors:facets-version'
+
+# Old tables are unreachable once the version moves on.
+FACETS_TIMEOUT = 60 * 60 * 24
+
+
+def _facets_key(version):
+    return f'doctors:facets:{version}'
+
+# (facet name, position in the facet table row)
+FACETS = (('city', 0), ('specialization', 1), ('clinic', 2))
+
+
+def build_facet_table():
+    from .models import Doctor
+
+    rows = (
+        Doctor.objects.order_by()
+        .values_list('city__name', 'specialization', 'clinic__name')
+        .annotate(count=Count('id'))
+    )
+    return [tuple(row) for row in rows]
+
+
+def facets_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock so a version lost to eviction is never reused.
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def get_facet_table():
+    key = _facets_key(facets_version())
+    table = cache.get(key)
+    if table is None:
+        table = build_facet_table()
+        cache.set(key, table, FACETS_TIMEOUT)
+    return table
+
+
+def invalidate_facets():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # No version yet, so nothing cached to invalidate.
+        pass
+
+
+def facet_counts(selected):
+    """{'city': [(name, count), ...], ...} for a {'city': ..., 'specialization': ..., 'clinic': ...} selection.
+
+    Counts for one facet honour the other facets' selections. A selected
+    value is always listed, even when the other filters leave it empty.
+    """
+    table = get_facet_table()
+    result = {}
+    for name, position in FACETS:
+        others = [(pos, selected.get(other)) for other, pos in FACETS if pos != position and selected.get(other)]
+        counts = {}
+        for row in table:
+            if all(row[pos] == value for pos, value in others):
+                counts[row[position]] = counts.get(row[position], 0) + row[3]
+        if selected.get(name):
+            counts.setdefault(selected[name], 0)
+        result[name] = sorted(counts.items())
+    return result
@@ -0,0 +1,150 @@
+"""
+Hospital Management - Doctors App Calendar Feed
+
+Each doctor gets a private iCalendar URL listing their PENDING and
+APPROVED appointments, which calendar apps subscribe to and poll. The URL
+carries a random per-doctor token (Doctor.calendar_token) instead of
+requiring a login. The doctor can replace it from the dashboard, which
+cuts off every copy of the old link at once.
+
+The body is streamed: appointments are read with .iterator() in chunks of
+FEED_CHUNK_SIZE and each VEVENT is yielded as soon as it is formatted, so
+memory stays flat however long the doctor's history is. The validators
+come from the newest Appointment.updated_at for the doctor, one indexed
+MAX joined to the token lookup, or Doctor.calendar_changed_at when a
+later deletion took an event away, so a poll with If-Modified-Since or
+If-None-Match is answered 304 in one query without reading a single
+appointment.
+"""
+import secrets
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Max
+from django.utils import timezone
+
+from appointments.models import Appointment
+from appointments.slots import ACTIVE_STATUSES, SLOT_MINUTES
+from .models import Doctor
+
+# Bytes of randomness in a feed token (43 URL-safe characters).
+TOKEN_BYTES = 32
+
+FEED_CHUNK_SIZE = 500
+
+PRODID = '-//Hospital MS//Doctor Schedule//EN'
+
+# Appointment status -> iCalendar VEVENT STATUS.
+EVENT_STATUS = {
+    'PENDING': 'TENTATIVE',
+    'APPROVED': 'CONFIRMED',
+}
+
+# RFC 5545 folds content lines longer than this many octets.
+LINE_OCTETS = 75
+
+
+def regenerate_feed_token(doctor):
+    """Give the doctor a new feed token; links with the old one stop working."""
+    doctor.calendar_token = secrets.token_urlsafe(TOKEN_BYTES)
+    # update(), not save(): the token is not part of any cached profile or directory.
+    Doctor.objects.filter(pk=doctor.pk).update(calendar_token=doctor.calendar_token)
+    return doctor.calendar_token
+
+
+def feed_token(doctor):
+    """The doctor's feed token, issued on first use."""
+    return doctor.calendar_token or regenerate_feed_token(doctor)
+
+
+def feed_state(token):
+    """(doctor id, last change) for a feed token, or None if no doctor has it.
+
+    The last change is when any of the doctor's appointments last changed,
+    or None if they have none. Every status counts, so a cancellation (which
+    drops an event) moves it too. A deleted row leaves no updated_at behind,
+    so deletions are read from Doctor.calendar_changed_at.
+    """
+    if not token:
+        return None
+    row = (
+        Doctor.objects.filter(calendar_token=token)
+        .annotate(latest=Max('doctor_appointments__updated_at'))
+        .values_list('pk', 'latest', 'calendar_changed_at')
+        .first()
+    )
+    if row is None:
+        return None
+    doctor_id, *changes = row
+    changes = [value for value in changes if value is not None]
+    return doctor_id, max(changes) if changes else None
+
+
+def escape_text(value):
+    return (
+        str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def fold(line):
+    """Split a content line into CRLF-terminated chunks of at most LINE_OCTETS octets."""
+    encoded = line.encode()
+    if len(encoded) <= LINE_OCTETS:
+        return line + '\r\n'
+    parts, start, limit = [], 0, LINE_OCTETS
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Never cut a UTF-8 sequence in half.
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        # Continuation lines start with a space, which counts towards the limit.
+        start, limit = end, LINE_OCTETS - 1
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _event(row, doctor):
+    pk, day, slot_time, status, notes, updated_at, username, first_name, last_name = row
+    start = timezone.make_aware(datetime.combine(day, slot_time))
+    patient = f'{first_name} {last_name}'.strip() or username
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:appointment-{pk}@hospital-ms',
+        f'DTSTAMP:{_utc(updated_at)}',
+        f'DTSTART:{_utc(start)}',
+        f'DTEND:{_utc(start + timedelta(minutes=SLOT_MINUTES))}',
+        f'SUMMARY:{escape_text(f"Appointment: {patient}")}',
+        f'STATUS:{EVENT_STATUS[status]}',
+        f'LOCATION:{escape_text(f"{doctor.clinic.name}, {doctor.city.name}")}',
+    ]
+    if notes:
+        lines.append(f'DESCRIPTION:{escape_text(notes)}')
+    lines.append('END:VEVENT')
+    return ''.join(fold(line) for line in lines)
+
+
+def feed_chunks(doctor):
+    """Yield the doctor's calendar piece by piece: header, one VEVENT per appointment, footer."""
+    yield ''.join(fold(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(f"Dr. {doctor.name}")}',
+    ))
+    rows = (
+        Appointment.objects.filter(doctor=doctor, status__in=ACTIVE_STATUSES)
+        .order_by('date', 'time', 'id')
+        .values_list(
+            'id', 'date', 'time', 'status', 'notes', 'updated_at',
+            'patient__username', 'patient__first_name', 'patient__last_name',
+        )
+    )
+    for row in rows.iterator(chunk_size=FEED_CHUNK_SIZE):
+        yield _event(row, doctor)
+    yield fold('END:VCALENDAR')
@@ -0,0 +1,90 @@
+"""
+Hospital Management - Doctors App Profile Image Variants
+
+Uploaded profile photos arrive at camera resolution but are only ever
+shown as avatars. Each upload is cropped square and saved as JPEG and
+WebP at VARIANT_SIZES pixels under media/doctors/variants/. The names are
+recorded in Doctor.image_variants for the templates' srcset attributes.
+
+Variants are generated in a background thread once the saving
+transaction commits, so the upload request does not pay for the
+resizing. Until they exist, the templates fall back to the original. The
+generate_image_variants command backfills existing photos and anything a
+restart interrupted.
+"""
+import io
+import logging
+import os
+import threading
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+VARIANT_SIZES = (64, 128, 256)
+
+# (variants key, Pillow format, file extension, save options)
+VARIANT_FORMATS = (
+    ('jpeg', 'JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    ('webp', 'WEBP', 'webp', {'quality': 80, 'method': 6}),
+)
+
+VARIANT_DIR = 'doctors/variants'
+
+
+def variant_name(name, size, extension):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'{VARIANT_DIR}/{stem}-{size}.{extension}'
+
+
+def make_variants(name, storage=default_storage):
+    """Write every size/format of the image stored at `name`; return {'jpeg': {'64': name, ...}, ...}."""
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    variants = {key: {} for key, *_ in VARIANT_FORMATS}
+    for size in VARIANT_SIZES:
+        square = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        for key, image_format, extension, options in VARIANT_FORMATS:
+            buffer = io.BytesIO()
+            square.save(buffer, image_format, **options)
+            target = variant_name(name, size, extension)
+            storage.delete(target)
+            variants[key][str(size)] = storage.save(target, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def generate_variants(doctor_id):
+    """Build and record the variants for a doctor's current photo; False if there is none."""
+    from .models import Doctor
+    from .profile import bump_profile
+
+    name = Doctor.objects.filter(pk=doctor_id).values_list('profile_image', flat=True).first()
+    if not name:
+        return False
+    variants = make_variants(name)
+    # Skip the write if a newer photo was uploaded meanwhile; its own run records it.
+    Doctor.objects.filter(pk=doctor_id, profile_image=name).update(image_variants=variants)
+    bump_profile(doctor_id)
+    return True
+
+
+def _generate_in_background(doctor_id):
+    try:
+        generate_variants(doctor_id)
+    except Exception:
+        logger.exception('Could not build image variants for doctor %s', doctor_id)
+    finally:
+        # The thread opened its own connection; don't leave it dangling.
+        connection.close()
+
+
+def schedule_variants(doctor_id):
+    """Generate variants off the request thread once the current transaction commits."""
+    transaction.on_commit(
+        lambda: threading.Thread(target=_generate_in_background, args=(doctor_id,), daemon=True).start()
+    )
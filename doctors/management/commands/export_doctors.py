@@ -0,0 +1,11 @@
+"""
+Management command to export the doctor directory as CSV or JSON Lines.
+Usage: python manage.py export_doctors [--format csv|jsonl] [--output FILE] [--city ID|NAME]
+"""
+from doctors.exports import DOCTOR_EXPORT
+from hospital_management.exports import ExportCommand
+
+
+class Command(ExportCommand):
+    help = "Export doctors with their city and clinic"
+    export = DOCTOR_EXPORT
@@ -0,0 +1,33 @@
+"""
+Management command to build resized profile image variants.
+Usage: python manage.py generate_image_variants [--force]
+
+New uploads get their variants in the background as they are saved; run
+this once after migrating to backfill existing photos, and again if a
+restart cut a background run short.
+"""
+from django.core.management.base import BaseCommand
+from doctors.images import generate_variants
+from doctors.models import Doctor
+
+
+class Command(BaseCommand):
+    help = "Generate JPEG/WebP avatar variants for doctor profile images"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild variants that already exist')
+
+    def handle(self, *args, **options):
+        doctors = Doctor.objects.exclude(profile_image='').exclude(profile_image__isnull=True)
+        if not options['force']:
+            doctors = doctors.filter(image_variants={})
+
+        done = failed = 0
+        for doctor_id in doctors.values_list('id', flat=True).iterator(chunk_size=500):
+            try:
+                done += generate_variants(doctor_id)
+            except (OSError, ValueError) as exc:
+                # Missing or unreadable files shouldn't stop the backfill.
+                failed += 1
+                self.stderr.write(f'Doctor {doctor_id}: {exc}')
+        self.stdout.write(self.style.SUCCESS(f'Generated image variants for {done} doctors ({failed} failed)'))
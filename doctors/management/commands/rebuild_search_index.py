@@ -0,0 +1,23 @@
+"""
+Management command to refill the doctor full-text search index.
+Usage: python manage.py rebuild_search_index
+
+Triggers keep the index current on every write; run this after restoring
+a database or loading data with the triggers disabled.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from doctors.models import Doctor
+from doctors.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the SQLite FTS5 index used by doctor search'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The full-text index is only used on SQLite.')
+
+        with transaction.atomic():
+            rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {Doctor.objects.count()} doctors'))
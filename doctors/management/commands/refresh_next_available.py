@@ -0,0 +1,34 @@
+"""
+Management command to recompute each doctor's earliest free slot.
+Usage: python manage.py refresh_next_available [--all]
+
+Bookings and availability edits keep Doctor.next_available_at current on
+their own; this catches values that went stale because the slot time
+passed. Run it from cron every few minutes, and once with --all after
+migrating to backfill existing doctors.
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from appointments.slots import refresh_next_available
+from doctors.models import Doctor
+
+
+class Command(BaseCommand):
+    help = "Recompute Doctor.next_available_at for doctors whose value is stale"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Refresh every doctor, not only stale ones')
+
+    def handle(self, *args, **options):
+        doctors = Doctor.objects.all()
+        if not options['all']:
+            doctors = doctors.filter(
+                Q(next_available_at__isnull=True) | Q(next_available_at__lt=timezone.now())
+            )
+
+        count = 0
+        for doctor_id in doctors.values_list('id', flat=True).iterator(chunk_size=500):
+            refresh_next_available(doctor_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Refreshed next available slot for {count} doctors'))
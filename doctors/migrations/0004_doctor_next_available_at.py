@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0003_alter_doctor_id_alter_doctoravailability_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='next_available_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, help_text='Earliest free slot, maintained from appointments and availability', null=True),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Full-text index over doctor name, specialization, clinic and city (SQLite FTS5).
+
+from django.db import migrations
+
+FTS_TABLE = 'doctors_doctor_fts'
+
+INSERT_ROW = f"""
+    INSERT INTO {FTS_TABLE}(rowid, name, specialization, clinic, city)
+    VALUES (
+        NEW.id, NEW.name, NEW.specialization,
+        (SELECT name FROM hospitals_clinic WHERE id = NEW.clinic_id),
+        (SELECT name FROM hospitals_city WHERE id = NEW.city_id)
+    );
+"""
+
+CREATE_SQL = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        name, specialization, clinic, city,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON doctors_doctor BEGIN
+        {INSERT_ROW}
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON doctors_doctor BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF name, specialization, clinic_id, city_id
+        ON doctors_doctor BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+        {INSERT_ROW}
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_clinic_au AFTER UPDATE OF name ON hospitals_clinic BEGIN
+        UPDATE {FTS_TABLE} SET clinic = NEW.name
+        WHERE rowid IN (SELECT id FROM doctors_doctor WHERE clinic_id = NEW.id);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_city_au AFTER UPDATE OF name ON hospitals_city BEGIN
+        UPDATE {FTS_TABLE} SET city = NEW.name
+        WHERE rowid IN (SELECT id FROM doctors_doctor WHERE city_id = NEW.id);
+    END""",
+    f"""INSERT INTO {FTS_TABLE}(rowid, name, specialization, clinic, city)
+        SELECT d.id, d.name, d.specialization, c.name, ci.name
+        FROM doctors_doctor d
+        LEFT JOIN hospitals_clinic c ON c.id = d.clinic_id
+        LEFT JOIN hospitals_city ci ON ci.id = d.city_id""",
+]
+
+DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}'
+    for suffix in ('ai', 'ad', 'au', 'clinic_au', 'city_au')
+] + [f'DROP TABLE IF EXISTS {FTS_TABLE}']
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        # FTS5 is SQLite-only; other backends fall back to icontains search.
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0004_doctor_next_available_at'),
+        ('hospitals', '0003_alter_city_id_alter_clinic_id_alter_lab_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
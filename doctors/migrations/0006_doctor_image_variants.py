@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:36
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+search_index = import_module('doctors.migrations.0005_doctor_search_index')
+
+# SQLite adds this column by rebuilding doctors_doctor, which drops the
+# FTS triggers on it and breaks the ones that reference it. Take them down
+# around the rebuild; the index rows themselves carry over by id.
+TRIGGERS_CREATE = search_index.CREATE_SQL[1:-1]
+TRIGGERS_DROP = search_index.DROP_SQL[:-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0005_doctor_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(search_index.run(TRIGGERS_DROP), search_index.run(TRIGGERS_CREATE)),
+        migrations.AddField(
+            model_name='doctor',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized JPEG/WebP copies of profile_image, by format and size'),
+        ),
+        migrations.RunPython(search_index.run(TRIGGERS_CREATE), search_index.run(TRIGGERS_DROP)),
+    ]
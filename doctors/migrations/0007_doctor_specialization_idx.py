@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0006_doctor_image_variants'),
+        ('hospitals', '0005_name_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['specialization'], name='doctor_specialization_idx'),
+        ),
+    ]
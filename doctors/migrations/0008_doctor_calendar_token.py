@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:37
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+search_index = import_module('doctors.migrations.0005_doctor_search_index')
+
+# A unique column is added by rebuilding doctors_doctor; see 0006 for the triggers.
+TRIGGERS_CREATE = search_index.CREATE_SQL[1:-1]
+TRIGGERS_DROP = search_index.DROP_SQL[:-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0007_doctor_specialization_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(search_index.run(TRIGGERS_DROP), search_index.run(TRIGGERS_CREATE)),
+        migrations.AddField(
+            model_name='doctor',
+            name='calendar_token',
+            field=models.CharField(blank=True, editable=False, help_text='Secret in the calendar feed URL; issued on first use, replaced on request', max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(search_index.run(TRIGGERS_CREATE), search_index.run(TRIGGERS_DROP)),
+    ]
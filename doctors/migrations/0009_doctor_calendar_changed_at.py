@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0008_doctor_calendar_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='calendar_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Last deletion of a pending or approved appointment, for the calendar feed validators', null=True),
+        ),
+    ]
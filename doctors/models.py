@@ -4,9 +4,11 @@ Hospital Management - Doctors App Models
 Doctor: Doctor profile with details, linked to User for login
 DoctorAvailability: Available days and time slots per doctor
 """
+from django.core.files.storage import default_storage
 from django.db import models
 from django.contrib.auth.models import User
 from hospitals.models import City, Clinic
+from .avatars import default_avatar_url
 
 
 class Doctor(models.Model):
@@ -27,13 +29,59 @@ class Doctor(models.Model):
     profile_image = models.ImageField(
         upload_to='doctors/', blank=True, null=True
     )
+    image_variants = models.JSONField(
+        default=dict, blank=True, editable=False,
+        help_text="Resized JPEG/WebP copies of profile_image, by format and size"
+    )
+    next_available_at = models.DateTimeField(
+        null=True, blank=True, db_index=True, editable=False,
+        help_text="Earliest free slot, maintained from appointments and availability"
+    )
+    calendar_token = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False,
+        help_text="Secret in the calendar feed URL; issued on first use, replaced on request"
+    )
+    calendar_changed_at = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        help_text="Last deletion of a pending or approved appointment, for the calendar feed validators"
+    )
 
     class Meta:
         verbose_name_plural = "Doctors"
+        indexes = [
+            models.Index(fields=['specialization'], name='doctor_specialization_idx'),
+        ]
 
     def __str__(self):
         return f"Dr. {self.name} - {self.specialization}"
 
+    def _srcset(self, key):
+        return ', '.join(
+            f'{default_storage.url(name)} {size}w'
+            for size, name in self.image_variants.get(key, {}).items()
+        )
+
+    @property
+    def avatar_srcset(self):
+        return self._srcset('jpeg')
+
+    @property
+    def avatar_webp_srcset(self):
+        return self._srcset('webp')
+
+    @property
+    def avatar_url(self):
+        """Smallest JPEG variant, or the original photo until variants exist."""
+        sizes = self.image_variants.get('jpeg')
+        if sizes:
+            return default_storage.url(sizes[min(sizes, key=int)])
+        return self.profile_image.url if self.profile_image else ''
+
+    @property
+    def default_avatar_url(self):
+        """Locally generated initials avatar for doctors without a photo."""
+        return default_avatar_url(self.name)
+
 
 class DoctorAvailability(models.Model):
     """Doctor's available days and time slots."""
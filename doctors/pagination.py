@@ -0,0 +1,183 @@
+"""
+Hospital Management - Doctors App Keyset Pagination
+
+Pages are addressed by the boundary row (?after=<cursor> / ?before=<cursor>)
+instead of a page number, so every page is one indexed range scan of
+PAGE_SIZE + 1 rows: no OFFSET and no COUNT(*), whatever the directory size.
+
+Rows are ordered by `-id`, or by an optional nullable `key` field or
+annotation ascending (nulls last) with `-id` as the tie-break, e.g.
+next_available_at or search_rank.
+"""
+import math
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+
+PAGE_SIZE = 12
+
+
+class KeysetPage:
+    """One page of rows plus the query strings for its neighbours."""
+
+    def __init__(self, object_list, params, key, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self._params = params
+        self._key = key
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _query(self, direction, obj):
+        params = self._params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params[direction] = encode_cursor(obj, self._key)
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query('after', self.object_list[-1]) if self.has_next and self.object_list else ''
+
+    @property
+    def previous_query(self):
+        return self._query('before', self.object_list[0]) if self.has_previous and self.object_list else ''
+
+
+def encode_cursor(obj, key=None):
+    if key is None:
+        return str(obj.pk)
+    value = getattr(obj, key)
+    if value is None:
+        value = ''
+    elif hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    else:
+        value = repr(value)
+    return f'{value}~{obj.pk}'
+
+
+def decode_cursor(raw, key, model):
+    if key is None:
+        return None, int(raw)
+    value, _, pk = raw.rpartition('~')
+    if not value:
+        value = None
+    else:
+        try:
+            value = model._meta.get_field(key).to_python(value)
+        except FieldDoesNotExist:
+            # Annotations such as search_rank are floats.
+            value = float(value)
+    return value, int(pk)
+
+
+def _after(key, value, pk):
+    """Rows that sort after the boundary (value, pk)."""
+    if key is None:
+        return Q(pk__lt=pk)
+    if value is None:
+        return Q(**{f'{key}__isnull': True, 'pk__lt': pk})
+    return Q(**{f'{key}__gt': value}) | Q(**{key: value, 'pk__lt': pk}) | Q(**{f'{key}__isnull': True})
+
+
+def _before(key, value, pk):
+    """Rows that sort before the boundary (value, pk)."""
+    if key is None:
+        return Q(pk__gt=pk)
+    if value is None:
+        return Q(**{f'{key}__isnull': False}) | Q(**{f'{key}__isnull': True, 'pk__gt': pk})
+    return Q(**{f'{key}__lt': value}) | Q(**{key: value, 'pk__gt': pk})
+
+
+def _ordering(key, reverse=False):
+    if key is None:
+        return ['pk'] if reverse else ['-pk']
+    if reverse:
+        return [F(key).desc(nulls_first=True), 'pk']
+    return [F(key).asc(nulls_last=True), '-pk']
+
+
+def keyset_page(queryset, params, key=None, page_size=PAGE_SIZE):
+    """Return the KeysetPage of `queryset` selected by the after/before cursor in `params`."""
+    after, before = params.get('after'), params.get('before')
+    try:
+        if before:
+            value, pk = decode_cursor(before, key, queryset.model)
+            rows = list(queryset.filter(_before(key, value, pk)).order_by(*_ordering(key, reverse=True))[:page_size + 1])
+            has_previous = len(rows) > page_size
+            rows = rows[:page_size][::-1]
+            return KeysetPage(rows, params, key, has_next=True, has_previous=has_previous)
+        if after:
+            value, pk = decode_cursor(after, key, queryset.model)
+            queryset = queryset.filter(_after(key, value, pk))
+    except (ValueError, ValidationError):
+        # A mangled cursor just starts from the first page.
+        after = None
+
+    rows = list(queryset.order_by(*_ordering(key))[:page_size + 1])
+    return KeysetPage(rows[:page_size], params, key, has_next=len(rows) > page_size, has_previous=bool(after))
+
+
+def nearest_page(queryset, location, params, page_size=PAGE_SIZE, prefix=''):
+    """Rows ordered by distance from `location`, paged on (distance_km, id).
+
+    `prefix` reaches the located model (e.g. 'clinic__' for doctors). Rows
+    nearest() cannot place (no coordinates, or too far) follow the located
+    ones in -id order with distance_km None, so nothing drops off the list.
+    """
+    from hospitals.geo import nearest, outside
+
+    cursors = {}
+    for direction in ('after', 'before'):
+        raw = params.get(direction)
+        if raw:
+            try:
+                cursors[direction] = decode_cursor(raw, 'distance_km', queryset.model)
+            except ValueError:
+                pass
+            break
+
+    def located(**cursor):
+        return nearest(queryset, location.latitude, location.longitude, page_size, prefix=prefix, **cursor)
+
+    def unlocated(boundary, forward):
+        rest = outside(queryset, location.latitude, location.longitude, prefix)
+        if boundary is not None:
+            rest = rest.filter(_after(None, None, boundary) if forward else _before(None, None, boundary))
+        rows = list(rest.order_by(*_ordering(None, reverse=not forward))[:page_size + 1])
+        for obj in rows:
+            obj.distance_km = None
+        return rows
+
+    if 'before' in cursors:
+        value, pk = cursors['before']
+        if value is not None:
+            rows, more = located(before=(value, pk))
+            return KeysetPage(rows, params, 'distance_km', has_next=True, has_previous=more)
+        rows = unlocated(pk, forward=False)
+        if len(rows) > page_size:
+            return KeysetPage(rows[:page_size][::-1], params, 'distance_km', has_next=True, has_previous=True)
+        # The page reaches back into the located rows: finish it with the farthest of them.
+        need = page_size - len(rows)
+        near, more = located(before=(math.inf, 0))
+        taken = near[max(0, len(near) - need):] if need else []
+        return KeysetPage(
+            taken + rows[::-1], params, 'distance_km', has_next=True, has_previous=more or len(near) > len(taken)
+        )
+
+    after = cursors.get('after')
+    if after and after[0] is None:
+        rows = unlocated(after[1], forward=True)
+        return KeysetPage(rows[:page_size], params, 'distance_km', has_next=len(rows) > page_size, has_previous=True)
+
+    rows, more = located(after=after) if after else located()
+    if not more:
+        rows += unlocated(None, forward=True)
+        more = len(rows) > page_size
+    return KeysetPage(rows[:page_size], params, 'distance_km', has_next=more, has_previous=bool(after))
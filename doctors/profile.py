@@ -0,0 +1,102 @@
+"""
+Hospital Management - Doctors App Cached Profile
+
+Everything the doctor detail page shows about a doctor, including the
+weekly schedule, is built once into a plain dict and cached under the
+doctor's data version. The signals bump the version whenever the doctor,
+their city, clinic or availability changes, so a cache hit renders the page
+without touching the database.
+"""
+import time
+
+from django.core.cache import cache
+
+from appointments.slots import LUNCH_MASK, SLOT_MINUTES
+
+# Old profiles are unreachable once the doctor's version moves on.
+PROFILE_TIMEOUT = 60 * 60 * 24
+
+
+def _version_key(doctor_id):
+    return f'doctors:profile-version:{doctor_id}'
+
+
+def _profile_key(doctor_id, version):
+    return f'doctors:profile:{doctor_id}:{version}'
+
+
+def profile_version(doctor_id):
+    key = _version_key(doctor_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a version lost to eviction is never reused.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_profile(*doctor_ids):
+    for doctor_id in set(doctor_ids):
+        try:
+            cache.incr(_version_key(doctor_id))
+        except ValueError:
+            # No version yet, so nothing cached to invalidate.
+            pass
+
+
+def _lunch_hours():
+    first = (LUNCH_MASK & -LUNCH_MASK).bit_length() - 1
+    return first * SLOT_MINUTES, LUNCH_MASK.bit_length() * SLOT_MINUTES
+
+
+def _clock(minutes):
+    hour, minute = divmod(minutes, 60)
+    return f'{hour % 12 or 12}:{minute:02d} {"AM" if hour < 12 else "PM"}'
+
+
+def weekly_schedule(rows):
+    """[{'day': 'Monday', 'hours': '9:00 AM - 5:00 PM' or None}, ...] Monday first."""
+    from .models import DoctorAvailability
+
+    hours = {
+        day_of_week: f'{_clock(start.hour * 60 + start.minute)} - {_clock(end.hour * 60 + end.minute)}'
+        for day_of_week, start, end in rows
+    }
+    return [{'day': label, 'hours': hours.get(day)} for day, label in DoctorAvailability.DAY_CHOICES]
+
+
+def build_profile(doctor_id):
+    """The detail page's data for one doctor in two queries, or None if it does not exist."""
+    from .models import Doctor, DoctorAvailability
+
+    doctor = Doctor.objects.select_related('city', 'clinic').filter(pk=doctor_id).first()
+    if doctor is None:
+        return None
+    rows = DoctorAvailability.objects.filter(doctor_id=doctor_id).values_list(
+        'day_of_week', 'start_time', 'end_time'
+    )
+    lunch_start, lunch_end = _lunch_hours()
+    return {
+        'id': doctor.pk,
+        'name': doctor.name,
+        'specialization': doctor.specialization,
+        'city': doctor.city.name,
+        'clinic': doctor.clinic.name,
+        'experience': doctor.experience,
+        'consultation_fee': doctor.consultation_fee,
+        'image_url': doctor.profile_image.url if doctor.profile_image else '',
+        'avatar_url': doctor.default_avatar_url,
+        'schedule': weekly_schedule(rows),
+        'lunch': f'{_clock(lunch_start)} - {_clock(lunch_end)}',
+    }
+
+
+def get_profile(doctor_id):
+    """Cached profile dict for `doctor_id`, or None if the doctor does not exist."""
+    key = _profile_key(doctor_id, profile_version(doctor_id))
+    profile = cache.get(key)
+    if profile is None:
+        profile = build_profile(doctor_id)
+        if profile is not None:
+            cache.set(key, profile, PROFILE_TIMEOUT)
+    return profile
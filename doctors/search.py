@@ -0,0 +1,78 @@
+"""
+Hospital Management - Doctors App Full-Text Search
+
+Doctor name, specialization, clinic and city are indexed in the SQLite
+FTS5 table doctors_doctor_fts (rowid = doctor id). Triggers created by
+migration 0005 keep it in step with every write to doctors, clinics and
+cities, including queryset.update(); `manage.py rebuild_search_index`
+refills it from scratch.
+
+SQLite drops a table's triggers when a migration rebuilds it, so any
+migration that alters doctors_doctor must drop and recreate them around
+the change, as 0006 and 0008 do. FullTextSearchTests checks that every
+trigger in FTS_TRIGGERS survives the full migration history.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'doctors_doctor_fts'
+
+FTS_TRIGGERS = tuple(f'{FTS_TABLE}_{suffix}' for suffix in ('ai', 'ad', 'au', 'clinic_au', 'city_au'))
+
+# bm25 column weights: name, specialization, clinic, city
+RANK_WEIGHTS = (10.0, 5.0, 2.0, 2.0)
+
+MATCH_SQL = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+RANK_SQL = (
+    f"SELECT bm25({FTS_TABLE}, {', '.join(map(str, RANK_WEIGHTS))}) FROM {FTS_TABLE} "
+    f"WHERE {FTS_TABLE} MATCH %s AND rowid = doctors_doctor.id"
+)
+
+REBUILD_SQL = [
+    f'DELETE FROM {FTS_TABLE}',
+    f"""INSERT INTO {FTS_TABLE}(rowid, name, specialization, clinic, city)
+        SELECT d.id, d.name, d.specialization, c.name, ci.name
+        FROM doctors_doctor d
+        LEFT JOIN hospitals_clinic c ON c.id = d.clinic_id
+        LEFT JOIN hospitals_city ci ON ci.id = d.city_id""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')",
+]
+
+
+def search_terms(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def fts_query(terms):
+    """['heart', 'hyd'] -> '"heart"* "hyd"*': every term must match as a prefix."""
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def full_text_search(queryset, text):
+    """Doctors matching `text`, annotated with `search_rank` (bm25, lower is better)."""
+    terms = search_terms(text)
+    if not terms:
+        # Punctuation only: nothing to match, but callers still sort on the rank.
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    if connection.vendor != 'sqlite':
+        for term in terms:
+            queryset = queryset.filter(
+                Q(name__icontains=term) | Q(specialization__icontains=term)
+                | Q(clinic__name__icontains=term) | Q(city__name__icontains=term)
+            )
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    query = fts_query(terms)
+    return queryset.filter(id__in=RawSQL(MATCH_SQL, [query])).annotate(
+        search_rank=RawSQL(RANK_SQL, [query], output_field=FloatField())
+    )
+
+
+def rebuild_index():
+    with connection.cursor() as cursor:
+        for sql in REBUILD_SQL:
+            cursor.execute(sql)
@@ -0,0 +1,100 @@
+"""
+Hospital Management - Drop cached doctor search and profile data when the directory changes.
+
+Cache versions are bumped on commit: bumped any earlier, a request racing
+the transaction could rebuild from the old rows under the new version.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from hospitals.models import City, Clinic
+from .directory import bump_city
+from .facets import invalidate_facets
+from .images import schedule_variants
+from .models import Doctor, DoctorAvailability
+from .profile import bump_profile
+
+
+@receiver([post_save, post_delete], sender=Doctor)
+@receiver([post_save, post_delete], sender=City)
+@receiver([post_save, post_delete], sender=Clinic)
+def reset_facets(sender, **kwargs):
+    transaction.on_commit(invalidate_facets, robust=True)
+
+
+@receiver(post_init, sender=Doctor)
+@receiver(post_init, sender=Clinic)
+def remember_city(sender, instance, **kwargs):
+    # __dict__ so a deferred city_id is not loaded just for this.
+    instance._loaded_city_id = instance.__dict__.get('city_id')
+
+
+@receiver([post_save, post_delete], sender=Doctor)
+@receiver([post_save, post_delete], sender=Clinic)
+def bump_directory(sender, instance, **kwargs):
+    # A move between cities changes both cities' payloads.
+    city_ids = (instance.city_id, getattr(instance, '_loaded_city_id', None))
+    instance._loaded_city_id = instance.city_id
+
+    def apply():
+        bump_city(*city_ids)
+    transaction.on_commit(apply, robust=True)
+
+
+@receiver([post_save, post_delete], sender=City)
+def bump_city_directory(sender, instance, **kwargs):
+    city_id = instance.pk
+
+    def apply():
+        bump_city(city_id)
+    transaction.on_commit(apply, robust=True)
+
+
+@receiver([post_save, post_delete], sender=Doctor)
+def bump_doctor_profile(sender, instance, **kwargs):
+    doctor_id = instance.pk
+
+    def apply():
+        bump_profile(doctor_id)
+    transaction.on_commit(apply, robust=True)
+
+
+@receiver([post_save, post_delete], sender=DoctorAvailability)
+def bump_schedule(sender, instance, **kwargs):
+    doctor_id = instance.doctor_id
+
+    def apply():
+        bump_profile(doctor_id)
+    transaction.on_commit(apply, robust=True)
+
+
+@receiver(post_save, sender=City)
+@receiver(post_save, sender=Clinic)
+def bump_profiles_by_place(sender, instance, created, **kwargs):
+    if not created:
+        field = 'city' if sender is City else 'clinic'
+        # Read now, inside the transaction, so doctors it moves are included.
+        doctor_ids = list(Doctor.objects.filter(**{field: instance}).values_list('pk', flat=True))
+
+        def apply():
+            bump_profile(*doctor_ids)
+        transaction.on_commit(apply, robust=True)
+
+
+@receiver(post_init, sender=Doctor)
+def remember_image(sender, instance, **kwargs):
+    instance._loaded_image = str(instance.__dict__.get('profile_image') or '')
+
+
+@receiver(post_save, sender=Doctor)
+def refresh_image_variants(sender, instance, **kwargs):
+    name = str(instance.profile_image or '')
+    if name == instance._loaded_image:
+        return
+    instance._loaded_image = name
+    if instance.image_variants:
+        # The old photo's variants must not outlive it.
+        instance.image_variants = {}
+        Doctor.objects.filter(pk=instance.pk).update(image_variants={})
+    if name:
+        schedule_variants(instance.pk)
@@ -1,3 +1,504 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from datetime import time, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from PIL import Image
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from hospitals.models import City, Clinic
+from appointments.models import Appointment
+from .models import Doctor, DoctorAvailability
+from . import avatars, facets, profile
+from .ical import feed_token, fold
+from .images import VARIANT_SIZES, generate_variants
+from .pagination import PAGE_SIZE
+from .search import FTS_TABLE, FTS_TRIGGERS
+from .views import AGENDA_PAGE_SIZE
+
+
+# Pages render avatars, which are written to MEDIA_ROOT on first use.
+TEST_MEDIA = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(TEST_MEDIA, ignore_errors=True)
+
+
+def create_doctors(count, prefix='doctor', **fields):
+    city = City.objects.create(name='Mumbai')
+    clinic = Clinic.objects.create(name='City Hospital', city=city, address='Andheri West')
+    return [
+        Doctor.objects.create(
+            user=User.objects.create_user(username=f'{prefix}{i}'),
+            name=f'Doctor {i}',
+            specialization='Cardiologist' if i % 2 else 'Pediatrician',
+            city=city,
+            clinic=clinic,
+            experience=5,
+            consultation_fee=500,
+            **fields,
+        )
+        for i in range(count)
+    ]
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, url, params):
+        """Follow next links to the end, returning the doctor ids seen per page."""
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            pages.append([d.id for d in response.context['doctors']])
+            page = response.context['page']
+            if not page.has_next:
+                return pages, response
+            response = self.client.get(f'{url}?{page.next_query}')
+
+    def test_pages_cover_directory_without_offset_or_count(self):
+        doctors = create_doctors(PAGE_SIZE * 2 + 3)
+        with CaptureQueriesContext(connection) as queries:
+            pages, _ = self.walk(reverse('doctors:doctor_list'), {})
+
+        self.assertEqual([len(p) for p in pages], [PAGE_SIZE, PAGE_SIZE, 3])
+        self.assertEqual(sum(pages, []), sorted((d.id for d in doctors), reverse=True))
+        for query in queries.captured_queries:
+            self.assertNotIn('OFFSET', query['sql'])
+            self.assertNotIn('COUNT(', query['sql'])
+
+    def test_previous_link_keeps_filters(self):
+        create_doctors(PAGE_SIZE * 4)
+        url = reverse('doctors:search_doctors')
+        pages, last = self.walk(url, {'specialization': 'Cardiologist'})
+        self.assertEqual(len(pages), 2)
+
+        response = self.client.get(f"{url}?{last.context['page'].previous_query}")
+        self.assertEqual([d.id for d in response.context['doctors']], pages[0])
+        self.assertFalse(response.context['page'].has_previous)
+
+    def test_sort_by_next_available_pages_with_nulls_last(self):
+        doctors = create_doctors(PAGE_SIZE + 2)
+        soon = timezone.now() + timedelta(hours=1)
+        for i, doctor in enumerate(doctors[:PAGE_SIZE // 2]):
+            Doctor.objects.filter(pk=doctor.pk).update(next_available_at=soon + timedelta(minutes=30 * (i % 3)))
+
+        pages, _ = self.walk(reverse('doctors:search_doctors'), {'sort': 'next_available'})
+        expected = Doctor.objects.order_by('next_available_at', '-id')
+        expected = [d.id for d in expected if d.next_available_at] + [d.id for d in expected if not d.next_available_at]
+        self.assertEqual(sum(pages, []), expected)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA)
+class SearchFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctors = create_doctors(5)
+
+    def test_warm_search_is_one_query(self):
+        url = reverse('doctors:search_doctors')
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            self.client.get(url, {'city': 'Mumbai'})
+
+    def test_counts_follow_other_filters(self):
+        response = self.client.get(reverse('doctors:search_doctors'), {'specialization': 'Cardiologist'})
+        self.assertEqual(response.context['cities'], [('Mumbai', 2)])
+        self.assertEqual(response.context['specializations'], [('Cardiologist', 2), ('Pediatrician', 3)])
+
+    def test_doctor_changes_refresh_counts(self):
+        url = reverse('doctors:search_doctors')
+        self.client.get(url)
+        self.doctors[0].specialization = 'Dermatologist'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctors[0].save()
+        response = self.client.get(url)
+        self.assertIn(('Dermatologist', 1), response.context['specializations'])
+
+    def test_rebuild_racing_a_change_is_not_cached(self):
+        url = reverse('doctors:search_doctors')
+        build = facets.build_facet_table
+
+        def rename_after_read():
+            table = build()
+            self.doctors[0].specialization = 'Dermatologist'
+            with self.captureOnCommitCallbacks(execute=True):
+                self.doctors[0].save()
+            return table
+
+        with mock.patch.object(facets, 'build_facet_table', rename_after_read):
+            self.client.get(url)
+        response = self.client.get(url)
+        self.assertIn(('Dermatologist', 1), response.context['specializations'])
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA)
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        hyderabad = City.objects.create(name='Hyderabad')
+        apollo = Clinic.objects.create(name='Apollo Hospitals', city=hyderabad, address='Jubilee Hills')
+        self.match = Doctor.objects.create(
+            name='Arjun Reddy', specialization='Cardiologist', city=hyderabad, clinic=apollo,
+            experience=12, consultation_fee=900, user=User.objects.create_user(username='arjun'),
+        )
+        self.other = create_doctors(3)
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('doctors:search_doctors'), {'q': q, **params})
+        return [d.id for d in response.context['doctors']]
+
+    def test_terms_match_across_name_clinic_and_city(self):
+        self.assertEqual(self.search('cardio hyderabad apollo'), [self.match.id])
+        self.assertEqual(self.search('arj'), [self.match.id])
+        self.assertCountEqual(self.search('cardio'), [self.match.id, self.other[1].id])
+
+    def test_index_follows_renames(self):
+        Clinic.objects.filter(pk=self.match.clinic_id).update(name='Yashoda')
+        self.assertEqual(self.search('yashoda'), [self.match.id])
+        self.assertEqual(self.search('apollo'), [])
+
+        self.match.delete()
+        self.assertEqual(self.search('arjun'), [])
+
+    def test_punctuation_only_query_lists_everyone(self):
+        for q in ('-', '!!!', '"\'*'):
+            self.assertCountEqual(self.search(q), [self.match.id] + [d.id for d in self.other], q)
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS5 triggers are SQLite-only')
+    def test_migrations_leave_every_index_trigger(self):
+        # A later migration that rebuilds doctors_doctor without recreating them drops them silently.
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s", [f'{FTS_TABLE}_%'])
+            self.assertCountEqual([row[0] for row in cursor.fetchall()], FTS_TRIGGERS)
+
+    def test_ranked_results_page_through(self):
+        create_doctors(PAGE_SIZE + 1, prefix='extra')
+        response = self.client.get(reverse('doctors:search_doctors'), {'q': 'doctor'})
+        first = [d.id for d in response.context['doctors']]
+        response = self.client.get(f"{reverse('doctors:search_doctors')}?{response.context['page'].next_query}")
+        second = [d.id for d in response.context['doctors']]
+        self.assertEqual(len(first), PAGE_SIZE)
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(len(first) + len(second), PAGE_SIZE + 1 + 3)
+
+
+class CityDirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctors = create_doctors(3)
+        self.city = self.doctors[0].city
+        self.other = City.objects.create(name='Pune')
+        Clinic.objects.create(name='Ruby Hall', city=self.other, address='Sassoon Road')
+        self.url = reverse('doctors:get_doctors_by_city')
+
+    def test_several_cities_in_one_call(self):
+        response = self.client.get(f'{self.url}?city={self.city.pk},{self.other.pk}&city=999')
+        cities = response.json()['cities']
+        self.assertEqual([c['name'] for c in cities], ['Mumbai', 'Pune'])
+        self.assertEqual([d['name'] for d in cities[0]['doctors']], ['Doctor 0', 'Doctor 1', 'Doctor 2'])
+        self.assertEqual([c['name'] for c in cities[1]['clinics']], ['Ruby Hall'])
+
+    def test_warm_call_skips_database_and_revalidates(self):
+        url = f'{self.url}?city={self.city.pk}'
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            warm = self.client.get(url)
+            revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(warm.json(), first.json())
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_doctor_changes_bump_both_cities(self):
+        url = f'{self.url}?city={self.city.pk},{self.other.pk}'
+        etag = self.client.get(url)['ETag']
+        doctor = self.doctors[0]
+        doctor.city = self.other
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor.save()
+            # Not before commit, or a racing request would cache the old rows under the new version.
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        cities = response.json()['cities']
+        self.assertEqual(len(cities[0]['doctors']), 2)
+        self.assertEqual([d['id'] for d in cities[1]['doctors']], [doctor.pk])
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA)
+class DoctorDetailCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctors(1)[0]
+        DoctorAvailability.objects.create(doctor=self.doctor, day_of_week=0, start_time=time(9), end_time=time(17))
+        self.url = reverse('doctors:doctor_detail', args=[self.doctor.pk])
+
+    def test_cold_render_is_two_queries_and_warm_render_none(self):
+        with self.assertNumQueries(2):
+            cold = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            warm = self.client.get(self.url)
+        self.assertContains(warm, '9:00 AM - 5:00 PM')
+        self.assertEqual(warm.content, cold.content)
+
+    def test_schedule_and_profile_changes_show_up(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            DoctorAvailability.objects.create(doctor=self.doctor, day_of_week=2, start_time=time(10), end_time=time(14))
+        self.assertContains(self.client.get(self.url), '10:00 AM - 2:00 PM')
+
+        self.doctor.city.name = 'Navi Mumbai'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.city.save()
+        self.assertContains(self.client.get(self.url), 'Navi Mumbai')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_request_racing_an_uncommitted_change_is_not_cached(self):
+        before = profile.build_profile(self.doctor.pk)
+        self.doctor.name = 'Renamed Doctor'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.save()
+            # Another connection would still read the committed rows.
+            with mock.patch.object(profile, 'build_profile', return_value=before):
+                self.client.get(self.url)
+        self.assertContains(self.client.get(self.url), 'Renamed Doctor')
+
+
+def photo(name='photo.jpg', size=(1600, 1200)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (40, 120, 200)).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.doctor = create_doctors(1)[0]
+
+    def test_upload_schedules_variants_after_commit(self):
+        # Every save also defers its cache bumps; the upload adds one callback of its own.
+        with self.captureOnCommitCallbacks() as plain:
+            self.doctor.save()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.doctor.profile_image = photo()
+            self.doctor.save()
+        self.assertEqual(len(callbacks), len(plain) + 1)
+
+    def test_variants_are_resized_and_used_in_srcset(self):
+        self.doctor.profile_image = photo()
+        self.doctor.save()
+        generate_variants(self.doctor.pk)
+        self.doctor.refresh_from_db()
+
+        for key in ('jpeg', 'webp'):
+            for size in VARIANT_SIZES:
+                with default_storage.open(self.doctor.image_variants[key][str(size)]) as f:
+                    self.assertEqual(Image.open(f).size, (size, size))
+        response = self.client.get(reverse('doctors:doctor_list'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, self.doctor.avatar_srcset)
+
+        # A new photo drops the old variants until its own are built.
+        self.doctor.profile_image = photo('other.jpg')
+        self.doctor.save()
+        self.doctor.refresh_from_db()
+        self.assertEqual(self.doctor.image_variants, {})
+        self.assertEqual(self.doctor.avatar_url, self.doctor.profile_image.url)
+
+    def test_backfill_command_skips_done_and_missing(self):
+        self.doctor.profile_image = photo()
+        self.doctor.save()
+        broken = create_doctors(1, prefix='broken')[0]
+        Doctor.objects.filter(pk=broken.pk).update(profile_image='doctors/missing.jpg')
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command('generate_image_variants', stdout=out, stderr=err)
+        self.assertIn('for 1 doctors (1 failed)', out.getvalue())
+        self.doctor.refresh_from_db()
+        self.assertTrue(self.doctor.image_variants)
+
+        call_command('generate_image_variants', stdout=out, stderr=err)
+        self.assertIn('for 0 doctors (1 failed)', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA)
+class DefaultAvatarTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        avatars._written.clear()
+
+    def test_initials_and_colour_are_deterministic(self):
+        self.assertEqual(avatars.initials('Dr. Arjun Reddy'), 'AR')
+        self.assertEqual(avatars.initials('Sarwar'), 'S')
+        self.assertEqual(avatars.render_svg('Arjun Reddy'), avatars.render_svg('arjun reddy '))
+
+    def test_list_renders_local_avatars_without_user_rows(self):
+        doctors = create_doctors(2)
+        Doctor.objects.filter(pk=doctors[0].pk).update(user=None)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('doctors:doctor_list'))
+        self.assertNotContains(response, 'dicebear')
+        for doctor in doctors:
+            path = avatars.avatar_path(doctor.name)
+            self.assertContains(response, default_storage.url(path))
+            self.assertTrue(default_storage.exists(path))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA)
+class DoctorDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctors(1)[0]
+        self.doctor.user.set_password('pw')
+        self.doctor.user.save()
+        self.patient = User.objects.create_user(username='patient', first_name='Asha', last_name='Rao')
+        self.today = timezone.localdate()
+        self.client.login(username=self.doctor.user.username, password='pw')
+        # The first visit issues the calendar feed token; keep that out of the counts.
+        feed_token(self.doctor)
+
+    def book(self, days, count, status='PENDING'):
+        Appointment.objects.bulk_create(
+            Appointment(
+                doctor=self.doctor, patient=self.patient, status=status,
+                date=self.today + timedelta(days=days + i // 16), time=time(8 + i % 16 // 2, 30 * (i % 2)),
+            )
+            for i in range(count)
+        )
+
+    def queries_for_dashboard(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('doctors:dashboard'))
+        return response, len(queries)
+
+    def test_history_does_not_change_the_query_count(self):
+        self.book(0, 3)
+        self.book(1, AGENDA_PAGE_SIZE, status='APPROVED')
+        _, baseline = self.queries_for_dashboard()
+
+        self.book(-800, 400, status='COMPLETED')
+        response, queries = self.queries_for_dashboard()
+        self.assertEqual(queries, baseline)
+        self.assertEqual(response.context['counts'], {
+            'upcoming': AGENDA_PAGE_SIZE + 3, 'today': 3,
+            'pending': 3, 'approved': AGENDA_PAGE_SIZE, 'completed': 0, 'cancelled': 0,
+        })
+        self.assertContains(response, 'Asha Rao', count=AGENDA_PAGE_SIZE)
+        self.assertEqual(response.context['page_obj'].paginator.num_pages, 2)
+
+    def test_agenda_pages_in_date_order(self):
+        self.book(0, AGENDA_PAGE_SIZE + 5)
+        first = self.client.get(reverse('doctors:dashboard')).context['appointments']
+        second = self.client.get(reverse('doctors:dashboard') + '?page=2').context['appointments']
+        slots = [(a.date, a.time) for a in [*first, *second]]
+        self.assertEqual(slots, sorted(slots))
+        self.assertEqual(len(slots), AGENDA_PAGE_SIZE + 5)
+
+
+class CalendarFeedTests(TestCase):
+    def setUp(self):
+        self.doctor = create_doctors(1)[0]
+        self.patient = User.objects.create_user(username='patient', first_name='Asha', last_name='Rao')
+        self.url = reverse('doctors:calendar_feed', args=[feed_token(self.doctor)])
+        day = timezone.localdate() + timedelta(days=3)
+        for hour, status in ((9, 'PENDING'), (10, 'APPROVED'), (11, 'CANCELLED'), (14, 'COMPLETED')):
+            Appointment.objects.create(
+                doctor=self.doctor, patient=self.patient, date=day, time=time(hour), status=status,
+                notes='Bring reports; fasting, since 8am' if hour == 9 else '',
+            )
+
+    def fetch(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        body = b''.join(response.streaming_content).decode() if response.status_code == 200 else ''
+        return response, body
+
+    def test_feed_lists_open_appointments(self):
+        response, body = self.fetch()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n') and body.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 2)
+        self.assertIn('STATUS:TENTATIVE', body)
+        self.assertIn('STATUS:CONFIRMED', body)
+        self.assertIn('SUMMARY:Appointment: Asha Rao', body)
+        self.assertIn('DESCRIPTION:Bring reports\\; fasting\\, since 8am', body)
+
+    def test_unchanged_feed_is_not_modified(self):
+        response, _ = self.fetch()
+        for headers in ({'If-Modified-Since': response['Last-Modified']}, {'If-None-Match': response['ETag']}):
+            with self.subTest(headers=headers), CaptureQueriesContext(connection) as queries:
+                revalidated, _ = self.fetch(**headers)
+            self.assertEqual(revalidated.status_code, 304)
+            self.assertEqual(len(queries), 1)
+
+    def test_status_change_updates_the_validators(self):
+        response, _ = self.fetch()
+        Appointment.objects.filter(status='PENDING').update(status='CANCELLED', updated_at=timezone.now())
+        revalidated, body = self.fetch(**{'If-None-Match': response['ETag']})
+        self.assertEqual(revalidated.status_code, 200)
+        self.assertEqual(body.count('BEGIN:VEVENT'), 1)
+
+    def test_deleting_an_open_appointment_updates_the_validators(self):
+        Appointment.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        response, _ = self.fetch()
+        Appointment.objects.get(status='PENDING').delete()
+        for headers in ({'If-Modified-Since': response['Last-Modified']}, {'If-None-Match': response['ETag']}):
+            with self.subTest(headers=headers):
+                revalidated, body = self.fetch(**headers)
+                self.assertEqual(revalidated.status_code, 200)
+                self.assertEqual(body.count('BEGIN:VEVENT'), 1)
+
+    def test_bad_token_is_not_found(self):
+        other = reverse('doctors:calendar_feed', args=[f'{self.doctor.pk}:forged'])
+        self.assertEqual(self.client.get(other).status_code, 404)
+
+    def test_token_is_random_and_stable(self):
+        other = create_doctors(1, prefix='other')[0]
+        self.assertNotEqual(feed_token(other), self.doctor.calendar_token)
+        self.assertEqual(len(self.doctor.calendar_token), 43)
+        self.doctor.refresh_from_db()
+        self.assertEqual(feed_token(self.doctor), self.url.rsplit('/', 1)[1].removesuffix('.ics'))
+
+    def test_regenerating_revokes_the_old_link(self):
+        self.doctor.user.set_password('pw')
+        self.doctor.user.save()
+        self.client.login(username=self.doctor.user.username, password='pw')
+        url = reverse('doctors:regenerate_calendar_feed')
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertRedirects(self.client.post(url), reverse('doctors:dashboard'), fetch_redirect_response=False)
+
+        self.assertEqual(self.fetch()[0].status_code, 404)
+        self.doctor.refresh_from_db()
+        fresh = self.client.get(reverse('doctors:calendar_feed', args=[self.doctor.calendar_token]))
+        self.assertEqual(fresh.status_code, 200)
+
+    def test_long_lines_are_folded(self):
+        folded = fold('DESCRIPTION:' + 'é' * 100)
+        lines = folded.split('\r\n')[:-1]
+        self.assertTrue(all(len(line.encode()) <= 75 for line in lines))
+        self.assertEqual(''.join(line[1:] if i else line for i, line in enumerate(lines)), 'DESCRIPTION:' + 'é' * 100)
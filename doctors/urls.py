@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -9,5 +10,12 @@ urlpatterns = [
     path('<int:pk>/', views.doctor_detail, name='doctor_detail'),
     path('dashboard/', views.doctor_dashboard, name='dashboard'),
     path('profile/update/', views.update_profile, name='update_profile'),
-    path('get-doctors-by-city/', views.get_doctors_by_city, name='get_doctors_by_city'),
+    path('export/', views.export_doctors, name='export_doctors'),
+    path('calendar/<str:token>.ics', views.calendar_feed, name='calendar_feed'),
+    path('calendar/regenerate/', views.regenerate_calendar_feed, name='regenerate_calendar_feed'),
+    path(
+        'get-doctors-by-city/',
+        views.aget_doctors_by_city if settings.ASYNC_VIEWS else views.get_doctors_by_city,
+        name='get_doctors_by_city',
+    ),
 ]
@@ -1,34 +1,69 @@
-from django.http import JsonResponse
+import hashlib
+
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.utils.timezone import now
+from django.utils import timezone
 from django.contrib import messages
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET, require_POST
 from .models import Doctor
+from .directory import MAX_CITIES, acity_versions, aget_city_payloads, city_versions, get_city_payloads
+from .exports import DOCTOR_EXPORT
+from .facets import facet_counts
+from .ical import feed_chunks, feed_state, feed_token, regenerate_feed_token
+from .pagination import keyset_page, nearest_page
+from .profile import get_profile
+from .search import full_text_search
 from appointments.models import Appointment
+from hospital_management.exports import export_response
+from hospitals.geo import session_location
+
+
+from datetime import datetime, time, timedelta
+from django.core.paginator import Paginator
+from django.db.models import Count, Q
 
+# Appointments per page on the doctor dashboard agenda.
+AGENDA_PAGE_SIZE = 20
 
-from django.db.models import Q
 
 def doctor_list(request):
-    doctors = Doctor.objects.select_related('user').order_by('-id')
-    return render(request, 'doctors/doctor_list.html', {'doctors': doctors})
+    doctors = Doctor.objects.select_related('city')
+    location = session_location(request)
+    if location:
+        # Doctors whose clinic has no coordinates, or is far away, come last.
+        page = nearest_page(doctors, location, request.GET, prefix='clinic__')
+    else:
+        page = keyset_page(doctors, request.GET)
+    return render(request, 'doctors/doctor_list.html', {
+        'doctors': page.object_list,
+        'page': page,
+        'location': location,
+    })
 
 
 def search_doctors(request):
-    # Base Queryset
-    doctors = Doctor.objects.select_related('user', 'city', 'clinic').order_by('-id')
-
-    # Filter Options (Populate dropdowns)
-    cities = Doctor.objects.values_list('city__name', flat=True).distinct().order_by('city__name')
-    specializations = Doctor.objects.values_list('specialization', flat=True).distinct().order_by('specialization')
-    clinics = Doctor.objects.values_list('clinic__name', flat=True).distinct().order_by('clinic__name')
+    # Base Queryset (ordered by keyset_page)
+    doctors = Doctor.objects.select_related('city', 'clinic')
 
     # Get Filter Parameters
+    query = request.GET.get('q', '').strip()
     city_filter = request.GET.get('city')
     spec_filter = request.GET.get('specialization')
     clinic_filter = request.GET.get('clinic')
+    available_filter = request.GET.get('available')
+    sort = request.GET.get('sort')
+
+    # Filter Options (Populate dropdowns) from the cached facet index
+    facets = facet_counts({'city': city_filter, 'specialization': spec_filter, 'clinic': clinic_filter})
 
     # Apply Filters
+    if query:
+        doctors = full_text_search(doctors, query)
     if city_filter:
         doctors = doctors.filter(city__name=city_filter)
     if spec_filter:
@@ -36,59 +71,201 @@ def search_doctors(request):
     if clinic_filter:
         doctors = doctors.filter(clinic__name=clinic_filter)
 
+    # Availability filter/sort read the maintained Doctor.next_available_at
+    if available_filter == 'today':
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        doctors = doctors.filter(
+            next_available_at__lt=timezone.make_aware(datetime.combine(tomorrow, time.min))
+        )
+    elif available_filter == 'week':
+        doctors = doctors.filter(next_available_at__lt=timezone.now() + timedelta(days=7))
+
+    if sort == 'next_available':
+        sort_key = 'next_available_at'
+    elif query:
+        sort_key = 'search_rank'
+    else:
+        sort_key = None
+    page = keyset_page(doctors, request.GET, key=sort_key)
+
     context = {
-        'doctors': doctors,
-        'cities': cities,
-        'specializations': specializations,
-        'clinics': clinics,
+        'doctors': page.object_list,
+        'page': page,
+        'cities': facets['city'],
+        'specializations': facets['specialization'],
+        'clinics': facets['clinic'],
+        'query': query,
         'selected_city': city_filter,
         'selected_spec': spec_filter,
         'selected_clinic': clinic_filter,
+        'selected_available': available_filter,
+        'selected_sort': sort,
     }
     return render(request, 'doctors/doctor_search.html', context)
 
 
 def doctor_detail(request, pk):
-    doctor = get_object_or_404(Doctor, pk=pk)
+    # A cached profile dict rather than the model: warm renders run no queries.
+    doctor = get_profile(pk)
+    if doctor is None:
+        raise Http404('No Doctor matches the given query.')
     return render(request, 'doctors/doctor_detail.html', {'doctor': doctor})
 
 
 @login_required
 def doctor_dashboard(request):
-    doctor = get_object_or_404(Doctor, user=request.user)
+    """Today's and upcoming appointments, one page at a time.
 
-    appointments = Appointment.objects.filter(
-        doctor=doctor
-    ).order_by('date', 'time')
+    The stat cards come from a single conditional aggregate over the same
+    date window, which also sizes the paginator, so the page costs three
+    queries however long the doctor's history is.
+    """
+    doctor = get_object_or_404(Doctor.objects.select_related('city', 'clinic'), user=request.user)
+    today = timezone.localdate()
 
-    today_count = appointments.filter(date=now().date()).count()
-    appointments_count = appointments.count()
+    agenda = Appointment.objects.filter(doctor=doctor, date__gte=today)
+    counts = agenda.aggregate(
+        upcoming=Count('id'),
+        today=Count('id', filter=Q(date=today)),
+        **{status.lower(): Count('id', filter=Q(status=status)) for status, _ in Appointment.STATUS_CHOICES},
+    )
+
+    paginator = Paginator(
+        agenda.select_related('patient')
+        .only('date', 'time', 'status', 'patient__username', 'patient__first_name', 'patient__last_name')
+        .order_by('date', 'time', 'id'),
+        AGENDA_PAGE_SIZE,
+    )
+    # Seed Paginator.count from the aggregate instead of a second COUNT(*).
+    paginator.count = counts['upcoming']
+    page = paginator.get_page(request.GET.get('page'))
 
     return render(
         request,
         'doctors/dashboard.html',
         {
             'doctor': doctor,
-            'appointments': appointments,
-            'today_count': today_count,
-            'appointments_count': appointments_count,
+            'appointments': page.object_list,
+            'page_obj': page,
+            'today': today,
+            'counts': counts,
+            'today_count': counts['today'],
+            'appointments_count': counts['upcoming'],
+            'calendar_url': request.build_absolute_uri(
+                reverse('doctors:calendar_feed', args=[feed_token(doctor)])
+            ),
         }
     )
 
 
+@require_GET
+def calendar_feed(request, token):
+    """The doctor's PENDING and APPROVED appointments as a streamed iCalendar feed.
+
+    The token in the URL stands in for a login, so calendar apps can poll
+    it. Unchanged polls cost the one query behind the validators.
+    """
+    state = feed_state(token)
+    if state is None:
+        raise Http404('No calendar matches the given token.')
+
+    doctor_id, changed = state
+    etag = last_modified = None
+    if changed is not None:
+        etag = f'"{doctor_id}-{changed.timestamp():.6f}"'
+        last_modified = int(changed.timestamp())
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+    doctor = get_object_or_404(Doctor.objects.select_related('city', 'clinic'), pk=doctor_id)
+    response = StreamingHttpResponse(feed_chunks(doctor), content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = f'inline; filename="doctor-{doctor_id}.ics"'
+    response['Cache-Control'] = 'private, no-cache'
+    if etag:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+@require_POST
+@login_required
+def regenerate_calendar_feed(request):
+    """Replace the doctor's calendar feed link, e.g. after it was shared by mistake."""
+    doctor = get_object_or_404(Doctor, user=request.user)
+    regenerate_feed_token(doctor)
+    messages.success(request, 'Your calendar link has been replaced. Subscribe to the new one; the old link no longer works.')
+    return redirect('doctors:dashboard')
+
+
+@require_GET
+@staff_member_required
+def export_doctors(request):
+    """Stream the doctor directory as ?format=csv|jsonl, optionally for one ?city= (id or name)."""
+    return export_response(DOCTOR_EXPORT, request)
+
+
+def _requested_cities(request):
+    """City ids from ?city=1&city=2 or ?city=1,2, first MAX_CITIES only; raises ValueError."""
+    city_ids = list(dict.fromkeys(
+        int(value) for raw in request.GET.getlist('city') for value in raw.split(',') if value.strip()
+    ))
+    return city_ids[:MAX_CITIES]
+
+
+def _versions_etag(versions):
+    return f'"{hashlib.md5(repr(sorted(versions.items())).encode()).hexdigest()}"'
+
+
+def _cities_response(city_ids, payloads, etag):
+    response = JsonResponse({'cities': [payloads[city_id] for city_id in city_ids if city_id in payloads]})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@require_GET
 def get_doctors_by_city(request):
-    city = request.GET.get('city')
+    """Clinics and doctors for one or more cities: ?city=1&city=2 or ?city=1,2.
 
-    doctors = Doctor.objects.filter(city__iexact=city)
+    A JSON API for clients that need a city's whole directory at once; the
+    forms' clinic dropdowns use the lighter hospitals:get_clinics_by_city.
+    Payloads come from the per-city cache in doctors.directory. The ETag is
+    built from the cities' data versions alone, so a revalidation is
+    answered without touching the payloads or the database.
+    """
+    try:
+        city_ids = _requested_cities(request)
+    except ValueError:
+        return JsonResponse({'cities': [], 'error': 'City ids must be integers.'}, status=400)
+
+    versions = city_versions(city_ids)
+    etag = _versions_etag(versions)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    payloads, _ = get_city_payloads(city_ids, versions)
+    return _cities_response(city_ids, payloads, etag)
+
+
+@require_GET
+async def aget_doctors_by_city(request):
+    """get_doctors_by_city for ASGI: same response, no thread held while waiting on the cache or DB."""
+    try:
+        city_ids = _requested_cities(request)
+    except ValueError:
+        return JsonResponse({'cities': [], 'error': 'City ids must be integers.'}, status=400)
+
+    versions = await acity_versions(city_ids)
+    etag = _versions_etag(versions)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    payloads, _ = await aget_city_payloads(city_ids, versions)
+    return _cities_response(city_ids, payloads, etag)
 
-    data = [
-        {
-            'id': doctor.id,
-            'name': doctor.user.get_full_name() or doctor.user.username,
-            'specialization': doctor.specialization,
-        }
-        for doctor in doctors
-    ]
 
 from .forms import DoctorProfileUpdateForm
 from django.contrib import messages
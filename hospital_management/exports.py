@@ -0,0 +1,202 @@
+"""
+Hospital Management - Streaming Exports
+
+CSV and JSON Lines exports of appointments, doctors and labs, shared by
+the export views, the export_* management commands and the admin's
+export action. Each app declares an Export for its model in its own
+exports module.
+
+Rows are read in keyset batches of EXPORT_CHUNK_SIZE (id > last id seen),
+each batch a short query of its own. Memory stays flat however many rows
+there are, and because no cursor is held open across the whole export,
+SQLite's read lock is released between batches and bookings keep
+committing while a large export is streaming.
+"""
+import csv
+import io
+import json
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Spreadsheets run a cell starting with one of these as a formula.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# format -> (content type, file extension)
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+}
+
+
+def csv_safe(value):
+    """Defuse text a spreadsheet would evaluate, e.g. notes written by a patient.
+
+    A leading apostrophe makes Excel, LibreOffice and Sheets show the cell as
+    text. Only strings are touched, so negative numbers stay numbers.
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class Export:
+    """One exportable model: its columns and the filters it understands.
+
+    `columns` is a sequence of (header, lookup) pairs; lookups may follow
+    foreign keys, which values_list() turns into joins. Filters whose
+    field is None are rejected for this export.
+    """
+
+    def __init__(self, name, queryset, columns, date_field=None, status_field=None, statuses=(), city_field=None):
+        self.name = name
+        self.queryset = queryset
+        self.headers = [header for header, _ in columns]
+        self.lookups = [lookup for _, lookup in columns]
+        self.date_field = date_field
+        self.status_field = status_field
+        self.statuses = tuple(statuses)
+        self.city_field = city_field
+
+    def parse_filters(self, params):
+        """Validated filters from request.GET or command options; raises ValueError."""
+        filters = {}
+        for key in ('date_from', 'date_to'):
+            if params.get(key):
+                if not self.date_field:
+                    raise ValueError(f'{self.name} cannot be filtered by date.')
+                try:
+                    filters[key] = date.fromisoformat(params[key])
+                except ValueError:
+                    raise ValueError(f'{key} must be a YYYY-MM-DD date.')
+        if params.get('status'):
+            if not self.status_field:
+                raise ValueError(f'{self.name} cannot be filtered by status.')
+            statuses = [value.strip().upper() for value in params['status'].split(',') if value.strip()]
+            unknown = sorted(set(statuses) - set(self.statuses))
+            if unknown:
+                raise ValueError(f'Unknown status: {", ".join(unknown)}.')
+            filters['status'] = statuses
+        if params.get('city'):
+            if not self.city_field:
+                raise ValueError(f'{self.name} cannot be filtered by city.')
+            filters['city'] = str(params['city']).strip()
+        return filters
+
+    def filter(self, queryset=None, date_from=None, date_to=None, status=None, city=None):
+        queryset = self.queryset() if queryset is None else queryset
+        if date_from:
+            queryset = queryset.filter(**{f'{self.date_field}__gte': date_from})
+        if date_to:
+            queryset = queryset.filter(**{f'{self.date_field}__lte': date_to})
+        if status:
+            queryset = queryset.filter(**{f'{self.status_field}__in': status})
+        if city:
+            # A city id or a city name.
+            lookup = self.city_field if city.isdigit() else f'{self.city_field}__name__iexact'
+            queryset = queryset.filter(**{lookup: city})
+        return queryset
+
+    def batches(self, queryset, chunk_size=EXPORT_CHUNK_SIZE):
+        """Yield lists of row tuples, `chunk_size` at a time, in id order."""
+        rows = queryset.order_by('pk').values_list('pk', *self.lookups)
+        last = None
+        while True:
+            page = rows if last is None else rows.filter(pk__gt=last)
+            batch = list(page[:chunk_size].iterator(chunk_size=chunk_size))
+            if not batch:
+                return
+            last = batch[-1][0]
+            yield [row[1:] for row in batch]
+            if len(batch) < chunk_size:
+                return
+
+    def render(self, fmt, rows):
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows([csv_safe(value) for value in row] for row in rows)
+            return buffer.getvalue()
+        return ''.join(
+            json.dumps(dict(zip(self.headers, row)), cls=DjangoJSONEncoder) + '\n' for row in rows
+        )
+
+    def stream(self, fmt, queryset, chunk_size=EXPORT_CHUNK_SIZE):
+        """Yield the export as text: a header row for CSV, then one piece per batch."""
+        if fmt == 'csv':
+            yield self.render(fmt, [self.headers])
+        for batch in self.batches(queryset, chunk_size):
+            yield self.render(fmt, batch)
+
+    def response(self, fmt, queryset, filename=None):
+        content_type, extension = FORMATS[fmt]
+        response = StreamingHttpResponse(self.stream(fmt, queryset), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename or self.name}.{extension}"'
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+def export_response(export, request, queryset=None):
+    """Stream `export` in the ?format= of the request, filtered by its query string."""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return HttpResponseBadRequest(f'format must be one of: {", ".join(FORMATS)}.')
+    try:
+        filters = export.parse_filters(request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    return export.response(fmt, export.filter(queryset, **filters))
+
+
+def export_action(export):
+    """Admin action streaming the selected rows of `export` as CSV."""
+    def export_selected(modeladmin, request, queryset):
+        return export.response('csv', queryset)
+    export_selected.short_description = 'Export selected %(verbose_name_plural)s as CSV'
+    export_selected.__name__ = f'export_{export.name}'
+    return export_selected
+
+
+class ExportCommand(BaseCommand):
+    """Base for the export_* commands; subclasses set `export`."""
+    export = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help='File to write (default: standard output)')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help=f'Rows read per query (default {EXPORT_CHUNK_SIZE})')
+        if self.export.date_field:
+            parser.add_argument('--date-from', help='Only rows on or after this YYYY-MM-DD date')
+            parser.add_argument('--date-to', help='Only rows on or before this YYYY-MM-DD date')
+        if self.export.status_field:
+            parser.add_argument('--status', help=f'Comma-separated statuses: {", ".join(self.export.statuses)}')
+        if self.export.city_field:
+            parser.add_argument('--city', help='City id or name')
+
+    def handle(self, *args, **options):
+        try:
+            filters = self.export.parse_filters(options)
+        except ValueError as e:
+            raise CommandError(str(e))
+        queryset = self.export.filter(**filters)
+        fmt = options['format']
+
+        out = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else None
+        write = out.write if out else lambda text: self.stdout.write(text, ending='')
+        count = 0
+        try:
+            if fmt == 'csv':
+                write(self.export.render(fmt, [self.export.headers]))
+            for batch in self.export.batches(queryset, options['chunk_size']):
+                write(self.export.render(fmt, batch))
+                count += len(batch)
+        finally:
+            if out:
+                out.close()
+        # stderr, so the summary never ends up in a piped export.
+        self.stderr.write(self.style.SUCCESS(f'Exported {count} {self.export.name}'))
+
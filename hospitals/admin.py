@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import City, Clinic, Lab
+from hospital_management.exports import export_action
+from .exports import LAB_EXPORT
+from .models import City, Clinic, Lab, LabTest, Pincode
 
 
 @admin.register(City)
@@ -18,5 +20,24 @@ class ClinicAdmin(admin.ModelAdmin):
 @admin.register(Lab)
 class LabAdmin(admin.ModelAdmin):
     list_display = ['name', 'city', 'timings']
-    list_filter = ['city']
+    list_filter = ['city', 'tests']
     search_fields = ['name', 'city__name']
+    actions = [export_action(LAB_EXPORT)]
+
+
+@admin.register(LabTest)
+class LabTestAdmin(admin.ModelAdmin):
+    """The catalog is built from each lab's test_types; edit those instead."""
+    list_display = ['name']
+    search_fields = ['name']
+    readonly_fields = ['name']
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(Pincode)
+class PincodeAdmin(admin.ModelAdmin):
+    list_display = ['code', 'locality', 'city', 'latitude', 'longitude']
+    list_filter = ['city']
+    search_fields = ['code', 'locality', 'city']
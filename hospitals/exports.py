@@ -0,0 +1,26 @@
+"""
+Hospital Management - Hospitals App Export
+
+Labs as a streaming export; see hospital_management.exports.
+"""
+from hospital_management.exports import Export
+
+from .models import Lab
+
+
+LAB_EXPORT = Export(
+    'labs',
+    lambda: Lab.objects.all(),
+    (
+        ('id', 'id'),
+        ('name', 'name'),
+        ('city_id', 'city_id'),
+        ('city', 'city__name'),
+        ('address', 'address'),
+        ('test_types', 'test_types'),
+        ('timings', 'timings'),
+        ('latitude', 'latitude'),
+        ('longitude', 'longitude'),
+    ),
+    city_field='city',
+)
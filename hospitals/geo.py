@@ -0,0 +1,107 @@
+"""
+Hospital Management - Hospitals App Proximity Search
+
+Clinics and labs store the cell of a fixed GRID_DEGREES grid they fall in
+(grid_row, grid_col; indexed together). A nearest-neighbour query scans a
+square of cells around the origin and doubles it until the k-th nearest
+candidate is provably closer than anything outside the square, so each
+lookup reads a handful of index ranges instead of the whole table.
+
+nearest() stops at MAX_RADIUS_CELLS. Rows without coordinates, or beyond
+that square, are what outside() returns; lists ordered by distance show
+them after the located ones rather than dropping them.
+"""
+import math
+
+GRID_DEGREES = 0.05          # ~5.5 km cells
+MAX_RADIUS_CELLS = 256       # give up beyond ~1400 km
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 110.5    # lower bound, so coverage is never overstated
+
+
+def grid_cell(latitude, longitude):
+    return (
+        math.floor((latitude + 90) / GRID_DEGREES),
+        math.floor((longitude + 180) / GRID_DEGREES),
+    )
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def covered_km(latitude, radius):
+    """Distance within which every point lies inside the scanned square of `radius` cells."""
+    widest = min(89.0, abs(latitude) + (radius + 1) * GRID_DEGREES)
+    return radius * GRID_DEGREES * KM_PER_DEGREE_LAT * math.cos(math.radians(widest))
+
+
+def _square(prefix, row, col, radius):
+    from django.db.models import Q
+
+    return Q(**{
+        f'{prefix}grid_row__range': (row - radius, row + radius),
+        f'{prefix}grid_col__range': (col - radius, col + radius),
+    })
+
+
+def nearest(queryset, latitude, longitude, limit, prefix='', after=None, before=None):
+    """Up to `limit` rows nearest to the origin, each with a `distance_km` attribute.
+
+    `prefix` reaches the located model through a relation (e.g. 'clinic__'
+    for doctors). `after`/`before` are (distance_km, pk) keyset cursors.
+    Returns (rows, more), where `more` says rows exist past the page edge
+    in the direction being read.
+    """
+    from django.db.models import F
+
+    row, col = grid_cell(latitude, longitude)
+    queryset = queryset.annotate(
+        geo_latitude=F(f'{prefix}latitude'), geo_longitude=F(f'{prefix}longitude')
+    )
+    found = []
+    radius, scanned = 0, None
+    while True:
+        cells = _square(prefix, row, col, radius)
+        if scanned is not None:
+            cells &= ~_square(prefix, row, col, scanned)
+        for obj in queryset.filter(cells):
+            obj.distance_km = haversine_km(latitude, longitude, obj.geo_latitude, obj.geo_longitude)
+            key = (obj.distance_km, obj.pk)
+            if (after is None or key > after) and (before is None or key < before):
+                found.append(obj)
+
+        covered = covered_km(latitude, radius)
+        found.sort(key=lambda obj: (obj.distance_km, obj.pk))
+        if before is not None:
+            done = covered >= before[0]
+        else:
+            done = len(found) > limit and found[limit].distance_km <= covered
+        if done or radius >= MAX_RADIUS_CELLS:
+            break
+        scanned, radius = radius, max(1, radius * 2)
+
+    if before is not None:
+        return found[-limit:], len(found) > limit
+    return found[:limit], len(found) > limit
+
+
+def outside(queryset, latitude, longitude, prefix=''):
+    """The rows nearest() never reaches: no coordinates, or beyond MAX_RADIUS_CELLS."""
+    row, col = grid_cell(latitude, longitude)
+    return queryset.exclude(_square(prefix, row, col, MAX_RADIUS_CELLS))
+
+
+def session_location(request):
+    """The Pincode chosen on the location page, or None."""
+    from .models import Pincode
+
+    code = request.session.get('pincode')
+    if not code:
+        return None
+    return Pincode.objects.filter(code=code).first()
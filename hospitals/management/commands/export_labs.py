@@ -0,0 +1,11 @@
+"""
+Management command to export labs as CSV or JSON Lines.
+Usage: python manage.py export_labs [--format csv|jsonl] [--output FILE] [--city ID|NAME]
+"""
+from hospital_management.exports import ExportCommand
+from hospitals.exports import LAB_EXPORT
+
+
+class Command(ExportCommand):
+    help = "Export labs with their city"
+    export = LAB_EXPORT
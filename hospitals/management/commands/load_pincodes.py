@@ -0,0 +1,48 @@
+"""
+Management command to load pincode localities with coordinates.
+Usage: python manage.py load_pincodes [path/to/pincodes.csv]
+
+The CSV needs the columns code, locality, city, latitude, longitude.
+Without a path the bundled hospitals/data/pincodes.csv is loaded. Rows
+are upserted on code, so the command can be re-run with a fuller file.
+"""
+import csv
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from hospitals.models import Pincode
+
+BUNDLED_CSV = Path(__file__).resolve().parents[2] / 'data' / 'pincodes.csv'
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Load pincode localities and coordinates from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=str(BUNDLED_CSV))
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as f:
+                rows = [
+                    Pincode(
+                        code=row['code'].strip(),
+                        locality=row['locality'].strip(),
+                        city=row['city'].strip(),
+                        latitude=float(row['latitude']),
+                        longitude=float(row['longitude']),
+                    )
+                    for row in csv.DictReader(f)
+                ]
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f'Could not read pincodes: {e}')
+
+        Pincode.objects.bulk_create(
+            rows,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['code'],
+            update_fields=['locality', 'city', 'latitude', 'longitude'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Loaded {len(rows)} pincodes'))
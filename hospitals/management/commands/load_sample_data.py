@@ -2,6 +2,7 @@
 Management command to load sample data for Hospital Management System.
 Usage: python manage.py load_sample_data
 """
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from datetime import time
@@ -30,33 +31,36 @@ class Command(BaseCommand):
 
         # Clinics
         clinics_data = [
-            ('City Hospital', 'Mumbai', '123 Main Street, Andheri West'),
-            ('Metro Clinic', 'Mumbai', '456 Linking Road, Bandra'),
-            ('Apollo Hospital', 'Delhi', 'Sector 18, Noida'),
-            ('Medanta', 'Delhi', 'Saket, South Delhi'),
-            ('Fortis Hospital', 'Bangalore', 'Cunningham Road'),
+            ('City Hospital', 'Mumbai', '123 Main Street, Andheri West', 19.1364, 72.8296),
+            ('Metro Clinic', 'Mumbai', '456 Linking Road, Bandra', 19.0596, 72.8295),
+            ('Apollo Hospital', 'Delhi', 'Sector 18, Noida', 28.5700, 77.3210),
+            ('Medanta', 'Delhi', 'Saket, South Delhi', 28.5245, 77.2066),
+            ('Fortis Hospital', 'Bangalore', 'Cunningham Road', 12.9880, 77.5920),
         ]
         clinics = {}
-        for name, city_name, address in clinics_data:
+        for name, city_name, address, lat, lon in clinics_data:
             clinic, _ = Clinic.objects.get_or_create(
                 name=name,
-                defaults={'city': cities[city_name], 'address': address}
+                defaults={'city': cities[city_name], 'address': address, 'latitude': lat, 'longitude': lon}
             )
             clinics[name] = clinic
         self.stdout.write(f'  Created {len(clinics)} clinics')
 
         # Labs
         labs_data = [
-            ('PathLab Diagnostics', 'Mumbai', 'Blood Test, Urine Test, CBC', '8:00 AM - 8:00 PM'),
-            ('Dr. Lal PathLabs', 'Mumbai', 'Blood Test, X-Ray, MRI, ECG', '7:00 AM - 9:00 PM'),
-            ('Thyrocare', 'Delhi', 'Blood Test, Thyroid, Diabetes', '6:00 AM - 10:00 PM'),
-            ('Metropolis Lab', 'Bangalore', 'Blood Test, Covid RT-PCR', '24 Hours'),
+            ('PathLab Diagnostics', 'Mumbai', 'Blood Test, Urine Test, CBC', '8:00 AM - 8:00 PM', 19.0726, 72.8845),
+            ('Dr. Lal PathLabs', 'Mumbai', 'Blood Test, X-Ray, MRI, ECG', '7:00 AM - 9:00 PM', 19.1176, 72.9060),
+            ('Thyrocare', 'Delhi', 'Blood Test, Thyroid, Diabetes', '6:00 AM - 10:00 PM', 28.6315, 77.2167),
+            ('Metropolis Lab', 'Bangalore', 'Blood Test, Covid RT-PCR', '24 Hours', 12.9784, 77.6408),
         ]
-        for name, city_name, test_types, timings in labs_data:
+        for name, city_name, test_types, timings, lat, lon in labs_data:
             Lab.objects.get_or_create(
                 name=name,
                 city=cities[city_name],
-                defaults={'address': f'{name}, {cities[city_name].name}', 'test_types': test_types, 'timings': timings}
+                defaults={
+                    'address': f'{name}, {cities[city_name].name}', 'test_types': test_types, 'timings': timings,
+                    'latitude': lat, 'longitude': lon,
+                }
             )
         self.stdout.write(f'  Created labs')
 
@@ -129,4 +133,7 @@ class Command(BaseCommand):
             profile.save()
             self.stdout.write('  Created admin: admin / admin123')
 
+        # Pincodes for proximity search
+        call_command('load_pincodes')
+
         self.stdout.write(self.style.SUCCESS('Sample data loaded successfully!'))
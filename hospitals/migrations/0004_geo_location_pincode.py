@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0003_alter_city_id_alter_clinic_id_alter_lab_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Pincode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=10, unique=True)),
+                ('locality', models.CharField(max_length=200)),
+                ('city', models.CharField(max_length=100)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+            ],
+            options={
+                'verbose_name_plural': 'Pincodes',
+            },
+        ),
+        migrations.AddField(
+            model_name='clinic',
+            name='grid_col',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='clinic',
+            name='grid_row',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='clinic',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='clinic',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='lab',
+            name='grid_col',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='lab',
+            name='grid_row',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='lab',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='lab',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='clinic',
+            index=models.Index(fields=['grid_row', 'grid_col'], name='clinic_grid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lab',
+            index=models.Index(fields=['grid_row', 'grid_col'], name='lab_grid_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0004_geo_location_pincode'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='city',
+            index=models.Index(fields=['name'], name='city_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clinic',
+            index=models.Index(fields=['name'], name='clinic_name_idx'),
+        ),
+    ]
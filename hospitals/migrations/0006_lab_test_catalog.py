@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_catalog(apps, schema_editor):
+    """Split every lab's test_types into catalog entries and relink every lab to them."""
+    Lab = apps.get_model('hospitals', 'Lab')
+    LabTest = apps.get_model('hospitals', 'LabTest')
+    LabOffering = apps.get_model('hospitals', 'LabOffering')
+    names, offerings = {}, set()
+    for lab_id, test_types in Lab.objects.values_list('id', 'test_types').iterator():
+        for part in (test_types or '').split(','):
+            name = ' '.join(part.split())
+            if name:
+                key = name.lower()
+                names.setdefault(key, name)
+                offerings.add((lab_id, key))
+    LabTest.objects.bulk_create([LabTest(key=key, name=name) for key, name in names.items()], ignore_conflicts=True)
+    ids = dict(LabTest.objects.values_list('key', 'id'))
+    LabOffering.objects.all().delete()
+    LabOffering.objects.bulk_create(
+        [LabOffering(lab_id=lab_id, test_id=ids[key]) for lab_id, key in offerings], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0005_name_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabTest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('key', models.CharField(editable=False, max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LabOffering',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lab', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='hospitals.lab')),
+                ('test', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='hospitals.labtest')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='lab',
+            name='tests',
+            field=models.ManyToManyField(editable=False, related_name='labs', through='hospitals.LabOffering', to='hospitals.labtest'),
+        ),
+        migrations.AddConstraint(
+            model_name='laboffering',
+            constraint=models.UniqueConstraint(fields=('test', 'lab'), name='lab_offering_test_lab'),
+        ),
+        migrations.RunPython(build_catalog, migrations.RunPython.noop),
+    ]
@@ -4,8 +4,17 @@ Hospital Management - Hospitals App Models
 City: Locations where clinics and labs operate
 Clinic: Healthcare facilities (hospitals/clinics)
 Lab: Laboratory facilities for tests
+LabTest: Catalog of the tests labs offer, parsed from Lab.test_types
+Pincode: Postal code localities with coordinates, for proximity search
 """
-from django.db import models
+from django.db import models, transaction
+from .geo import grid_cell
+
+# Labs re-linked to the catalog per query round by sync_lab_tests.
+SYNC_BATCH_SIZE = 500
+
+# Rows whose grid cell is rewritten per UPDATE by GeoQuerySet.update.
+LOCATE_BATCH_SIZE = 500
 
 
 class City(models.Model):
@@ -14,12 +23,68 @@ class City(models.Model):
 
     class Meta:
         verbose_name_plural = "Cities"
+        # Doctor search filters on city__name.
+        indexes = [models.Index(fields=['name'], name='city_name_idx')]
 
     def __str__(self):
         return self.name
 
 
-class Clinic(models.Model):
+class GeoQuerySet(models.QuerySet):
+    """Bulk writes skip save(), so the ones that can move a row recompute its grid cell here."""
+
+    def update(self, **kwargs):
+        # bulk_update() comes through here too.
+        if 'latitude' not in kwargs and 'longitude' not in kwargs:
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))
+            count = super().update(**kwargs)
+            rows = self.model._default_manager.using(self.db).filter(pk__in=pks)
+            moved = [
+                self.model(pk=pk, latitude=latitude, longitude=longitude)
+                for pk, latitude, longitude in rows.values_list('pk', 'latitude', 'longitude')
+            ]
+            for obj in moved:
+                obj.locate()
+            # Only the grid fields, so this update does not come back here.
+            self.model._default_manager.using(self.db).bulk_update(
+                moved, ['grid_row', 'grid_col'], batch_size=LOCATE_BATCH_SIZE
+            )
+        return count
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.locate()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class GeoLocated(models.Model):
+    """Latitude/longitude plus the grid cell they fall in (see hospitals/geo.py)."""
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    grid_row = models.IntegerField(null=True, editable=False)
+    grid_col = models.IntegerField(null=True, editable=False)
+
+    objects = GeoQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def locate(self):
+        """Set grid_row/grid_col from the coordinates."""
+        if self.latitude is None or self.longitude is None:
+            self.grid_row = self.grid_col = None
+        else:
+            self.grid_row, self.grid_col = grid_cell(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        self.locate()
+        super().save(*args, **kwargs)
+
+
+class Clinic(GeoLocated):
     """Hospitals/Clinics - healthcare facilities."""
     name = models.CharField(max_length=200)
     city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='clinics')
@@ -27,12 +92,94 @@ class Clinic(models.Model):
 
     class Meta:
         verbose_name_plural = "Clinics"
+        indexes = [
+            models.Index(fields=['grid_row', 'grid_col'], name='clinic_grid_idx'),
+            # Doctor search filters on clinic__name.
+            models.Index(fields=['name'], name='clinic_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.city.name}"
 
 
-class Lab(models.Model):
+def test_key(name):
+    """Catalog key for a test name: case and spacing don't make a different test."""
+    return ' '.join(name.split()).lower()
+
+
+def parse_test_types(text):
+    """(key, name) pairs from a comma-separated test_types string, first spelling wins."""
+    tests = {}
+    for part in (text or '').split(','):
+        name = ' '.join(part.split())
+        if name:
+            tests.setdefault(test_key(name), name)
+    return list(tests.items())
+
+
+class LabTest(models.Model):
+    """A diagnostic test some lab offers, e.g. MRI or Lipid Profile."""
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100, unique=True, editable=False)
+
+    class Meta:
+        ordering = ['name']
+
+    def save(self, *args, **kwargs):
+        self.key = test_key(self.name)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+
+def sync_lab_tests(labs):
+    """Rebuild the catalog links of `labs` (a Lab queryset) from their test_types.
+
+    test_types is what staff edit, so it is the source of truth; LabOffering
+    rows are derived from it and rewritten wholesale for each batch of labs.
+    """
+    rows = labs.order_by('pk').values_list('pk', 'test_types')
+    last = None
+    while True:
+        batch = list((rows if last is None else rows.filter(pk__gt=last))[:SYNC_BATCH_SIZE])
+        if not batch:
+            return
+        last = batch[-1][0]
+        offered = {pk: dict(parse_test_types(text)) for pk, text in batch}
+        names = {key: name for tests in offered.values() for key, name in tests.items()}
+        with transaction.atomic(using=labs.db):
+            LabTest.objects.bulk_create([LabTest(key=key, name=name) for key, name in names.items()],
+                                        ignore_conflicts=True)
+            ids = dict(LabTest.objects.filter(key__in=names).values_list('key', 'pk'))
+            LabOffering.objects.filter(lab_id__in=offered).delete()
+            LabOffering.objects.bulk_create(
+                [LabOffering(lab_id=pk, test_id=ids[key]) for pk, tests in offered.items() for key in tests]
+            )
+
+
+class LabQuerySet(GeoQuerySet):
+    """Bulk writes skip post_save, so the ones that can change test_types re-sync here."""
+
+    def update(self, **kwargs):
+        # bulk_update() comes through here too.
+        if 'test_types' not in kwargs:
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))
+            count = super().update(**kwargs)
+            sync_lab_tests(self.model._default_manager.using(self.db).filter(pk__in=pks))
+        return count
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        pks = [obj.pk for obj in objs if obj.pk is not None]
+        if pks:
+            sync_lab_tests(self.model._default_manager.using(self.db).filter(pk__in=pks))
+        return objs
+
+
+class Lab(GeoLocated):
     """Laboratory facilities for diagnostic tests."""
     name = models.CharField(max_length=200)
     city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='labs')
@@ -40,13 +187,45 @@ class Lab(models.Model):
     test_types = models.TextField(
         help_text="Comma-separated list of test types (e.g., Blood Test, X-Ray, MRI)"
     )
+    # Derived from test_types (see sync_lab_tests); lab search filters on this, not the text.
+    tests = models.ManyToManyField(LabTest, through='LabOffering', related_name='labs', editable=False)
     timings = models.CharField(
         max_length=200,
         help_text="e.g., 8:00 AM - 8:00 PM"
     )
 
+    objects = LabQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "Labs"
+        indexes = [models.Index(fields=['grid_row', 'grid_col'], name='lab_grid_idx')]
 
     def __str__(self):
         return f"{self.name} - {self.city.name}"
+
+
+class LabOffering(models.Model):
+    """A test offered by a lab: the through table of Lab.tests."""
+    lab = models.ForeignKey(Lab, on_delete=models.CASCADE)
+    # Leads the unique index below, which also answers "labs offering this test" on its own.
+    test = models.ForeignKey(LabTest, on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['test', 'lab'], name='lab_offering_test_lab'),
+        ]
+
+
+class Pincode(models.Model):
+    """Postal code locality with its approximate centre, loaded by `load_pincodes`."""
+    code = models.CharField(max_length=10, unique=True)
+    locality = models.CharField(max_length=200)
+    city = models.CharField(max_length=100)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    class Meta:
+        verbose_name_plural = "Pincodes"
+
+    def __str__(self):
+        return f"{self.code} - {self.locality}, {self.city}"
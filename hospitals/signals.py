@@ -0,0 +1,30 @@
+"""
+Hospital Management - Keep the lab test catalog in step with Lab.test_types.
+
+Saves are handled here; bulk writes that skip signals go through LabQuerySet.
+Grid cells are set by GeoLocated.save, which loaddata bypasses, so fixture
+rows are located here.
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from .models import Clinic, Lab, sync_lab_tests
+
+
+@receiver(pre_save, sender=Clinic)
+@receiver(pre_save, sender=Lab)
+def locate_fixture_rows(sender, instance, raw, **kwargs):
+    if raw:
+        instance.locate()
+
+
+@receiver(post_save, sender=Lab)
+def sync_tests(sender, instance, raw, update_fields, using, **kwargs):
+    if update_fields is not None and 'test_types' not in update_fields:
+        return
+    labs = Lab.objects.using(using).filter(pk=instance.pk)
+    if raw:
+        # loaddata: the fixture may still be loading tests or offerings, so link once it has committed.
+        transaction.on_commit(lambda: sync_lab_tests(labs), using=using)
+    else:
+        sync_lab_tests(labs)
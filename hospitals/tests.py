@@ -1,3 +1,246 @@
-from django.test import TestCase
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from doctors.models import Doctor
+from .geo import grid_cell, haversine_km, nearest
+from .models import City, Clinic, Lab, LabTest, Pincode, parse_test_types
+
+
+# The doctor list renders avatars, which are written to MEDIA_ROOT on first use.
+TEST_MEDIA = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(TEST_MEDIA, ignore_errors=True)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA)
+class ProximitySearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('load_pincodes', stdout=io.StringIO())
+        cls.city = City.objects.create(name='Mumbai')
+        rng = random.Random(7)
+        cls.clinics = [
+            Clinic.objects.create(
+                name=f'Clinic {i}', city=cls.city, address='-',
+                latitude=18.9 + rng.random() * 0.4, longitude=72.8 + rng.random() * 0.2,
+            )
+            for i in range(60)
+        ]
+        cls.unmapped = Clinic.objects.create(name='Unmapped', city=cls.city, address='-')
+        # Far beyond MAX_RADIUS_CELLS of Mumbai.
+        cls.far_away = Clinic.objects.create(name='London', city=cls.city, address='-', latitude=51.5, longitude=-0.1)
+        cls.origin = Pincode.objects.get(code='400053')
+
+    def brute_force(self):
+        return sorted(
+            self.clinics,
+            key=lambda c: (haversine_km(self.origin.latitude, self.origin.longitude, c.latitude, c.longitude), c.pk),
+        )
+
+    def test_nearest_matches_brute_force(self):
+        rows, more = nearest(Clinic.objects.all(), self.origin.latitude, self.origin.longitude, 10)
+        self.assertEqual([c.pk for c in rows], [c.pk for c in self.brute_force()[:10]])
+        self.assertTrue(more)
+
+    def test_cursors_walk_in_distance_order(self):
+        first, _ = nearest(Clinic.objects.all(), self.origin.latitude, self.origin.longitude, 10)
+        after = (first[-1].distance_km, first[-1].pk)
+        second, _ = nearest(Clinic.objects.all(), self.origin.latitude, self.origin.longitude, 10, after=after)
+        self.assertEqual([c.pk for c in second], [c.pk for c in self.brute_force()[10:20]])
+
+        before = (second[0].distance_km, second[0].pk)
+        back, more = nearest(Clinic.objects.all(), self.origin.latitude, self.origin.longitude, 10, before=before)
+        self.assertEqual([c.pk for c in back], [c.pk for c in first])
+        self.assertFalse(more)
+
+    def test_bulk_writes_keep_grid_cells(self):
+        near = self.brute_force()[0]
+        added, = Clinic.objects.bulk_create([
+            Clinic(name='Added', city=self.city, address='-', latitude=near.latitude, longitude=near.longitude)
+        ])
+        rows, _ = nearest(Clinic.objects.all(), self.origin.latitude, self.origin.longitude, 2)
+        self.assertEqual({c.pk for c in rows}, {near.pk, added.pk})
+
+        Clinic.objects.filter(pk=self.unmapped.pk).update(latitude=near.latitude, longitude=near.longitude)
+        self.far_away.latitude, self.far_away.longitude = near.latitude, near.longitude
+        Clinic.objects.bulk_update([self.far_away], ['latitude', 'longitude'])
+        Clinic.objects.filter(pk=added.pk).update(latitude=None)
+        rows, _ = nearest(Clinic.objects.all(), self.origin.latitude, self.origin.longitude, 3)
+        self.assertEqual({c.pk for c in rows}, {near.pk, self.unmapped.pk, self.far_away.pk})
+        self.assertEqual(
+            list(Clinic.objects.filter(pk=added.pk).values_list('grid_row', 'grid_col')), [(None, None)]
+        )
+
+    def test_doctor_list_orders_by_distance_from_session_pincode(self):
+        far, near = self.brute_force()[-1], self.brute_force()[0]
+        for clinic in (far, near):
+            Doctor.objects.create(
+                user=User.objects.create_user(username=f'dr{clinic.pk}'), name=clinic.name,
+                specialization='Cardiologist', city=self.city, clinic=clinic, experience=3, consultation_fee=300,
+            )
+        User.objects.create_user(username='patient', password='pw')
+        self.client.login(username='patient', password='pw')
+        self.client.post(reverse('accounts:location'), {'pincode': '400053'})
+
+        response = self.client.get(reverse('doctors:doctor_list'))
+        self.assertEqual([d.clinic_id for d in response.context['doctors']], [near.pk, far.pk])
+
+    def pick_pincode(self):
+        User.objects.create_user(username='patient', password='pw')
+        self.client.login(username='patient', password='pw')
+        self.client.post(reverse('accounts:location'), {'pincode': '400053'})
+
+    def test_unlocated_doctors_are_listed_last(self):
+        for clinic in (self.unmapped, self.clinics[0]):
+            Doctor.objects.create(
+                user=User.objects.create_user(username=f'dr{clinic.pk}'), name=clinic.name,
+                specialization='Cardiologist', city=self.city, clinic=clinic, experience=3, consultation_fee=300,
+            )
+        self.pick_pincode()
+        response = self.client.get(reverse('doctors:doctor_list'))
+        self.assertEqual([d.clinic_id for d in response.context['doctors']], [self.clinics[0].pk, self.unmapped.pk])
+
+    def test_clinic_list_pages_through_every_clinic_nearest_first(self):
+        self.pick_pincode()
+        url = reverse('hospitals:clinic_list')
+        pages, query = [], ''
+        while True:
+            page = self.client.get(f'{url}?{query}').context['page']
+            pages.append([c.pk for c in page])
+            if not page.has_next:
+                break
+            query = page.next_query
+        expected = [c.pk for c in self.brute_force()] + [self.far_away.pk, self.unmapped.pk]
+        self.assertEqual([len(p) for p in pages], [20, 20, 20, 2])
+        self.assertEqual(sum(pages, []), expected)
+
+        # Walking back from the last page crosses from the unlocated rows into the located ones.
+        back = [pages[-1]]
+        while page.has_previous:
+            page = self.client.get(f'{url}?{page.previous_query}').context['page']
+            back.insert(0, [c.pk for c in page])
+        self.assertEqual(sum(back, []), expected)
+
+
+class LabExportTests(TestCase):
+    def setUp(self):
+        for city_name in ('Mumbai', 'Pune'):
+            city = City.objects.create(name=city_name)
+            for i in range(3):
+                Lab.objects.create(name=f'{city_name} Lab {i}', city=city, address='Main Road',
+                                   test_types='Blood Test, MRI', timings='24/7')
+        User.objects.create_user(username='ops', password='pw', is_staff=True)
+        User.objects.create_user(username='visitor', password='pw')
+
+    def test_command_exports_one_city_as_jsonl(self):
+        out = io.StringIO()
+        call_command('export_labs', '--format', 'jsonl', '--city', 'pune', stdout=out, stderr=io.StringIO())
+        labs = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([lab['name'] for lab in labs], ['Pune Lab 0', 'Pune Lab 1', 'Pune Lab 2'])
+        self.assertEqual(labs[0]['test_types'], 'Blood Test, MRI')
+
+    def test_view_is_staff_only(self):
+        url = reverse('hospitals:export_labs')
+        self.client.login(username='visitor', password='pw')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.login(username='ops', password='pw')
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content).decode().count('\n'), 7)
+
+
+class LabTestCatalogTests(TestCase):
+    def setUp(self):
+        self.mumbai = City.objects.create(name='Mumbai')
+        self.pune = City.objects.create(name='Pune')
+        self.mri = Lab.objects.create(name='Scan Centre', city=self.mumbai, address='-',
+                                      test_types='Blood Test,  mri , MRI', timings='24/7')
+        Lab.objects.create(name='Pune Scans', city=self.pune, address='-', test_types='MRI, X-Ray', timings='24/7')
+        Lab.objects.create(name='Blood Bank', city=self.mumbai, address='-', test_types='Blood  test', timings='24/7')
+
+    def test_parse_collapses_case_and_spacing(self):
+        self.assertEqual(parse_test_types(' Blood  Test, ,blood test,MRI '),
+                         [('blood test', 'Blood Test'), ('mri', 'MRI')])
+
+    def test_saving_a_lab_syncs_its_tests(self):
+        self.assertEqual(sorted(LabTest.objects.values_list('name', flat=True)), ['Blood Test', 'X-Ray', 'mri'])
+        self.assertEqual(sorted(t.key for t in self.mri.tests.all()), ['blood test', 'mri'])
+
+        self.mri.test_types = 'X-Ray, CT Scan'
+        self.mri.save()
+        self.assertEqual(sorted(t.key for t in self.mri.tests.all()), ['ct scan', 'x-ray'])
+        self.assertEqual(LabTest.objects.get(key='x-ray').labs.count(), 2)
+
+    def offered(self, lab):
+        return sorted(Lab.objects.get(pk=lab.pk).tests.values_list('key', flat=True))
+
+    def test_bulk_writes_sync_tests(self):
+        Lab.objects.filter(city=self.mumbai).update(test_types='ECG, x-ray')
+        self.assertEqual(self.offered(self.mri), ['ecg', 'x-ray'])
+        self.assertEqual(LabTest.objects.get(key='x-ray').labs.count(), 3)
+
+        self.mri.test_types = 'CT Scan'
+        Lab.objects.bulk_update([self.mri], ['test_types'])
+        self.assertEqual(self.offered(self.mri), ['ct scan'])
+
+        lab, = Lab.objects.bulk_create([Lab(name='New', city=self.pune, address='-', test_types='ECG', timings='-')])
+        self.assertEqual(self.offered(lab), ['ecg'])
+
+    def test_loaddata_syncs_tests(self):
+        fixture = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        self.addCleanup(os.remove, fixture.name)
+        with fixture:
+            json.dump([{'model': 'hospitals.lab', 'pk': self.mri.pk, 'fields': {
+                'name': 'Scan Centre', 'city': self.mumbai.pk, 'address': '-', 'test_types': 'PET Scan',
+                'timings': '24/7', 'latitude': 19.07, 'longitude': 72.87,
+            }}], fixture)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('loaddata', fixture.name, verbosity=0)
+        self.assertEqual(self.offered(self.mri), ['pet scan'])
+        self.assertEqual(
+            Lab.objects.values_list('grid_row', 'grid_col').get(pk=self.mri.pk), grid_cell(19.07, 72.87)
+        )
+
+    def test_list_filters_by_test_and_city(self):
+        url = reverse('hospitals:lab_list')
+        response = self.client.get(url, {'test': 'MRI'})
+        self.assertEqual([lab.name for lab in response.context['labs']], ['Scan Centre', 'Pune Scans'])
+        response = self.client.get(url, {'test': 'blood test', 'city': 'Mumbai'})
+        self.assertEqual([lab.name for lab in response.context['labs']], ['Blood Bank', 'Scan Centre'])
+        self.assertContains(response, '<option value="Mumbai" selected>')
+        self.assertEqual(list(self.client.get(url, {'city': 'mum'}).context['labs']), [])
+        # No mock labs when the filter simply matches nothing.
+        self.assertEqual(list(self.client.get(url, {'test': 'Biopsy'}).context['labs']), [])
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite-specific')
+    def test_test_and_city_filters_are_answered_from_indexes(self):
+        tests = LabTest.objects.bulk_create([LabTest(name=f'Test {i}', key=f'test {i}') for i in range(50)])
+        labs = Lab.objects.bulk_create(
+            [Lab(name=f'Lab {i}', city=self.pune, address='-', test_types='', timings='-') for i in range(500)]
+        )
+        Lab.tests.through.objects.bulk_create(
+            [Lab.tests.through(lab=lab, test=tests[(i + j) % 50]) for i, lab in enumerate(labs) for j in range(5)]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        response = self.client.get(reverse('hospitals:lab_list'), {'test': 'Test 7'})
+        self.assertEqual(len(response.context['labs']), 50)
+
+        for labs in (Lab.objects.filter(tests__key='test 7'), Lab.objects.filter(city__name='Pune')):
+            sql, params = labs.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = [row[-1] for row in cursor.fetchall()]
+            self.assertFalse([step for step in plan if step.startswith('SCAN')], plan)
@@ -1,6 +1,7 @@
 """
 Hospital Management - Hospitals App URLs
 """
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -9,5 +10,10 @@ app_name = 'hospitals'
 urlpatterns = [
     path('clinics/', views.clinic_list, name='clinic_list'),
     path('labs/', views.lab_list, name='lab_list'),
-    path('ajax/clinics/', views.get_clinics_by_city, name='get_clinics_by_city'),
+    path('labs/export/', views.export_labs, name='export_labs'),
+    path(
+        'ajax/clinics/',
+        views.aget_clinics_by_city if settings.ASYNC_VIEWS else views.get_clinics_by_city,
+        name='get_clinics_by_city',
+    ),
 ]
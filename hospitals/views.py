@@ -3,35 +3,74 @@ Hospital Management - Hospitals App Views
 
 Clinic and Lab listing views.
 """
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
-from .models import Clinic, Lab
+from django.views.decorators.http import require_GET
+from hospital_management.exports import export_response
+from .exports import LAB_EXPORT
+from doctors.pagination import nearest_page
+from .geo import session_location
+from .models import City, Clinic, Lab, LabTest, test_key
+
+# Rows per page when a list is ordered by distance from the chosen pincode.
+NEAREST_PAGE_SIZE = 20
 
 
 def clinic_list(request):
     """List all clinics with optional city filter."""
     clinics = Clinic.objects.select_related('city').order_by('city__name', 'name')
     city_filter = request.GET.get('city')
+    location = None if city_filter else session_location(request)
+    page = None
     if city_filter:
         clinics = clinics.filter(city__name__icontains=city_filter)
-    return render(request, 'hospitals/clinic_list.html', {'clinics': clinics})
+    elif location:
+        # Nearest first; clinics without coordinates, or far away, follow.
+        page = clinics = nearest_page(clinics, location, request.GET, NEAREST_PAGE_SIZE)
+    return render(request, 'hospitals/clinic_list.html', {'clinics': clinics, 'page': page, 'location': location})
 
 
 def lab_list(request):
-    """List all labs with optional city filter."""
+    """List all labs with optional city and test filters."""
     labs = Lab.objects.select_related('city').order_by('city__name', 'name')
     city_filter = request.GET.get('city')
+    test_filter = test_key(request.GET.get('test', ''))
+    if test_filter:
+        # Unique key -> (test, lab) index -> labs, never the test_types text.
+        labs = labs.filter(tests__key=test_filter)
+    location = None if city_filter else session_location(request)
+    page = None
     if city_filter:
-        labs = labs.filter(city__name__icontains=city_filter)
-    
+        # Exact name, as in doctor search, so city_name_idx answers it; a LIKE would scan.
+        labs = labs.filter(city__name=city_filter)
+    elif location:
+        # Nearest first; labs without coordinates, or far away, follow.
+        page = labs = nearest_page(labs, location, request.GET, NEAREST_PAGE_SIZE)
+
     # Mock data if empty
-    if not labs.exists() and not city_filter:
+    if not labs and not city_filter and not test_filter:
         labs = [
             {'name': 'City Diagnotics', 'city': {'name': 'Hyderabad'}, 'address': 'Jubilee Hills, Rd 36', 'test_types': 'Blood Test, MRI, X-Ray', 'timings': '24/7'},
             {'name': 'Apollo Diagnostics', 'city': {'name': 'Bangalore'}, 'address': 'Indiranagar', 'test_types': 'Full Body Checkup, CT Scan', 'timings': '7:00 AM - 9:00 PM'},
             {'name': 'Metro Labs', 'city': {'name': 'Chennai'}, 'address': 'Anna Nagar', 'test_types': 'Thyroid, Diabetes, Lipid Profile', 'timings': '8:00 AM - 8:00 PM'},
         ]
         
-    return render(request, 'hospitals/lab_list.html', {'labs': labs})
+    return render(request, 'hospitals/lab_list.html', {
+        'labs': labs,
+        'page': page,
+        'location': location,
+        'cities': City.objects.order_by('name').values_list('name', flat=True).distinct(),
+        'selected_city': city_filter,
+        'tests': LabTest.objects.all(),
+        'test_filter': test_filter,
+    })
+
+
+@require_GET
+@staff_member_required
+def export_labs(request):
+    """Stream labs as ?format=csv|jsonl, optionally for one ?city= (id or name)."""
+    return export_response(LAB_EXPORT, request)
 
 
 from django.http import JsonResponse, HttpResponse
@@ -45,3 +84,14 @@ def get_clinics_by_city(request):
     
     clinics = Clinic.objects.filter(city_id=city_id).values('id', 'name').order_by('name')
     return JsonResponse({'clinics': list(clinics)})
+
+
+@require_GET
+async def aget_clinics_by_city(request):
+    """get_clinics_by_city for ASGI deployments."""
+    city_id = request.GET.get('city_id')
+    if not city_id:
+        return JsonResponse({'clinics': []})
+
+    clinics = Clinic.objects.filter(city_id=city_id).values('id', 'name').order_by('name')
+    return JsonResponse({'clinics': [clinic async for clinic in clinics]})